@@ -30,6 +30,10 @@
 # v1.3, 2020-12-12, jw  - minimalistic compatibility layer for inkscape 0.92.4 done. It now works in both, 1.0 and 0.92!
 # v1.4, 2020-12-15, jw  - find_roundable_nodes() added for auto selecting nodes, if none were selected.
 #                         And fix https://github.com/jnweiger/inkscape-round-corners/issues/2
+# v1.5, 2026-10-17      - round_corner() works per path: parse once, round all selected corners, write back once.
+#                         numpy engine, worker processes, batch and streaming mode, --stats, corner templates,
+#                         --tolerance, compact path data, data-round-corners records, --exact, --clamp, --max-radius,
+#                         --unit, and rect, polygon, polyline objects.
 #
 # Bad side-effect: As the node count increases during operation, the list of
 # selected nodes is incorrect afterwards. We have no way to give inkscape an update.
@@ -47,8 +51,9 @@ Selected smooth nodes are skipped.
 Cases with insufficient space (180deg turn or too short segments/handles) are warned about.
 
 This extension is written for inkscape 1.0.1 and is compatible with inkscape 0.92.4 .
-The code is 100% new API, but we hook a minimalistic 0.92.4 compatibility layer.
-For use with 0.92.4 rename round_corners.092_inx to round_corners.inx and keep this python file as is.
+The code is 100% new API, but we hook a minimalistic 0.92.4 compatibility layer (round_corners_092.py).
+For use with 0.92.4 rename round_corners.092_inx to round_corners.inx and install round_corners_092.py next to this file.
+The other round_corners_*.py modules must be installed next to this file too, see README.md.
 
 References:
  - https://gitlab.com/inkscape/extensions/-/wikis/home
@@ -61,7 +66,7 @@ References:
  - https://hansmuller-flex.blogspot.com/2011/10/more-about-approximating-circular-arcs.html
  - https://itc.ktu.lt/index.php/ITC/article/download/11812/6479         (Riskus' PDF)
 
-The algorithm of arc_bezier_handles() is based on the approach described in:
+The arc handles of corner_template() are based on the approach described in:
 A. Riškus, "Approximation of a Cubic Bezier Curve by Circular Arcs and Vice Versa,"
 Information Technology and Control, 35(4), 2006 pp. 371-378.
 """
@@ -70,187 +75,190 @@ Information Technology and Control, 35(4), 2006 pp. 371-378.
 from __future__ import print_function
 
 import inkex
-import sys, math, pprint, copy, os
+import sys, math, os, time
+from bisect import bisect_left
 
-__version__ = '1.4'             # Keep in sync with round_corners.inx line 16
+__version__ = '1.5'             # Keep in sync with the Version: line of round_corners.inx and round_corners.092_inx
 debug = False                   # True: babble on controlling tty
+if debug:
+  import pprint
 
-if not hasattr(inkex, 'EffectExtension'):       # START OF INKSCAPE 0.92.X COMPATIBILITY HACK
-  """ OOPS, the code **after** this if conditional is meant for inkscape 1.0.1,
-      but we seem to be running under inkscape 0.92.x today.
-      Well, to make the new code work in the old environment, in here, we do the
-      exact oposite of 1.0.1's /usr/share/inkscape/extensions/inkex/deprecated.py
-      (which would make old code run in the new 1.0.1 environment.)
+if not hasattr(inkex, 'EffectExtension'):
+  # inkscape 0.92.x: round_corners_092 installs a minimal inkscape 1.0.1 style api into inkex.
+  # Kept in a separate module, so that inkscape 1.x does not even compile it.
+  import round_corners_092
 
-      old and new:
-      - self.options= {'selected_nodes': ['path1684:0:2', 'path1684:0:0'], 'radius': 2.0, 'ids': ['path1684'], 'method': 'arc'}
+# the parts needed in every run, kept in modules so that they are cached as .pyc. The others are imported on demand.
+from round_corners_format import format_superpath, closed_subpaths, subpath_to_flat
+from round_corners_record import parse_rounded
+from round_corners_shapes import units_px, transform_scale, transform_uniform, user_units_per, document_size
+import round_corners_record, round_corners_shapes
 
-      old style:
-      - self.document= <lxml.etree._ElementTree object at 0x7f5c2b1a77e8>
-      - self.document.getroot() =  <Element {http://www.w3.org/2000/svg}svg at 0x7f5c2b1a78c0>
 
-      new style:
-      - self.svg= <class 'inkex.elements._svg.SvgDocumentElement'>
-      - self.svg.getElementById('path1684') =  <class 'inkex.elements._polygons.PathElement'>
-        ## maybe not even based on an lxml ElephantTree any more? Let's check the new code...
-  """
-  class MySvgSuperPath(list):
-    """ A list (of lists ...) object, that implements a new style to_path() method
-        to turn itself into a string attribute for <path d=...> nodes.
-    """
-    def to_path(self, curves_only=False):
-      """ convert from csp [[[[...]]]] to d "m ..."
-          using old 0.92.4 api.
-          Note that closed paths are not closed properly by formatPath().
-          Start and end of a closed path remains as two distinct points that just coincide.
-          That is a bug in the old API. Wontfix.
-      """
-      import cubicsuperpath
-
-      return cubicsuperpath.formatPath(self)
-
-
-  class MySvgPath():
-    def __init__(self, el):
-      self.element = el                       # original lxml.etree._Element
-      self.d = el.get('d')                    # must exist, else it is not a path :-)
-      # print('MySvgPath sodipodi:nodetypes=', el.get('{'+el.nsmap['sodipodi']+'}nodetypes'), file=sys.stderr)
-      # print('MySvgPath style=', el.get('style'), file=sys.stderr)
-      # print('MySvgPath d=', self.d, file=sys.stderr)
-
-    def to_superpath(self):
-      import cubicsuperpath
-
-      # self.d = "m 168.21,78.84 11.44,5.24 -14.65,8.77 z"
-      # supp = [[ [[168.21, 78.84], [168.21, 78.84], [168.21, 78.84]],
-      #           [[179.65, 84.09], [179.65, 84.09], [179.65, 84.09]],
-      #           [[164.99, 92.87], [164.99, 92.87], [164.99, 92.87]],
-      #           [[168.21, 78.84], [168.21, 78.84], [168.21, 78.84]] ]]
-      return MySvgSuperPath(cubicsuperpath.parsePath(self.d))
-
-
-  class MySvgElement():
-    def __init__(self, el):
-      self.element = el                       # original lxml.etree._Element; element.getroottree() has the svg document
-      self.tag = el.tag.split('}')[-1]        # strip any namespace prefix. '{http://www.w3.org/2000/svg}path'
-      self.id = self.element.attrib.get('id')
-      if self.tag == 'path':
-        self.path = MySvgPath(el)
-      else:
-        print("MySvgElement not implemented for <%s id='%s' ..." % (self.tag, self.id), file=sys.stderr)
-
-    def apply_transform(self):
-      t = self.element.get('transform')
-      # print('MySvgElement transform=', t, file=sys.stderr)
-      if t is not None:
-        raise(Exception("apply_transform() for id='%s' transform='%s' not impl." % (self.id, t)))
-
-    def set_path(self, d):
-      if self.tag != 'path':
-        raise(Exception("MySvgElement set_path() called on non-path node" + self.tag))
-      if type(d) != type(""):
-        raise(Exception("MySvgElement set_path() called with non-string d " + type(d)))
-      self.element.set('d', d)
-
-
-  class MySvgDocumentElement():
-    def __init__(self, document):
-      self.tree = document
-      self.root = document.getroot()
-      self.NSS = self.root.nsmap.copy()       # Or should we just use inkex.NSS instead? That has key 'inx', but not 'inkscape' ...
-      self.NSS.pop(None)                      # My documents nsmap has cc,svg,inkscape,rdf,sodipodi, and None: http://www.w3.org/2000/svg
-      if 'inx' not in self.NSS and 'inkscape' in self.NSS:
-        self.NSS['inx'] = self.NSS['inkscape']
-
-    def getElementById(self, id):
-      # print("MySvgDocumentElement.getElementById: svg=", self.tree, " svg.root=", self.root, " ID=", id, file=sys.stderr)
-      el_list = self.root.xpath('//*[@id="%s"]' % id, namespaces=self.NSS)
-      # print("el_list=", el_list, file=sys.stderr)
-      if len(el_list) < 1:
-        return None
-      return MySvgElement(el_list[0])         # Do we need more? document root is accessible via el_list[0].getroottree()
+max_trim_factor_single = 0.98   # 0.98: we can eat up almost everything of a segment, shared segments are split, see trim_plan().
+numpy_min_corners = 128         # --engine=auto: subpaths with fewer selected corners are faster with plain python, see test/benchmark.py
 
+max_arc_segments = 64           # --tolerance: upper limit of bezier segments per arc
+template_cache_size = 1024      # corner templates kept, see CornerTemplateCache. 0: no cache.
 
-  def compat_add_argument(pars, *args, **kw):
-    """ Provide an add_argument() method so that add_argument() can use the new api,
-        but implemented in terms of the old api.
-    """
-    # convert type method into type string as needed, see deprecated.py def add_option()
-    if 'type' in kw:
-      kw['type'] = { str: 'string', float: 'float', int: 'int', bool: 'inkbool' }.get(kw['type'])
-    if 'action' not in kw:
-      kw['action'] = 'store'
-    pars.add_option(*args, **kw)
+clock = getattr(time, 'perf_counter', time.time)
+stats_phases = ('lookup', 'to_superpath', 'corners', 'to_path', 'write_back')
+# corner outcome counters of RoundedCorners, in the order passed back by round_corners_parallel.round_path_job()
+corner_counters = ('rounded_arc2', 'rounded_arc3', 'rounded_line', 'skipped_degenerated', 'skipped_small_count', 'skipped_stretched', 'skipped_rounded')
 
 
-  def effect_wrapper(self):
-    """ A cheap plastic immitation if inkscape-1.0.1's SvgDocumentElement() class found in
-        /usr/share/inkscape/extensions/inkex/elements/_svg.py
-        We add an svg object to the old api, so that new style code can run.
-        Note: only a very minimal set of methods is supported, and those that are, in a very primitive way.
-    """
-    self.svg = MySvgDocumentElement(self.document)
-    self.wrapped_effect()
-
-
-  def init_wrapper(self):
-    """ To backport the option parsing, we wrap the __init__ method and introduce a compatibility shim.
-        we must call add_arguments(), that seems to be done by EffectExtension.__init__() which we don't have.
-        have Effect.__init__() instead, which expects to be subclassed. We cannot subclass, as we don't want to
-        touch the class code at all. Instead exchange the Effect.__init__() with this wrapper, to hook in
-        new style semantics into the old style inkex.Effect superclass.
-        We also we must convert from new style pars.add_argument() calls to old style
-        self.OptionParser.add_option() -- this is done by the compat_add_argument wrapper.
-    """
-    from types import MethodType
-
-    self.wrapped_init()                                    # call early, as it adds the OptionParser to self ...
+class SuperNodeSide(object):
+  """ The prev or next side of a SuperNode: index of the neighbour node, direction to it, handle (both relative
+      to the corner node), the usable handle length hlen, the part budget of it that this corner may trim, and the trim point trim_pt.
+      hlen, budget and trim_pt are None until they are computed.
+  """
+  __slots__ = ('idx', 'dir', 'handle', 'hlen', 'budget', 'trim_pt')
 
-    # We add an add_argument method to the OptionParser. Must do this via MethodType,
-    # as direct assignment would discard the indirect object.
-    self.OptionParser.add_argument = MethodType(compat_add_argument, self.OptionParser)
+  def __init__(self, idx, dir, handle):
+    self.idx = idx
+    self.dir = dir
+    self.handle = handle
+    self.hlen = None
+    self.budget = None
+    self.trim_pt = None
 
-    # Now, as the new style add_argument() method is in place, we can run the add_arguments() initializer of the extension.
-    self.add_arguments(self.OptionParser)
-    self.run = self.affect      # alias the extension entry point so that it works in both APs.
+  def as_dict(self):
+    return dict([ (k, getattr(self, k)) for k in self.__slots__ if getattr(self, k) is not None ])
 
-    # wrap our own effect() method. That is ugly, but self.document is not initialized any earlier.
-    self.wrapped_effect = self.effect
-    self.effect = MethodType(effect_wrapper, self)
+  def __repr__(self):
+    return repr(self.as_dict())
 
 
-  inkex.EffectExtension = inkex.Effect
-  inkex.EffectExtension.wrapped_init = inkex.EffectExtension.__init__
-  inkex.EffectExtension.__init__ = init_wrapper
+class SuperNode(object):
+  """ A corner node as seen by RoundedCorners.super_node(): index and position of the node, its prev and next
+      SuperNodeSide, and the angle alpha [deg] and trim, once they are computed.
+      With --clamp, radius is the largest radius the segments and handles allow, and then the radius used.
+      Fixed fields instead of a dict, as we create one per corner.
+      as_dict() returns the nested dict form for pprint.pprint() in debug output.
+  """
+  __slots__ = ('idx', 'x', 'y', 'prev', 'next', 'alpha', 'trim', 'radius')
+
+  def __init__(self, idx, x, y, prev, next):
+    self.idx = idx
+    self.x = x
+    self.y = y
+    self.prev = prev
+    self.next = next
+    self.alpha = None
+    self.trim = None
+    self.radius = None
+
+  def as_dict(self):
+    d = dict([ (k, getattr(self, k)) for k in self.__slots__ if getattr(self, k) is not None ])
+    d['prev'] = self.prev.as_dict()
+    d['next'] = self.next.as_dict()
+    return d
+
+  def __repr__(self):
+    return repr(self.as_dict())
+
+
+def arc_bezier_error(theta, radius):
+  """ the maximum radial deviation of a cubic bezier arc from the true circle, for the handle length
+      4/3 * tan(theta/4) * radius of corner_template(). theta is the angle swept by the arc [rad].
+      Upper bound from Goldapp, "Approximation of circular arcs by cubic polynomials", CAGD 8 (1991).
+  """
+  return 2./27. * math.sin(0.25 * theta)**6 / math.cos(0.25 * theta)**2 * radius
 
-# END OF INKSCAPE 0.92.X COMPATIBILITY HACK
 
+class CornerTemplateCache(object):
+  """ A bounded LRU cache of corner templates, see RoundedCorners.corner_template().
+      hits and misses count the lookups, for --stats.
+      Insertion order of a dict is not guaranteed on python2, so recency is kept in an OrderedDict:
+      a hit moves the entry to the end, and the first entry is evicted when the cache is full.
+  """
+  def __init__(self, size):
+    from collections import OrderedDict
+    self.size = size
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key):
+    tpl = self.entries.pop(key, None)
+    if tpl is None:
+      self.misses += 1
+      return None
+    self.entries[key] = tpl
+    self.hits += 1
+    return tpl
+
+  def put(self, key, tpl):
+    if self.size > 0:
+      if len(self.entries) >= self.size:
+        self.entries.popitem(last=False)
+      self.entries[key] = tpl
+
+  def __len__(self):
+    return len(self.entries)
 
-max_trim_factor = 0.90          # 0.5: can cut half of a segment length or handle length away for rounding a corner
-max_trim_factor_single = 0.98   # 0.98: we can eat up almost everything, as there are no neighbouring trims to be expected.
 
 class RoundedCorners(inkex.EffectExtension):
 
     def add_arguments(self, pars):              # an __init__ in disguise ...
-      try:
-        self.tty = open("/dev/tty", 'w')
-      except:
+      self.tty = None                   # only opened when debugging. All users are guarded by 'if debug:'
+      if debug:
         try:
-          self.tty = open("CON:", 'w')        # windows. Does this work???
+          self.tty = open("/dev/tty", 'w')
         except:
-          self.tty = open(os.devnull, 'w')  # '/dev/null' for POSIX, 'nul' for Windows.
-      if debug: print("RoundedCorners ...", file=self.tty)
-      self.nodes_inserted = {}
+          try:
+            self.tty = open("CON:", 'w')      # windows. Does this work???
+          except:
+            self.tty = open(os.devnull, 'w')  # '/dev/null' for POSIX, 'nul' for Windows.
+        print("RoundedCorners ...", file=self.tty)
       self.eps = 0.00001                # avoid division by zero
-      self.radius = None
-      self.max_trim_factor = max_trim_factor
+      self.radius = None                # in user units of the path being rounded, see use_scale()
+      self.tolerance = 0.0
+      self.unit = 'user'                # --unit: radius and tolerance are given in this unit, or in user units of each path.
+      self.doc_radius = None            # --radius, in --unit
+      self.doc_tolerance = 0.0          # --tolerance, in --unit
+      self.scale = 1.0                  # user units per --unit of the path being rounded, see use_scale()
+      self.scales = {}                  # --unit: user units per --unit inside a container element, see unit_scale()
+      self.nonuniform = 0               # --unit: number of containers seen with a non-uniform scale or skew, see unit_scale()
+      self.exact = False
+      self.clamp = False
+      self.max_radius = None            # --max-radius: the limit given as --radius. self.doc_radius is then the radius found by round_corners_numpy.fit_radius().
+      self.precision = 4                # decimal digits of the path data written, see use_document()
+      self.coordinates = 'auto'
 
       self.skipped_degenerated = 0      # not a useful corner (e.g. 180deg corner)
       self.skipped_small_count = 0      # not enough room for arc
       self.skipped_small_len = 1e99     # record the shortest handle (or segment) when skipping.
-
-      pars.add_argument("--radius", type=float, default=2.0, help="Radius [mm] to round selected vertices. Default: 2")
+      self.skipped_stretched = 0        # no corner (180deg), nothing to do.
+      self.skipped_rounded = 0          # already rounded by an earlier run with the same settings, see rounded_attr.
+      self.rounded_arc2 = 0             # arcs of one bezier segment (up to 90deg without --tolerance): two nodes
+      self.rounded_arc3 = 0             # arcs of more segments (more than 90deg without --tolerance): three or more nodes
+      self.rounded_line = 0             # --method=line: cut with a straight line
+      self.paths_done = 0
+      self.shapes_done = 0              # rect, polygon, ... elements rounded as paths, see round_corners_shapes.shapes_to_paths()
+      self.paths_skipped = 0            # stamped by an earlier run with the same settings, see round_corners_record.set_rounded()
+      self.auto_selected = False        # True: the selection was made by find_roundable_nodes(), fillets of earlier runs are redone.
+      self.produced = []                # (node_idx, out_idx, count) per rounded corner of the last subpath, see round_superpath()
+      self.clamped_nodes = []           # --clamp: (node_idx, radius) per corner of the last subpath rounded with a smaller radius
+      self.clamped = []                 # --clamp: (path_id, subpath_idx, node_idx, radius) of all paths, for the run report
+      self.templates = CornerTemplateCache(template_cache_size)
+      self.timings = dict.fromkeys(stats_phases, 0.0)   # seconds per phase, see lap()
+
+      pars.add_argument("--radius", type=float, default=2.0, help="Radius (in --unit) to round selected vertices. Default: 2")
+      pars.add_argument("--unit", type=str, default="user", help="unit of --radius and --tolerance: one of 'user' (default, user units of each path, as drawn), 'px', 'pt', 'pc', 'mm', 'cm', 'in', 'q'. Other units include the transforms of the groups and the viewBox of the document. Groups that scale non-uniformly or skew are sized by their mean scale, the arcs in them are not circular as rendered.")
       pars.add_argument("--method", type=str, default="arc", help="operation: one of 'arc' (default), 'arc+cross', 'line'")
+      pars.add_argument("--tolerance", type=float, default=0.0, help="split arcs into as many bezier segments as needed to stay within this distance from the true circle. Default: 0, one segment up to 90deg, two above")
+      pars.add_argument("--exact", type=getattr(inkex, 'Boolean', bool), default=False, help="on curved segments, let the arc touch the curves, and split them there. Requires numpy. Default: False, trim along the tangents at the corner")
+      # inkscape passes each param of the inx file as --name, and inx param names are spelled with an underscore.
+      pars.add_argument("--max-radius", "--max_radius", dest="max_radius", type=getattr(inkex, 'Boolean', bool), default=False, help="use the largest radius up to --radius with which all selected corners can be rounded. Requires numpy. Default: False")
+      pars.add_argument("--clamp", type=getattr(inkex, 'Boolean', bool), default=False, help="round corners without enough space with the largest radius that fits, instead of skipping them. Default: False")
+      pars.add_argument("--precision", type=int, default=4, help="decimal digits of the path data written, more in documents smaller than 100 user units. Default: 4")
+      pars.add_argument("--coordinates", type=str, default="auto", help="path data: one of 'auto' (default, the shorter of both per segment), 'absolute', 'relative'")
+      pars.add_argument("--all", type=getattr(inkex, 'Boolean', bool), default=False, help="round all paths (and rect, polygon, polyline objects) of the document, if no paths or nodes are selected. Not those in defs, clip paths, masks or symbols. Default: False")
+      pars.add_argument("--jobs", type=int, default=1, help="number of worker processes to round many paths in parallel. 0: one per cpu. Default: 1")
+      pars.add_argument("--engine", type=str, default="auto", help="corner engine: one of 'auto' (default), 'python', 'numpy'. 'auto' uses numpy (if installed) for subpaths with many selected corners.")
+      pars.add_argument("--stats", type=str, default="", help="write wall time per phase and corner counts as json to this file, '-' for stderr. Default: no stats")
+      pars.add_argument("--stats-prom", type=str, default="", help="also write the stats as a prometheus textfile (node_exporter textfile collector)")
 
 
     def effect(self):
@@ -258,42 +266,189 @@ class RoundedCorners(inkex.EffectExtension):
           # SvgInputMixin __init__: "id:subpath:position of selected nodes, if any"
           print(self.options.selected_nodes, file=self.tty)
 
-        self.radius = math.fabs(self.options.radius)
-        self.cut = False
-        if self.options.method in ('line'):
-          self.cut = True
+        t_start = clock()
+        self.apply_options()
+        self.use_document(self.document.getroot())
         if len(self.options.selected_nodes) < 1:
-          # find selected objects and construct a list of selected_nodes for them...
-          for p in self.options.ids:
-            self.options.selected_nodes.extend(self.find_roundable_nodes(p))
-          if len(self.options.selected_nodes) < 1:
+          # find selected objects and construct a selection index for them...
+          self.auto_selected = True
+          selection = {}
+          ids = self.options.ids
+          if len(ids) < 1 and self.options.all:
+            shapes = round_corners_shapes.shapes_to_paths(self)
+            paths = self.document.getroot().xpath('//svg:path[@id]', namespaces=inkex.NSS)
+            ids = [ p.get('id') for p in paths if not round_corners_shapes.shape_hidden(p) ]     # as the shapes
+          else:
+            shapes = round_corners_shapes.shapes_to_paths(self, ids)
+          for p in ids:
+            subpaths = self.find_roundable_nodes(p)
+            if len(subpaths):
+              selection[p] = subpaths
+          if len(selection) < 1:
+            round_corners_shapes.restore_shapes(self, shapes)
+            if self.paths_skipped or self.skipped_rounded:
+              self.write_stats(clock() - t_start)
+              return      # all corners were rounded by an earlier run. Nothing to do.
             raise inkex.AbortExtension("Could not find nodes inside a path. No path objects selected?")
-
-        if len(self.options.selected_nodes) == 1:
-          # when we only trim one node, we can eat up almost everything,
-          # no need to leave room for rounding neighbour nodes.
-          self.max_trim_factor = max_trim_factor_single
-
-        for node in sorted(self.options.selected_nodes):
-          ## we walk through the list sorted, so that node indices are processed within a subpath in ascending numeric order.
-          ## that makes adjusting index offsets after node inserts easier.
-          ss = self.round_corner(node)
+        else:
+          shapes = []
+          selection = self.selection_index(self.options.selected_nodes)
+
+        if self.max_radius is not None:
+          import round_corners_numpy
+          self.doc_radius = round_corners_numpy.fit_radius(self, selection)
+          print("Radius %g: the largest up to %g that fits all selected corners.\n" % (self.doc_radius, self.max_radius), file=sys.stderr)
+
+        jobs = self.options.jobs
+        if jobs < 1:
+          jobs = os.cpu_count() if hasattr(os, 'cpu_count') else 1
+        done = False
+        if jobs > 1 and len(selection) > 1:
+          import round_corners_parallel
+          done = round_corners_parallel.round_paths_parallel(self, selection, min(jobs, len(selection)))
+        if not done:
+          for path_id in sorted(selection):
+            self.round_corner(path_id, selection[path_id])
+        round_corners_shapes.restore_shapes(self, shapes)
+        self.write_stats(clock() - t_start)
+
+
+    def apply_options(self):
+      """ set up radius, method and engine from self.options. Used by effect() and round_corners_stream.round_stream(). """
+      self.doc_radius = math.fabs(self.options.radius)
+      self.doc_tolerance = math.fabs(self.options.tolerance)
+      self.unit = self.options.unit
+      if self.unit != 'user' and self.unit not in units_px:
+        raise inkex.AbortExtension("--unit=%s: must be one of 'user', %s." % (self.unit, ', '.join([ "'%s'" % u for u in sorted(units_px) ])))
+      self.scales = {}
+      self.nonuniform = 0
+      self.use_scale(1.0)
+      self.exact = self.options.exact
+      if self.exact:
+        try:
+          import round_corners_exact
+        except ImportError as e:
+          raise inkex.AbortExtension("--exact: %s" % e)
+      self.clamp = self.options.clamp
+      if self.clamp and self.exact:
+        # the exact fillets are solved for one radius in advance, see round_corners_exact.solve_walks().
+        raise inkex.AbortExtension("--clamp cannot be combined with --exact.")
+      self.max_radius = None
+      if self.options.max_radius:
+        if self.exact:
+          raise inkex.AbortExtension("--max-radius cannot be combined with --exact.")
+        try:
+          import numpy
+        except ImportError:
+          raise inkex.AbortExtension("--max-radius: python module numpy not found.")
+        self.max_radius = self.doc_radius
+      self.precision = max(0, self.options.precision)
+      self.coordinates = self.options.coordinates
+      if self.coordinates not in ('auto', 'absolute', 'relative'):
+        raise inkex.AbortExtension("--coordinates=%s: must be one of 'auto', 'absolute', 'relative'." % self.coordinates)
+      self.cut = False
+      if self.options.method in ('line'):
+        self.cut = True
+      self.numpy_min_corners = None     # None: never use the numpy engine.
+      if self.options.engine != 'python':
+        try:
+          import numpy
+          self.numpy_min_corners = { 'numpy': 1 }.get(self.options.engine, numpy_min_corners)
+        except ImportError:
+          if self.options.engine == 'numpy':
+            raise inkex.AbortExtension("--engine=numpy: python module numpy not found.")
+
+
+    def use_scale(self, scale):
+      """ set self.radius and self.tolerance for a path with scale user units per --unit, see path_scale() """
+      self.scale = scale
+      self.radius = self.doc_radius * scale
+      self.tolerance = self.doc_tolerance * scale
+
+
+    def path_scale(self, elem):
+      """ the user units per --unit of the path elem, after its own transform was applied. 1.0 for --unit=user. """
+      if self.unit == 'user':
+        return 1.0
+      return self.unit_scale(elem.getparent())
+
+
+    def unit_scale(self, elem):
+      """ the user units per --unit inside the container elem: the viewBox scale of the svg root, divided by the scale
+          of the transforms of elem and its ancestors, see transform_scale().
+          The scales are cached per container in self.scales. The ancestors not seen yet are filled in top-down, from
+          the nearest known one, so that each group is computed once, and a path costs one lookup of its parent.
+          Only the own transform of a path is applied to its path data. A group that scales non-uniformly or skews keeps its
+          transform, the arcs inside are then circular in user units, but elliptical as rendered. Counted in self.nonuniform.
+      """
+      scale = self.scales.get(elem)
+      if scale is not None:
+        return scale
+      todo = []
+      while elem is not None and scale is None:
+        todo.append(elem)
+        elem = elem.getparent()
+        scale = self.scales.get(elem) if elem is not None else None
+      for elem in reversed(todo):
+        if scale is None:
+          scale = user_units_per(elem, self.unit)    # the svg root
+        t = transform_scale(elem.attrib.get('transform'))
+        if not transform_uniform(elem.attrib.get('transform')):
+          self.nonuniform += 1
+        if t > 0:
+          scale /= t
+        self.scales[elem] = scale
+      return scale
+
+
+    def selection_index(self, selected_nodes):
+      """ compile a list of selected_nodes strings 'path_id:subpath_idx:node_idx' into a selection index
+          { path_id: { subpath_idx: [ node_idx, ... ] } } in one pass.
+          Node indices are integers in ascending numeric order ('path1:0:2' before 'path1:0:10'), duplicates are removed.
+      """
+      index = {}
+      for node in selected_nodes:
+        path_id, subpath_idx, node_idx = node.rsplit(":", 2)
+        index.setdefault(path_id, {}).setdefault(int(subpath_idx), set()).add(int(node_idx))
+      for subpaths in index.values():
+        for subpath_idx in subpaths:
+          subpaths[subpath_idx] = sorted(subpaths[subpath_idx])
+      return index
 
 
     def find_roundable_nodes(self, path_id):
       """ select all nodes of all (sub)paths. except for
           - the last (one or two) nodes of a closed path (which coindide with the first node)
           - the first and last node of an open path (which cannot be smoothed)
+          - the arcs of an earlier run with the same settings, see round_corners_record.unround().
+          Returns the selection index entry for path_id: { subpath_idx: [ node_idx, ... ] }, see selection_index().
+          A path stamped by an earlier run with the same settings, and not modified since, is not even parsed.
       """
-      ret = []
+      ret = {}
       elem = self.svg.getElementById(path_id)
-      if elem.tag != '{'+elem.nsmap['svg']+'}path':
-        return ret      # ellipse never works.
+      if elem.tag != inkex.addNS('path', 'svg'):
+        return ret      # rect, polygon, polyline are converted before, see round_corners_shapes.shapes_to_paths(). Ellipses never have corners.
+      value = round_corners_record.rounded_record(self, elem)
+      if value and not elem.attrib.get('transform') and value.partition(';')[0] == round_corners_record.rounded_stamp(self, elem.get('d')):
+        self.skipped_rounded += value.count(':') + value.count(',')     # one range each
+        self.paths_skipped += 1
+        return ret
       try:
         csp = elem.path.to_superpath()
       except:
         return ret
+      rounded, restored = round_corners_record.unround(self, csp, parse_rounded(value))
+      ret = self.roundable_nodes(csp, rounded)
+      if debug:
+        print("find_roundable_nodes: ", path_id, ret, file=sys.stderr)
+      return ret
 
+
+    def roundable_nodes(self, csp, rounded=None):
+      """ the node selection of find_roundable_nodes() for a parsed superpath csp.
+          Nodes within the ranges of the index rounded (see parse_rounded()) are not selected, they count as skipped_rounded.
+      """
+      ret = {}
       for sp_idx in range(0, len(csp)):
         sp = csp[sp_idx]
         if len(sp) < 3:
@@ -306,11 +461,16 @@ class RoundedCorners(inkex.EffectExtension):
         else:
           idx_s = 1     # open paths count from 1 to either n-1
           idx_e = len(sp) - 1
-        for idx in range(idx_s, idx_e):
-          ret.append("%s:%d:%d" % (path_id, sp_idx, idx))
-
-        if debug:
-          print("find_roundable_nodes: ", self.options.selected_nodes, file=sys.stderr)
+        if idx_e > idx_s:
+          nodes = list(range(idx_s, idx_e))
+          if rounded and sp_idx in rounded:
+            skip = set()
+            for first, last, settings in rounded[sp_idx]:
+              skip.update(range(first, last + 1))
+            self.skipped_rounded += len(rounded[sp_idx])
+            nodes = [ i for i in nodes if i not in skip ]
+          if len(nodes):
+            ret[sp_idx] = nodes
       return ret
 
 
@@ -325,43 +485,43 @@ class RoundedCorners(inkex.EffectExtension):
       return abs(p1[0]-p2[0]) < eps and abs(p1[1]-p2[1]) < eps
 
 
-    def round_corner(self, node_id):
-      """ round the corner at (adjusted) node_idx of subpath
-          Side_effect: store (or increment) in self.inserted["pathname:subpath"] how many points were inserted in that subpath.
-          the adjusted node_idx is computed by adding that number (if exists) to the value of the node_id before doing any manipulation
+    def round_corner(self, path_id, subpaths):
+      """ round all selected corners of one path in one batch.
+          subpaths is a dict { subpath_idx: [ node_idx, ... ] }, node indices are those of the unmodified path,
+          or, if self.auto_selected, of the path after round_corners_record.unround(), as find_roundable_nodes() sees it.
+          The path is looked up, transformed and parsed once, all corners are applied to the in-memory superpath,
+          and the result is serialized once. A path where nothing changed is not written back.
       """
-      s = node_id.split(":")
-      path_id = s[0]
-      subpath_idx = int(s[1])
-      subpath_id = s[0] + ':' + s[1]
-      idx_adjust = self.nodes_inserted.get(subpath_id, 0)
-      node_idx = int(s[2]) + idx_adjust
-
+      t = clock()
       elem = self.svg.getElementById(path_id)
       if elem is None:
-        print("selected_node %s not found in svg document" % node_id, file=sys.stderr)
+        print("selected path %s not found in svg document" % path_id, file=sys.stderr)
         return None
 
-      elem.apply_transform()       # modifies path inplace? -- We save later back to the same element. Maybe we should not?
-      path = elem.path
-      s = path.to_superpath()
-      sp = s[subpath_idx]
-
-      ## call the actual path manipulator, record how many nodes were inserted.
-      orig_len = len(sp)
-      sp = self.subpath_round_corner(sp, node_idx)
-      idx_adjust += len(sp) - orig_len
+      value = round_corners_record.rounded_record(self, elem)
+      self.use_scale(self.path_scale(elem))
+      t = self.lap('lookup', t)
+      s = self.path_superpath(elem.get('d'), elem.attrib.get('transform'))
+      rounded = parse_rounded(value)
+      restored = 0
+      if self.auto_selected:
+        rounded, restored = round_corners_record.unround(self, s, rounded)
+      t = self.lap('to_superpath', t)
+      rounded, count = self.round_superpath(s, subpaths, rounded, path_id)
+      t = self.lap('corners', t)
+      if not (count or restored):
+        # no corner could be rounded, keep the path data and its transform as they are.
+        if self.auto_selected and not elem.attrib.get('transform'):
+          round_corners_record.set_rounded(self, elem, rounded, True)
+        return None
 
       # convert the superpath back to a normal path
-      s[subpath_idx] = sp
-      elem.set_path(s.to_path(curves_only=False))
-      self.nodes_inserted[subpath_id] = idx_adjust
-
-
-      # If we picked up the 'd' attribute of a non-path (e.g. star), we must make sure the object now becomes a path.
-      # Otherwise inkscape uses the sodipodi data and ignores our changed 'd' attribute.
-      if '{'+elem.nsmap['sodipodi']+'}type' in elem.attrib:
-        del(elem.attrib['{'+elem.nsmap['sodipodi']+'}type'])
+      path = self.format_path(s, elem.get('d'))
+      t = self.lap('to_path', t)
+      self.set_path(elem, path)
+      round_corners_record.set_rounded(self, elem, rounded, self.auto_selected)
+      self.lap('write_back', t)
+      self.paths_done += 1
 
       # Debugging is no longer available or not yet implemented? This explodes, although it is
       # documented in https://inkscape.gitlab.io/extensions/documentation/inkex.command.html
@@ -370,7 +530,157 @@ class RoundedCorners(inkex.EffectExtension):
       # But hey, we can always resort to good old ET.dump(self.document) ...
 
 
-    def super_node(self, sp, node_idx):
+    def round_superpath(self, s, subpaths, rounded=None, path_id=None):
+      """ round the corners given in subpaths { subpath_idx: [ node_idx, ... ] } of the superpath s. Modifies s inplace.
+          rounded is the index of the arcs already in s, see parse_rounded(). path_id is only used for self.clamped.
+          Returns (rounded, count): the index updated to the new node positions, with the arcs made here added,
+          and the number of corners rounded.
+      """
+      rounded = dict(rounded or {})
+      settings = round_corners_record.rounded_settings(self)
+      count = 0
+      walks = {}
+      if self.exact:
+        # the tangent points of all subpaths are solved in one go, the corners are then walked with the python engine.
+        import round_corners_exact
+        for subpath_idx in subpaths:
+          walks[subpath_idx] = round_corners_exact.ExactWalk(self, s[subpath_idx], subpaths[subpath_idx])
+        round_corners_exact.solve_walks(self, walks.values())
+      for subpath_idx in sorted(subpaths):
+        nodes = subpaths[subpath_idx]
+        self.produced = []
+        self.clamped_nodes = []
+        if subpath_idx in walks:
+          s[subpath_idx] = self.subpath_round_corners(s[subpath_idx], nodes, walks[subpath_idx])
+        elif self.numpy_min_corners is not None and len(nodes) >= self.numpy_min_corners:
+          import round_corners_numpy
+          # the flat result is kept, format_superpath() reads it as it is.
+          s[subpath_idx] = round_corners_numpy.flat_round_corners_np(self, subpath_to_flat(s[subpath_idx]), nodes)
+        else:
+          s[subpath_idx] = self.subpath_round_corners(s[subpath_idx], nodes)
+        self.clamped.extend([ (path_id, subpath_idx, node_idx, r / self.scale) for node_idx, r in self.clamped_nodes ])
+        if not self.produced:
+          continue
+        count += len(self.produced)
+        # earlier arcs move by the nodes added before them. Arcs that were rounded again are gone.
+        srcs = [ p[0] for p in self.produced ]
+        ranges = []
+        for first, last, old in rounded.get(subpath_idx, ()):
+          k = bisect_left(srcs, first)
+          if k < len(srcs) and srcs[k] <= last:
+            continue
+          shift = sum([ p[2] - 1 for p in self.produced[:k] ])
+          ranges.append((first + shift, last + shift, old))
+        ranges += [ (out_idx, out_idx + n - 1, settings) for node_idx, out_idx, n in self.produced ]
+        rounded[subpath_idx] = sorted(ranges)
+      return rounded, count
+
+
+    def format_path(self, s, d):
+      """ the d string of the superpath s, as set by --precision and --coordinates. See format_superpath().
+          d is the path data s was read from: the subpaths that end with z there are closed, see closed_subpaths().
+      """
+      return format_superpath(s, self.precision, self.coordinates, closed_subpaths(d))
+
+
+    def use_document(self, root):
+      """ the decimal digits of the path data written, for the document with the svg root element: --precision, and one
+          more for each power of ten that the document is smaller than 100 user units. Numbers as large as the document
+          thus keep at least --precision + 2 significant digits, also where a user unit is a cm or an inch.
+      """
+      self.precision = max(0, self.options.precision)
+      size = document_size(root)
+      if size:
+        self.precision += max(0, 2 - int(math.floor(math.log10(size))))
+
+
+    def path_superpath(self, d, transform=None):
+      """ the superpath of the path data d, with the value of a transform attribute applied in full precision.
+          The element is not changed here. set_path() removes the transform when it writes the rounded path data,
+          a path that is not rounded keeps both. (inkex apply_transform() would rewrite d at 6 significant digits.)
+          Callers pass elem.attrib.get('transform'): inkex 1.x elem.get('transform') returns the value, and writes it
+          back, reformatted as a matrix with 6 significant digits.
+      """
+      path = inkex.Path(d or '')
+      if transform:
+        path = path.transform(inkex.Transform(transform))
+      return path.to_superpath()
+
+
+    def set_path(self, elem, path):
+      """ write path back into elem. path is a path object or a d string, with the transform of elem applied,
+          see path_superpath(). elem can also be a plain lxml element, see round_corners_stream.
+      """
+      if isinstance(path, str):
+        elem.set('d', path)     # elem.set_path() would parse and reformat it.
+      else:
+        elem.set_path(path)
+      elem.attrib.pop('transform', None)
+
+      # If we picked up the 'd' attribute of a non-path (e.g. star), we must make sure the object now becomes a path.
+      # Otherwise inkscape uses the sodipodi data and ignores our changed 'd' attribute.
+      if inkex.addNS('type', 'sodipodi') in elem.attrib:
+        del(elem.attrib[inkex.addNS('type', 'sodipodi')])
+
+
+    def lap(self, phase, t0):
+      """ add the time since t0 to the phase. Returns the current time, to start the next phase. """
+      t = clock()
+      self.timings[phase] += t - t0
+      return t
+
+
+    def write_stats(self, total):
+      """ --stats: write timings and corner counts as json. --stats-prom: also as a prometheus textfile. """
+      if not self.options.stats and not self.options.stats_prom:
+        return
+      import json
+
+      corners = dict([ (k, getattr(self, k)) for k in corner_counters ])
+      corners['rounded'] = self.rounded_arc2 + self.rounded_arc3 + self.rounded_line
+      stats = { 'version': __version__, 'radius': self.doc_radius, 'max_radius': self.max_radius, 'unit': self.unit, 'method': self.options.method, 'engine': self.options.engine,
+                'paths': self.paths_done, 'shapes': self.shapes_done, 'corners': corners,
+                'skipped_small_len': self.skipped_small_len if self.skipped_small_count else None,
+                'template_cache': { 'hits': self.templates.hits, 'misses': self.templates.misses },
+                'seconds': dict(self.timings, total=total) }
+      if self.clamp:
+        corners['clamped'] = len(self.clamped)
+        stats['clamped'] = [ { 'path': path_id, 'subpath': subpath_idx, 'node': node_idx, 'radius': r }
+                             for path_id, subpath_idx, node_idx, r in self.clamped ]
+      if self.options.stats == '-':
+        print(json.dumps(stats, indent=2, sort_keys=True), file=sys.stderr)
+      elif self.options.stats:
+        with open(self.options.stats, 'w') as fd:
+          json.dump(stats, fd, indent=2, sort_keys=True)
+          fd.write("\n")
+
+      if self.options.stats_prom:
+        lines = [ "# HELP round_corners_seconds Wall time per phase of the last run.",
+                  "# TYPE round_corners_seconds gauge" ]
+        for k in stats_phases:
+          lines.append('round_corners_seconds{phase="%s"} %.6f' % (k, self.timings[k]))
+        lines += [ "# HELP round_corners_run_seconds Wall time of the last run.",
+                   "# TYPE round_corners_run_seconds gauge",
+                   "round_corners_run_seconds %.6f" % total ]
+        lines += [ "# HELP round_corners_corners Corners of the last run by outcome.",
+                   "# TYPE round_corners_corners gauge" ]
+        for k in sorted(corners):
+          lines.append('round_corners_corners{outcome="%s"} %d' % (k, corners[k]))
+        lines += [ "# HELP round_corners_template_cache Corner template cache lookups of the last run by result.",
+                   "# TYPE round_corners_template_cache gauge",
+                   'round_corners_template_cache{result="hit"} %d' % self.templates.hits,
+                   'round_corners_template_cache{result="miss"} %d' % self.templates.misses ]
+        lines += [ "# HELP round_corners_paths Paths rounded in the last run.",
+                   "# TYPE round_corners_paths gauge",
+                   "round_corners_paths %d" % self.paths_done ]
+        # the textfile collector may read at any time: write a temp file and rename it.
+        tmp = self.options.stats_prom + '.tmp'
+        with open(tmp, 'w') as fd:
+          fd.write("\n".join(lines) + "\n")
+        getattr(os, 'replace', os.rename)(tmp, self.options.stats_prom)
+
+
+    def super_node(self, sp, node_idx, prev_node=None, next_node=None):
       """ In case of node_idx 0, we need to use either the last, the second-last or the third last node as a previous node.
           For a closed subpath, the last node and the first node are identical. Then, the second last node may be still at the
           same location if it has a handle. If so, we take the third last instead. Gah. It has a certain logic...
@@ -398,10 +708,14 @@ class RoundedCorners(inkex.EffectExtension):
             That is an approximation when the segment is curved, and exact when it is straight.
             (Finding exact candidate points on curved lines that have tangents with the desired circle
             is beyond me today. Multiple candidates may exist. Any volunteers?)
+
+          prev_node and next_node override sp[prev_idx] and sp[next_idx]. subpath_round_corners() uses them to pass in
+          the neighbours as they are at the time of rounding: prev_node may already be the end of the previous arc.
       """
 
       prev_idx = node_idx - 1
-      sp_node_idx_ = copy.deepcopy(sp[node_idx])        # if this wraps around, at node_idx=0, we may need to tweak the prev handle
+      sp_node_idx_ = list(sp[node_idx])         # if this wraps around, at node_idx=0, we may need to tweak the prev handle.
+                                                # The handles are never modified, a shallow copy is enough.
       if node_idx == 0:
         prev_idx = len(sp) - 1
         if self.very_close(sp_node_idx_, sp[prev_idx]):
@@ -422,8 +736,8 @@ class RoundedCorners(inkex.EffectExtension):
       next_idx = node_idx + 1
       if next_idx >= len(sp): next_idx = 0
       t = sp_node_idx_
-      p = sp[prev_idx]
-      n = sp[next_idx]
+      p = sp[prev_idx] if prev_node is None else prev_node
+      n = sp[next_idx] if next_node is None else next_node
       dir1 = [ p[2][0] - t[1][0], p[2][1] - t[1][1] ]           # direction to the previous node (rel coords)
       dir2 = [ n[0][0] - t[1][0], n[0][1] - t[1][1] ]           # direction to the next node (rel coords)
       dist1 = math.sqrt(dir1[0]*dir1[0] + dir1[1]*dir1[1])      # distance to the previous node
@@ -433,46 +747,49 @@ class RoundedCorners(inkex.EffectExtension):
       if self.very_close_xy(handle1, [ 0, 0 ]): handle1 = dir1
       if self.very_close_xy(handle2, [ 0, 0 ]): handle2 = dir2
 
-      prev = { 'idx': prev_idx, 'dir':dir1, 'handle':handle1 }
-      next = { 'idx': next_idx, 'dir':dir2, 'handle':handle2 }
-      sn = { 'idx': node_idx, 'prev': prev, 'next': next, 'x': t[1][0], 'y': t[1][1] }
+      prev = SuperNodeSide(prev_idx, dir1, handle1)
+      next = SuperNodeSide(next_idx, dir2, handle2)
+      sn = SuperNode(node_idx, t[1][0], t[1][1], prev, next)
 
-      if dist1 < self.radius:
+      r = self.radius
+      if self.clamp:
+        r = 0.0                 # short segments and handles limit sn.radius below, they do not skip the corner.
+      if dist1 < r:
         if debug:
           print("subpath node_idx=%d, dist to prev(%d) is smaller than radius: %g < %g" %
                 (node_idx, prev_idx, dist1, self.radius), file=sys.stderr)
-          pprint.pprint(sn, stream=sys.stderr)
+          pprint.pprint(sn.as_dict(), stream=sys.stderr)
         if self.skipped_small_len > dist1: self.skipped_small_len = dist1
         self.skipped_small_count += 1
         return None, None
 
-      if dist2 < self.radius:
+      if dist2 < r:
         if debug:
           print("subpath node_idx=%d, dist to next(%d) is smaller than radius: %g < %g" %
                 (node_idx, next_idx, dist2, self.radius), file=sys.stderr)
-          pprint.pprint(sn, stream=sys.stderr)
+          pprint.pprint(sn.as_dict(), stream=sys.stderr)
         if self.skipped_small_len > dist2: self.skipped_small_len = dist2
         self.skipped_small_count += 1
         return None, None
 
       len_h1 = math.sqrt(handle1[0]*handle1[0] + handle1[1]*handle1[1])
       len_h2 = math.sqrt(handle2[0]*handle2[0] + handle2[1]*handle2[1])
-      prev['hlen'] = len_h1
-      next['hlen'] = len_h2
+      prev.hlen = len_h1
+      next.hlen = len_h2
 
-      if len_h1 < self.radius:
+      if len_h1 < r:
         if debug:
           print("subpath node_idx=%d, handle to prev(%d) is shorter than radius: %g < %g" %
                 (node_idx, prev_idx, len_h1, self.radius), file=sys.stderr)
-          pprint.pprint(sn, stream=sys.stderr)
+          pprint.pprint(sn.as_dict(), stream=sys.stderr)
         if self.skipped_small_len > len_h1: self.skipped_small_len = len_h1
         self.skipped_small_count += 1
         return None, None
-      if len_h2 < self.radius:
+      if len_h2 < r:
         if debug:
           print("subpath node_idx=%d, handle to next(%d) is shorter than radius: %g < %g" %
                 (node_idx, next_idx, len_h2, self.radius), file=sys.stderr)
-          pprint.pprint(sn, stream=sys.stderr)
+          pprint.pprint(sn.as_dict(), stream=sys.stderr)
         if self.skipped_small_len > len_h2: self.skipped_small_len = len_h2
         self.skipped_small_count += 1
         return None, None
@@ -480,140 +797,221 @@ class RoundedCorners(inkex.EffectExtension):
       if len_h1 > dist1: # shorten that handle to dist1, avoid overshooting the point
         handle1[0] = handle1[0] * dist1 / len_h1
         handle1[1] = handle1[1] * dist1 / len_h1
-        prev['hlen'] = dist1
+        prev.hlen = dist1
       if len_h2 > dist2: # shorten that handle to dist2, avoid overshooting the point
         handle2[0] = handle2[0] * dist2 / len_h2
         handle2[1] = handle2[1] * dist2 / len_h2
-        next['hlen'] = dist2
+        next.hlen = dist2
 
+      if self.clamp:
+        sn.radius = min(self.radius, dist1, dist2, len_h1, len_h2)
       return sn, sp_node_idx_
 
 
-    def arc_c_m_from_super_node(self, s):
-      """
-      Given the supernode s and the radius self.radius, we compute and return two points:
-      c, the center of the arc and m, the midpoint of the arc.
-
-      Method used:
-      - construct the ray c_m_vec that runs though the original point p=[x,y] through c and m.
-      - next.trim_pt, [x,y] and c form a rectangular triangle. Thus we can
-        compute cdist as the length of the hypothenuses under trim and radius.
-      - c is then cdist away from [x,y] along the vector c_m_vec.
-      - m is closer to [x,y] than c by exactly radius.
-      """
-
-      a = [ s['prev']['trim_pt'][0] - s['x'], s['prev']['trim_pt'][1] - s['y'] ]
-      b = [ s['next']['trim_pt'][0] - s['x'], s['next']['trim_pt'][1] - s['y'] ]
-
-      c_m_vec = [ a[0] + b[0],
-                  a[1] + b[1] ]
-      l = math.sqrt( c_m_vec[0]*c_m_vec[0] + c_m_vec[1]*c_m_vec[1] )
-
-      cdist = math.sqrt( self.radius*self.radius + s['trim']*s['trim'] )    # distance [x,y] to circle center c.
-
-      c = [ s['x'] + cdist * c_m_vec[0] / l,                      # circle center
-            s['y'] + cdist * c_m_vec[1] / l ]
+    def subpath_round_corner(self, sp, node_idx):
+      """ round a single corner of the subpath sp. Returns the new subpath. """
+      return self.subpath_round_corners(sp, [node_idx])
 
-      m = [ s['x'] + (cdist-self.radius) * c_m_vec[0] / l,        # spline midpoint
-            s['y'] + (cdist-self.radius) * c_m_vec[1] / l ]
 
-      return (c, m)
+    def subpath_round_corners(self, sp, node_indices, walk=None):
+      """ round all corners node_indices of the subpath sp in one pass. Returns the new subpath.
 
+          The subpath is walked once in ascending node order. Unselected nodes are copied into the output
+          buffer, each selected node is replaced by the two or three nodes of its arc (or cut).
+          Corners see their previous neighbour as it was emitted, i.e. trimmed by a preceding arc,
+          and their next neighbour still untrimmed. This is the same order as rounding the corners one by one
+          in ascending order. node_indices refer to the original subpath, no index adjustments are needed.
 
-    def arc_bezier_handles(self, p1, p4, c):
+          Node 0 of a closed subpath is rounded first: its arc replaces the first node and also the
+          close marker at the end of the subpath.
+          Each rounded corner is appended to self.produced as (node_idx, out_idx, count): its nodes are out[out_idx:out_idx+count].
+          With --exact, walk is the round_corners_exact.ExactWalk of sp, made here if not given.
       """
-      Compute the control points p2 and p3 between points p1 and p4, so that the cubic bezier spline
-      defined by p1,p2,p3,p2 approximates an arc around center c
+      out = []
+      sel = sorted(node_indices)
+      pos = 0                           # next node of sp not yet copied to out
+      end = len(sp)                     # sp[end:] is not copied
+      closing = False                   # true when the close marker must become a copy of out[0]
+      plan = self.trim_plan(sp, sel)
+      if self.exact and walk is None:
+        import round_corners_exact
+        walk = round_corners_exact.ExactWalk(self, sp, sel)
+        round_corners_exact.solve_walks(self, [ walk ])
+      if walk:
+        sp = walk.sp                    # a copy, neighbours of split curves get new handles there.
+
+      if len(sel) and sel[0] == 0:
+        sel = sel[1:]
+        fillet = walk.fillet(0, out, None) if walk else None
+        nodes, sn = self.corner_nodes(walk.orig if fillet else sp, 0, fillet=fillet, next_trim=plan.get(1))
+        if nodes is not None:
+          if walk: walk.rounded(0, fillet, out, None)
+          self.produced.append((0, 0, len(nodes)))
+          out.extend(nodes)
+          pos = 1
+          # use prev idx to know about the extra skip: sp[sn.prev.idx+1] is the close marker, it is
+          # replaced at the end. Everything after it would be a duplicate of node 0.
+          end = sn.prev.idx + 1
+          closing = True
+
+      for node_idx in sel:
+        if node_idx >= end:
+          self.skipped_degenerated += 1           # this is the close marker. Node 0 was already rounded.
+          continue
+        out.extend(sp[pos:node_idx])
+        pos = node_idx + 1
+        next_node = None
+        next_trim = plan.get(node_idx + 1)
+        if closing and node_idx + 1 == end:
+          next_node = out[0]                      # the close marker is the start of the node 0 arc.
+          next_trim = None
+        fillet = walk.fillet(node_idx, out, end if closing else None) if walk else None
+        if fillet:
+          # checked against the original subpath, ExactWalk.fillet() knows where the neighbours end now.
+          nodes, sn = self.corner_nodes(walk.orig, node_idx, fillet=fillet, next_trim=next_trim)
+        else:
+          nodes, sn = self.corner_nodes(sp, node_idx, out[-1] if len(out) else None, next_node, next_trim=next_trim)
+        if nodes is None:
+          out.append(sp[node_idx])                # do nothing. stderr messages are already printed.
+        else:
+          if walk: walk.rounded(node_idx, fillet, out, end if closing else None)
+          self.produced.append((node_idx, len(out), len(nodes)))
+          out.extend(nodes)
+      out.extend(sp[pos:end])
 
-      Algorithm based on Aleksas Riškus and Hans Muller. Sorry Pomax, saw your works too, but did not use any.
+      # A closed path is formed by making the last node indentical to the first node.
+      # So, if we trimmed at the first node, then duplicte that trim on the last node, to keep the loop closed.
+      if closing:
+        out.append([ out[0][0][:], out[0][1][:], out[0][2][:] ])
+      return out
+
+
+    def trim_plan(self, sp, sel):
+      """ linear pre-pass of subpath_round_corners() over the sorted selection sel.
+          Returns { node_idx: trim } for each selected corner that directly follows another selected corner.
+          The two share the segment between them, corner_nodes() splits it in proportion to their trims.
+          The angle only depends on the directions towards the neighbours, it is the same before and after
+          the previous corner was rounded. Degenerated and stretched corners trim nothing and are left out.
       """
-      x1,y1 = p1
-      x4,y4 = p4
-      xc,yc = c
-
-      ax = x1 - xc
-      ay = y1 - yc
-      bx = x4 - xc
-      by = y4 - yc
-      q1 = ax * ax + ay * ay
-      q2 = q1 + ax * bx + ay * by
-      k2 = 4./3. * (math.sqrt(2 * q1 * q2) - q2) / (ax * by - ay * bx)
-
-      x2 = xc + ax - k2 * ay
-      y2 = yc + ay + k2 * ax
-      x3 = xc + bx + k2 * by
-      y3 = yc + by - k2 * bx
-
-      return ([x2, y2], [x3, y3])
-
-
-    def subpath_round_corner(self, sp, node_idx):
-      sn, sp_node_idx_ = self.super_node(sp, node_idx)
-      if sn is None: return sp          # do nothing. stderr messages are already printed.
+      plan = {}
+      prev_idx = None
+      for node_idx in sel:
+        if prev_idx == node_idx - 1 and node_idx + 1 < len(sp):
+          p, t, n = sp[node_idx-1], sp[node_idx], sp[node_idx+1]
+          x, y = t[1]
+          h1 = [ t[0][0] - x, t[0][1] - y ]
+          h2 = [ t[2][0] - x, t[2][1] - y ]
+          if self.very_close_xy(h1, [ 0, 0 ]): h1 = [ p[2][0] - x, p[2][1] - y ]
+          if self.very_close_xy(h2, [ 0, 0 ]): h2 = [ n[0][0] - x, n[0][1] - y ]
+          l = math.sqrt(h1[0]*h1[0]+h1[1]*h1[1]) * math.sqrt(h2[0]*h2[0]+h2[1]*h2[1])
+          if l > 0:
+            alpha = math.acos(max(-1.0, min(1.0, (h1[0]*h2[0]+h1[1]*h2[1]) / l)))
+            if alpha >= self.eps and abs(alpha - math.pi) >= self.eps:
+              plan[node_idx] = self.corner_template(alpha)[0]
+        prev_idx = node_idx
+      return plan
+
+
+    def corner_nodes(self, sp, node_idx, prev_node=None, next_node=None, fillet=None, next_trim=None):
+      """ compute the nodes that replace the corner sp[node_idx].
+          Returns a tuple (nodes, sn), nodes is None if the corner is skipped.
+          prev_node and next_node are passed through to super_node().
+          next_trim is the trim needed by the next corner, if it is rounded after this one, see trim_plan().
+          fillet is the exact geometry with --exact, see round_corners_exact.ExactWalk.fillet(). It is used
+          if the corner is not skipped.
+      """
+      sn, sp_node_idx_ = self.super_node(sp, node_idx, prev_node, next_node)
+      if sn is None: return None, None  # do nothing. stderr messages are already printed.
 
       # The angle to be rounded is now between the vectors a and b
       #
-      a = sn['prev']['handle']
-      b = sn['next']['handle']
-      a_len = sn['prev']['hlen']
-      b_len = sn['next']['hlen']
+      a = sn.prev.handle
+      b = sn.next.handle
+      a_len = sn.prev.hlen
+      b_len = sn.next.hlen
       try:
         # From https://de.wikipedia.org/wiki/Schnittwinkel_(Geometrie)
         # Wikipedia has an abs() in the formula, which extracts the smaller of the two angles.
         # We don't want that. We need to distinguish betwenn spitzwingklig and stumpfwinklig.
         #
-        alpha = math.acos( (a[0]*b[0]+a[1]*b[1]) / ( math.sqrt(a[0]*a[0]+a[1]*a[1]) * math.sqrt(b[0]*b[0]+b[1]*b[1]) ) )
+        cos_alpha = (a[0]*b[0]+a[1]*b[1]) / ( math.sqrt(a[0]*a[0]+a[1]*a[1]) * math.sqrt(b[0]*b[0]+b[1]*b[1]) )
+        # rounding errors can push cos_alpha of a straight line slightly below -1. That is stretched, not degenerated.
+        alpha = math.acos(max(-1.0, min(1.0, cos_alpha)))
       except:
         # Division by 0 error means path folds back on itself here. No space to apply a radius between the segments.
         self.skipped_degenerated += 1
-        return sp
+        return None, sn
 
-      sn['alpha'] = math.degrees(alpha)
+      sn.alpha = math.degrees(alpha)
 
       # find the amount to trim back both sides so that a circle of radius self.radius would perfectly fit.
       if alpha < self.eps:
         # path folds back on itself here. No space to apply a radius between the segments.
         self.skipped_degenerated += 1
-        return sp
+        return None, sn
       if abs(alpha - math.pi) < self.eps:
         # stretched. radius won't be visible, that is just fine. No need to warn about that.
-        return sp
-      trim = self.radius / math.tan(0.5 * alpha)
-      sn['trim'] = trim
+        self.skipped_stretched += 1
+        return None, sn
+      tpl = self.corner_template(alpha)
+      trim = tpl[0]
+      sn.trim = trim
       if trim < 0.0:
         print("Error: at node_idx=%d: angle=%g°, trim is negative: %g" % (node_idx, math.degrees(alpha), trim), file=sys.stderr)
-        return sp
+        return None, sn
 
       # a_len points to the previous node. There we can always allow max_trim_factor_single, as the trim was either already done,
-      # or will not be done. Only at b_len we need to reserve space for the next trim.
-      # FIXME: also allow max_trim_factor_single at b_len, when we find that the very next node will not be rounded.
+      # or will not be done. The segment at b_len is shared with the next corner, if that is selected too. trim_plan() knows
+      # its trim: when both fit, the segment is split in proportion to the two trims. When they don't, we take what we need
+      # and the next corner finds its a_len too short. Rounding in ascending order, this rounds the most corners.
       #
-      available_len = min(max_trim_factor_single*a_len, self.max_trim_factor*b_len)
+      # With --clamp, the segment is always split, so that both corners get rounded, with smaller radii if needed.
+      #
+      b_budget = max_trim_factor_single*b_len
+      if next_trim and (self.clamp or trim + next_trim <= b_budget):
+        b_budget *= trim / (trim + next_trim)
+      sn.prev.budget = max_trim_factor_single*a_len
+      sn.next.budget = b_budget
+      available_len = min(sn.prev.budget, b_budget)
+      if self.clamp:
+        # the trim is proportional to the radius. The largest radius that fits is where the trim equals available_len.
+        radius = min(sn.radius, self.radius * available_len / trim)
+        if radius < self.radius:
+          if radius < self.eps:
+            available_len = radius              # no room at all, skipped as too small below.
+          else:
+            tpl = self.corner_template(alpha, radius)
+            trim = min(tpl[0], available_len)   # equal, up to rounding errors.
+            sn.trim = trim
+        sn.radius = radius
       if trim > available_len:
         if debug:
-          if trim > max_trim_factor_single*a_len:
+          if trim > sn.prev.budget:
             print("Skipping where hlen_a %g * max_trim %g < needed_trim %g" % (a_len, max_trim_factor_single, trim), file=self.tty)
-          if trim > self.max_trim_factor*b_len:
-            print("Skipping where hlen_b %g * max_trim %g < needed_trim %g" % (b_len, self.max_trim_factor, trim), file=self.tty)
-          pprint.pprint(sn, stream=self.tty)
+          if trim > b_budget:
+            print("Skipping where hlen_b %g * max_trim %g < needed_trim %g" % (b_len, max_trim_factor_single, trim), file=self.tty)
+          pprint.pprint(sn.as_dict(), stream=self.tty)
         if self.skipped_small_len > available_len:
           self.skipped_small_len = available_len
         self.skipped_small_count += 1
-        return sp
-      trim_pt_p = [ sn['x'] + a[0] * trim / a_len, sn['y'] + a[1] * trim / a_len ]
-      trim_pt_n = [ sn['x'] + b[0] * trim / b_len, sn['y'] + b[1] * trim / b_len ]
-      sn['prev']['trim_pt'] = trim_pt_p
-      sn['next']['trim_pt'] = trim_pt_n
+        return None, sn
+      if sn.radius is not None and sn.radius < self.radius:
+        self.clamped_nodes.append((node_idx, sn.radius))
+      trim_pt_p = [ sn.x + a[0] * trim / a_len, sn.y + a[1] * trim / a_len ]
+      trim_pt_n = [ sn.x + b[0] * trim / b_len, sn.y + b[1] * trim / b_len ]
+      sn.prev.trim_pt = trim_pt_p
+      sn.next.trim_pt = trim_pt_n
 
       if debug:
-        pprint.pprint(sn, stream=self.tty)
+        pprint.pprint(sn.as_dict(), stream=self.tty)
         pprint.pprint(self.cut, stream=self.tty)
       # We replace the node_idx node by two nodes node_a, node_b.
       # We need an extra middle node node_m if alpha < 90° -- alpha is the angle between the tangents,
       # as the arc spans the remainder to complete 180° an arc with more than 90° needs the midpoint.
+      # With --tolerance, the template may have any number of middle nodes, see corner_template().
 
       # We preserve the endpoints of the two outside handles if they are non-0-length.
-      # We know that such handles are long enough (because of the above max_trim_factor checks)
+      # We know that such handles are long enough (because of the above max_trim_factor_single checks)
       # to not flip around when applying the trim.
       # But we move the endpoints of 0-length outside handles with the point when trimming,
       # so that they don't end up on the inside.
@@ -622,53 +1020,118 @@ class RoundedCorners(inkex.EffectExtension):
       if self.very_close_xy(prev_handle, sp_node_idx_[1]): prev_handle = trim_pt_p[:]
       if self.very_close_xy(next_handle, sp_node_idx_[1]): next_handle = trim_pt_n[:]
 
+      # the handles and the middle nodes are in the template, as multiples of the unit vectors ua, ub along a and b.
+      cx, cy = sn.x, sn.y
+      ua_x = a[0] / a_len
+      ua_y = a[1] / a_len
+      ub_x = b[0] / b_len
+      ub_y = b[1] / b_len
+      if fillet is not None:
+        # --exact: the arc touches the curves. It is placed at the virtual corner where their tangents meet.
+        (cx, cy), (ua_x, ua_y), (ub_x, ub_y), alpha, trim_pt_p, trim_pt_n, prev_handle, next_handle = fillet
+        tpl = self.corner_template(alpha)
+
       p1 = trim_pt_p[:]
       p7 = trim_pt_n[:]
-      arc_c, p4 = self.arc_c_m_from_super_node(sn)
       node_a = [ prev_handle, p1[:], p1[:] ]    # deep copy, as we may want to modify the second handle later
       node_b = [ p7[:], p7[:], next_handle ]    # deep copy, as we may want to modify the first handle later
-
-      if alpha >= 0.5*math.pi or self.cut:
-        if self.cut == False:
-          # p3,p4,p5 do not exist, we need no midpoint
-          p2, p6 = self.arc_bezier_handles(p1, p7, arc_c)
-          node_a[2] = p2
-          node_b[0] = p6
-        if node_idx == 0:
-          # use prev idx to know about the extra skip. +1 for the node here, +1 for inclusive.
-          # CAUTION: Keep in sync below
-          sp = [node_a] + [node_b] + sp[1:sn['prev']['idx']+2]
-        else:
-          sp = sp[:node_idx] + [node_a] + [node_b] + sp[node_idx+1:]
+      h = tpl[1]
+      inner = tpl[2]
+
+      if self.cut:
+        self.rounded_line += 1
+        return [node_a, node_b], sn
+      node_a[2] = [ p1[0] - h * ua_x, p1[1] - h * ua_y ]
+      node_b[0] = [ p7[0] - h * ub_x, p7[1] - h * ub_y ]
+      if not inner:
+        # p3,p4,p5 do not exist, we need no midpoint
+        self.rounded_arc2 += 1
+        return [node_a, node_b], sn
+
+      w_x = ua_x + ub_x                         # along the bisector, towards the circle center
+      w_y = ua_y + ub_y
+      t_x = ua_x - ub_x                         # perpendicular to it, towards p1
+      t_y = ua_y - ub_y
+      nodes = [ node_a ]
+      for pw, pt, hw, ht in inner:
+        x = cx + pw * w_x + pt * t_x
+        y = cy + pw * w_y + pt * t_y
+        hx = hw * w_x + ht * t_x
+        hy = hw * w_y + ht * t_y
+        nodes.append([ [ x + hx, y + hy ], [ x, y ], [ x - hx, y - hy ] ])
+      nodes.append(node_b)
+      self.rounded_arc3 += 1
+      return nodes, sn
+
+
+    def corner_template(self, alpha, radius=None):
+      """ The geometry of a corner of angle alpha [rad] with radius (default: self.radius), independent of its position and orientation.
+          Returns a tuple (trim, h, inner) of lengths along the unit vectors ua, ub from the corner towards its neighbours:
+          - trim: the trim points p1 and p7 are corner + trim * ua and corner + trim * ub.
+          - h: the arc handles at p1 and p7 point back towards the corner, p2 = p1 - h * ua and p6 = p7 - h * ub.
+          - inner: the middle nodes of the arc from p1 to p7, a tuple of (pw, pt, hw, ht). Empty for a single segment.
+            The node is at corner + pw * (ua + ub) + pt * (ua - ub), its handles are that +- hw * (ua + ub) + ht * (ua - ub).
+          This is the closed form of the circle center and handle construction of earlier versions, which test/fuzz_engines.py
+          keeps as its reference, see arc_c_m() and arc_bezier_handles() there: a handle of an arc that sweeps
+          the angle theta has the length 4/3 * tan(theta/4) * radius, tangential to the circle.
+          Without --tolerance, arcs of more than 90deg get one middle node. With --tolerance, see arc_segments().
+
+          Templates are cached in self.templates, keyed by the angle, the radius, the method and the tolerance, so that
+          repeated corners (e.g. the right angles of axis aligned rectangles, and trim_plan() before corner_nodes())
+          only need a rotate, scale and translate. The angle is not quantized: corners that only look equal (e.g. right
+          angles of rotated shapes, whose coordinates were written with a few digits) differ by about 1e-5, their arcs would move
+          by about that much of the trim, which is visible in the path data written.
+      """
+      r = self.radius if radius is None else radius
+      key = (alpha, r, self.cut, self.tolerance)
+      tpl = self.templates.get(key)
+      if tpl is not None:
+        return tpl
+
+      trim = r / math.tan(0.5 * alpha)
+      theta = math.pi - alpha                   # the angle swept by the arc
+      if self.cut:
+        tpl = (trim, 0.0, ())
       else:
-        p2, p3 = self.arc_bezier_handles(p1, p4, arc_c)
-        p5, p6 = self.arc_bezier_handles(p4, p7, arc_c)
-        node_m = [ p3, p4, p5 ]
-        node_a[2] = p2
-        node_b[0] = p6
-        if node_idx == 0:
-          # use prev idx to know about the extra skip. +1 for the node here, +1 for inclusive.
-          # CAUTION: Keep in sync above
-          sp = [node_a] + [node_m] + [node_b] + sp[1:sn['prev']['idx']+2]
+        if self.tolerance > 0:
+          n = self.arc_segments(theta, r)
         else:
-          sp = sp[:node_idx] + [node_a] + [node_m] + [node_b] + sp[node_idx+1:]
-
-      # A closed path is formed by making the last node indentical to the first node.
-      # So, if we trim at the first node, then duplicte that trim on the last node, to keep the loop closed.
-      if node_idx == 0:
-        sp[-1][0] = sp[0][0][:]
-        sp[-1][1] = sp[0][1][:]
-        sp[-1][2] = sp[0][2][:]
-
-      return sp
+          n = 1 if alpha >= 0.5*math.pi else 2
+        h = 4./3. * math.tan(0.25 * theta / n) * r
+        cdist = math.sqrt(r * r + trim * trim)  # distance of the corner to the circle center.
+        c2 = 2 * math.cos(0.5 * alpha)          # |ua + ub|
+        s2 = 2 * math.sin(0.5 * alpha)          # |ua - ub|
+        inner = []
+        for j in range(1, n):
+          phi = 0.5 * theta - j * theta / n     # seen from the circle center, 0 is the midpoint, theta/2 is p1.
+          inner.append(((cdist - r * math.cos(phi)) / c2, r * math.sin(phi) / s2, h * math.sin(phi) / c2, h * math.cos(phi) / s2))
+        tpl = (trim, h, tuple(inner))
+      self.templates.put(key, tpl)
+      return tpl
+
+
+    def arc_segments(self, theta, radius=None):
+      """ the smallest number of bezier segments for an arc sweeping theta [rad] with radius (default: self.radius),
+          so that the arc stays within self.tolerance from the true circle. See arc_bezier_error().
+      """
+      r = self.radius if radius is None else radius
+      n = 1
+      while n < max_arc_segments and arc_bezier_error(theta / n, r) > self.tolerance:
+        n += 1
+      return n
 
 
     def clean_up(self):         # __fini__
       if self.tty is not None:
         self.tty.close()
       super(RoundedCorners, self).clean_up()
+      if self.nonuniform:
+        print("Warning: %d groups scale non-uniformly or skew. --unit=%s uses their mean scale, the arcs in them are not circular as rendered.\n" % (self.nonuniform, self.unit), file=sys.stderr)
       if self.skipped_degenerated:
         print("Warning: Skipped %d degenerated nodes (180° turn or end of path?).\n" % self.skipped_degenerated, file=sys.stderr)
+      if self.clamped:
+        radii = [ c[3] for c in self.clamped ]
+        print("Warning: Rounded %d nodes with a smaller radius (%g to %g), as there was not enough space. See --stats for each node.\n" % (len(radii), min(radii), max(radii)), file=sys.stderr)
       if self.skipped_small_count:
         print("Warning: Skipped %d nodes with not enough space (Value %g is too small. Try again with a smaller radius or only one node selected).\n" % (self.skipped_small_count, self.skipped_small_len), file=sys.stderr)
 
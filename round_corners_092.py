@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright (C) 2020 Juergen Weigert, jnweiger@gmail.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+INKSCAPE 0.92.X COMPATIBILITY HACK for round_corners.py
+
+round_corners.py is meant for inkscape 1.0.1, it imports this module only when
+running under inkscape 0.92.x. Importing it installs a minimal new style api into inkex.
+Inkscape 1.x never loads (or even compiles) this file.
+
+Well, to make the new code work in the old environment, in here, we do the
+exact oposite of 1.0.1's /usr/share/inkscape/extensions/inkex/deprecated.py
+(which would make old code run in the new 1.0.1 environment.)
+
+old and new:
+- self.options= {'selected_nodes': ['path1684:0:2', 'path1684:0:0'], 'radius': 2.0, 'ids': ['path1684'], 'method': 'arc'}
+
+old style:
+- self.document= <lxml.etree._ElementTree object at 0x7f5c2b1a77e8>
+- self.document.getroot() =  <Element {http://www.w3.org/2000/svg}svg at 0x7f5c2b1a78c0>
+
+new style:
+- self.svg= <class 'inkex.elements._svg.SvgDocumentElement'>
+- self.svg.getElementById('path1684') =  <class 'inkex.elements._polygons.PathElement'>
+  ## maybe not even based on an lxml ElephantTree any more? Let's check the new code...
+"""
+
+# python2 compatibility:
+from __future__ import print_function
+
+import inkex
+import sys
+
+
+class MySvgSuperPath(list):
+  """ A list (of lists ...) object, that implements a new style to_path() method
+      to turn itself into a string attribute for <path d=...> nodes.
+  """
+  def to_path(self, curves_only=False):
+    """ convert from csp [[[[...]]]] to d "m ..."
+        using old 0.92.4 api.
+        Note that closed paths are not closed properly by formatPath().
+        Start and end of a closed path remains as two distinct points that just coincide.
+        That is a bug in the old API. Wontfix. RoundedCorners.format_path() writes the path data instead.
+    """
+    import cubicsuperpath
+
+    return cubicsuperpath.formatPath(self)
+
+
+class MyPath():
+  """ A new style inkex.Path(d) object, just enough to parse a d string into a superpath, and to transform it.
+  """
+  def __init__(self, d):
+    self.d = d
+
+  def to_superpath(self):
+    import cubicsuperpath
+
+    return MySvgSuperPath(cubicsuperpath.parsePath(self.d))
+
+  def transform(self, t):
+    """ like inkex 1.x Path.transform(): a new path, with the MyTransform t applied to all points.
+        RoundedCorners.path_superpath() bakes the own transform of a path with this, before any corner is rounded.
+        Transforms of ancestor groups stay there, they are shared with the siblings.
+    """
+    return MyPath(transform_path_data(self.d, t.matrix))
+
+
+class MyTransform():
+  """ A new style inkex.Transform(t) object, just enough to get the matrix of a transform attribute value.
+  """
+  def __init__(self, t):
+    import simpletransform
+
+    self.matrix = simpletransform.parseTransform(t)
+
+
+class MySvgPath():
+  def __init__(self, el):
+    self.element = el                       # original lxml.etree._Element
+    self.d = el.get('d')                    # must exist, else it is not a path :-)
+    # print('MySvgPath sodipodi:nodetypes=', el.get('{'+el.nsmap['sodipodi']+'}nodetypes'), file=sys.stderr)
+    # print('MySvgPath style=', el.get('style'), file=sys.stderr)
+    # print('MySvgPath d=', self.d, file=sys.stderr)
+
+  def to_superpath(self):
+    import cubicsuperpath
+
+    # self.d = "m 168.21,78.84 11.44,5.24 -14.65,8.77 z"
+    # supp = [[ [[168.21, 78.84], [168.21, 78.84], [168.21, 78.84]],
+    #           [[179.65, 84.09], [179.65, 84.09], [179.65, 84.09]],
+    #           [[164.99, 92.87], [164.99, 92.87], [164.99, 92.87]],
+    #           [[168.21, 78.84], [168.21, 78.84], [168.21, 78.84]] ]]
+    return MySvgSuperPath(cubicsuperpath.parsePath(self.d))
+
+
+def transform_path_data(d, mat):
+  """ the path data d with the transform matrix mat (see simpletransform.parseTransform()) applied to all its points.
+      simpletransform.fuseTransform() does the same through a superpath, which drops the Z of closed subpaths.
+      Here the path is transformed command by command, only elliptical arcs are converted into cubic beziers,
+      as their radii and angle do not follow every transform.
+  """
+  import cubicsuperpath
+  import simplepath
+  import simpletransform
+
+  cmds = []
+  start = last = None
+  for cmd, params in simplepath.parsePath(d):
+    if cmd == 'A':
+      arcp = cubicsuperpath.ArcToPath(last[:], params[:])
+      for i in range(1, len(arcp)):
+        cmds.append(['C', arcp[i-1][2] + arcp[i][0] + arcp[i][1]])
+    else:
+      cmds.append([cmd, params[:]])
+    if cmd == 'M':
+      start = params[0:2]
+    last = start if cmd == 'Z' else params[-2:]
+  for cmd, params in cmds:
+    for i in range(0, len(params), 2):
+      pt = params[i:i+2]
+      simpletransform.applyTransformToPoint(mat, pt)
+      params[i:i+2] = pt
+  # simplepath.formatPath() would write str() numbers, that are 12 digits in python2.
+  return "".join([ cmd + " ".join([ repr(p) for p in params ]) for cmd, params in cmds ])
+
+
+class MySvgElement():
+  def __init__(self, el, document=None):
+    self.element = el                       # original lxml.etree._Element; element.getroottree() has the svg document
+    self.document = document                # the MySvgDocumentElement that caches us, if any.
+    self.tag = el.tag                       # with namespace prefix, like the new api: '{http://www.w3.org/2000/svg}path'
+    self.nsmap = el.nsmap
+    self.attrib = el.attrib
+    self.id = self.element.attrib.get('id')
+    if self.tag.split('}')[-1] == 'path':   # strip any namespace prefix.
+      self.path = MySvgPath(el)
+    else:
+      print("MySvgElement not implemented for <%s id='%s' ..." % (self.tag, self.id), file=sys.stderr)
+
+  def get(self, key, default=None):
+    return self.element.get(key, default)
+
+  def getparent(self):
+    return self.element.getparent()       # a plain lxml element, enough for RoundedCorners.unit_scale()
+
+  def set(self, key, value):
+    self.element.set(key, value)
+    if key == 'd' and self.document is not None:
+      self.document.invalidate(self.id)     # our self.path is stale now.
+
+  def set_path(self, d):
+    if self.tag.split('}')[-1] != 'path':
+      raise(Exception("MySvgElement set_path() called on non-path node" + self.tag))
+    if type(d) != type(""):
+      raise(Exception("MySvgElement set_path() called with non-string d " + type(d)))
+    self.element.set('d', d)
+    if self.document is not None:
+      self.document.invalidate(self.id)     # our self.path is stale now.
+
+
+class MySvgDocumentElement():
+  def __init__(self, document):
+    self.tree = document
+    self.root = document.getroot()
+    self.NSS = self.root.nsmap.copy()       # Or should we just use inkex.NSS instead? That has key 'inx', but not 'inkscape' ...
+    self.NSS.pop(None)                      # My documents nsmap has cc,svg,inkscape,rdf,sodipodi, and None: http://www.w3.org/2000/svg
+    if 'inx' not in self.NSS and 'inkscape' in self.NSS:
+      self.NSS['inx'] = self.NSS['inkscape']
+    self.ids = None                         # { id: lxml element }, built on the first lookup.
+    self.wrappers = {}                      # { id: MySvgElement }, dropped by invalidate()
+
+  def getElementById(self, id):
+    """ O(1) lookup. The id index is built with one walk through the document on the first call.
+        Like the xpath '//*[@id="..."]' used before, the first element in document order wins.
+        The MySvgElement wrapper is cached until its path is changed with set_path().
+    """
+    # print("MySvgDocumentElement.getElementById: svg=", self.tree, " svg.root=", self.root, " ID=", id, file=sys.stderr)
+    el = self.wrappers.get(id)
+    if el is not None:
+      return el
+    if self.ids is None:
+      self.ids = {}
+      for e in self.root.iter():
+        e_id = e.get('id')
+        if e_id is not None and e_id not in self.ids:
+          self.ids[e_id] = e
+    if id not in self.ids:
+      return None
+    el = MySvgElement(self.ids[id], self)   # Do we need more? document root is accessible via element.getroottree()
+    self.wrappers[id] = el
+    return el
+
+  def invalidate(self, id):
+    self.wrappers.pop(id, None)
+
+
+def compat_add_argument(pars, *args, **kw):
+  """ Provide an add_argument() method so that add_argument() can use the new api,
+      but implemented in terms of the old api.
+  """
+  # convert type method into type string as needed, see deprecated.py def add_option()
+  if 'type' in kw:
+    kw['type'] = { str: 'string', float: 'float', int: 'int', bool: 'inkbool' }.get(kw['type'])
+  if 'action' not in kw:
+    kw['action'] = 'store'
+  pars.add_option(*args, **kw)
+
+
+class AbortExtension(Exception):
+  """ inkex 1.x: raised to stop the extension with a message to the user, but without a traceback. """
+  pass
+
+
+def effect_wrapper(self):
+  """ A cheap plastic immitation if inkscape-1.0.1's SvgDocumentElement() class found in
+      /usr/share/inkscape/extensions/inkex/elements/_svg.py
+      We add an svg object to the old api, so that new style code can run.
+      Note: only a very minimal set of methods is supported, and those that are, in a very primitive way.
+  """
+  self.svg = MySvgDocumentElement(self.document)
+  try:
+    self.wrapped_effect()
+  except AbortExtension as e:
+    inkex.errormsg(str(e))
+    sys.exit(1)
+
+
+def init_wrapper(self):
+  """ To backport the option parsing, we wrap the __init__ method and introduce a compatibility shim.
+      we must call add_arguments(), that seems to be done by EffectExtension.__init__() which we don't have.
+      have Effect.__init__() instead, which expects to be subclassed. We cannot subclass, as we don't want to
+      touch the class code at all. Instead exchange the Effect.__init__() with this wrapper, to hook in
+      new style semantics into the old style inkex.Effect superclass.
+      We also we must convert from new style pars.add_argument() calls to old style
+      self.OptionParser.add_option() -- this is done by the compat_add_argument wrapper.
+  """
+  from types import MethodType
+
+  self.wrapped_init()                                    # call early, as it adds the OptionParser to self ...
+
+  # We add an add_argument method to the OptionParser. Must do this via MethodType,
+  # as direct assignment would discard the indirect object.
+  self.OptionParser.add_argument = MethodType(compat_add_argument, self.OptionParser)
+
+  # Now, as the new style add_argument() method is in place, we can run the add_arguments() initializer of the extension.
+  self.add_arguments(self.OptionParser)
+  self.run = self.affect      # alias the extension entry point so that it works in both APs.
+
+  # wrap our own effect() method. That is ugly, but self.document is not initialized any earlier.
+  self.wrapped_effect = self.effect
+  self.effect = MethodType(effect_wrapper, self)
+
+
+inkex.Path = MyPath
+inkex.Transform = MyTransform
+inkex.AbortExtension = AbortExtension
+inkex.EffectExtension = inkex.Effect
+inkex.EffectExtension.wrapped_init = inkex.EffectExtension.__init__
+inkex.EffectExtension.__init__ = init_wrapper
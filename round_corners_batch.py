@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, headless batch mode
+
+Runs round_corners.py without inkscape over many svg files: all paths of each file are rounded,
+as if nothing were selected. Inputs are directories (searched recursively for *.svg) or glob patterns.
+The results are written into an output tree that mirrors the input layout.
+
+ - Files are processed by a pool of worker processes (--jobs).
+ - With --stream, files are not loaded as a whole: elements are read, rounded and written one at a time.
+   Use this for map sized documents with very many paths.
+ - Each output file is written to a temporary file next to its destination and then renamed,
+   so that an interrupted run never leaves half written svg files behind.
+ - Finished files are recorded in a journal (default: OUTPUT/.round_corners.journal).
+   Running the same command again resumes: files already journaled as ok are skipped.
+   Failed files are retried. Use --restart to ignore the journal.
+   The journal header has a hash of all options that affect the output, a resume with other options is refused.
+
+Example:
+  python3 round_corners_batch.py --radius 1.5 --output out/ drawings/ 'more/**/*.svg'
+
+Requires python3 and inkscape 1.x (the inkex module must be importable).
+"""
+
+from __future__ import print_function
+
+import sys, os, glob, shutil, hashlib, tempfile, argparse
+
+import round_corners, round_corners_stream
+from round_corners import RoundedCorners
+
+__version__ = '1.0'
+
+journal_name = '.round_corners.journal'
+
+
+def find_inputs(inputs):
+  """ Expand directories and glob patterns. Returns a sorted list of (src, rel) tuples,
+      where rel is the path of src relative to its directory argument or to the non-wildcard part of its pattern.
+  """
+  found = {}
+  for arg in inputs:
+    if os.path.isdir(arg):
+      for top, dirs, files in os.walk(arg):
+        dirs.sort()
+        for f in files:
+          if f.lower().endswith('.svg'):
+            src = os.path.join(top, f)
+            found.setdefault(os.path.relpath(src, arg), src)
+    else:
+      # base directory: all leading path components without wildcards.
+      base = []
+      for part in os.path.dirname(arg).split(os.sep):
+        if glob.has_magic(part):
+          break
+        base.append(part)
+      base = os.sep.join(base) or os.curdir
+      for src in glob.glob(arg, recursive=True):
+        if os.path.isfile(src):
+          found.setdefault(os.path.relpath(src, base), src)
+  return sorted((found[rel], rel) for rel in found)
+
+
+def read_journal(path, header):
+  """ Returns the set of rel paths recorded as ok. Raises ValueError if the journal was written with other settings. """
+  done = set()
+  if not os.path.exists(path):
+    return done
+  with open(path) as fd:
+    lines = fd.read().splitlines()
+  if lines and lines[0] != header:
+    raise ValueError("journal %s was written with other settings: '%s'. Use --restart or a different --output." % (path, lines[0]))
+  for line in lines[1:]:
+    fields = line.split('\t')
+    if len(fields) >= 2 and fields[0] == 'ok':
+      done.add(fields[1])
+  return done
+
+
+def journal_header(ext_args, stream):
+  """ The first line of the journal: a hash of everything that affects the output files, and the options in clear text. """
+  options = [ "--version=" + round_corners.__version__ ] + sorted(ext_args) + ([ "--stream" ] if stream else [])
+  digest = hashlib.sha1(" ".join(options).encode('utf-8')).hexdigest()[:16]
+  return "# round_corners_batch %s %s" % (digest, " ".join(options))
+
+
+def round_file(job):
+  """ Round all paths of one svg file. job is (src, dest, ext_args, stream, mode).
+      Returns (src, error). The destination is replaced atomically with the permissions mode, error is None on success.
+  """
+  src, dest, ext_args, stream, mode = job
+  tmp = None
+  try:
+    dest_dir = os.path.dirname(dest) or os.curdir
+    if not os.path.isdir(dest_dir):
+      os.makedirs(dest_dir)
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix='.' + os.path.basename(dest) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+      # a new instance per file: the extension keeps per run state (trim factor, counters)
+      ext = RoundedCorners()
+      if stream:
+        ext.parse_arguments(ext_args)
+        try:
+          round_corners_stream.round_stream(ext, src, tmp)
+        finally:
+          ext.clean_up()
+      else:
+        ext.run(ext_args + [src], output=tmp)
+    except SystemExit as e:
+      if e.code:
+        raise RuntimeError("extension aborted (exit status %s)" % e.code)
+    if os.path.getsize(tmp) == 0:
+      # inkex writes nothing, if the document did not change.
+      shutil.copyfile(src, tmp)
+    os.chmod(tmp, mode)           # mkstemp() creates the file with 0600.
+    os.replace(tmp, dest)
+    tmp = None
+  except Exception as e:
+    return (src, "%s: %s" % (type(e).__name__, e))
+  finally:
+    if tmp is not None and os.path.exists(tmp):
+      os.remove(tmp)
+  return (src, None)
+
+
+def run_jobs(work, jobs):
+  """ Generator over the results of round_file() for all work items, in completion order. """
+  if jobs > 1 and len(work) > 1:
+    try:
+      from concurrent.futures import ProcessPoolExecutor, as_completed
+      pool = ProcessPoolExecutor(jobs)
+    except (ImportError, OSError, NotImplementedError) as e:
+      print("Warning: no worker processes (%s), running serially." % e, file=sys.stderr)
+    else:
+      with pool:
+        for f in as_completed([pool.submit(round_file, job) for job in work]):
+          yield f.result()
+      return
+  for job in work:
+    yield round_file(job)
+
+
+def main(argv=None):
+  pars = argparse.ArgumentParser(description="Round the corners of all paths in many svg files.")
+  pars.add_argument("inputs", nargs='+', help="svg files, directories or glob patterns (quote them, '**' recurses)")
+  pars.add_argument("--output", "-o", required=True, help="output directory. The layout of the inputs is mirrored there.")
+  pars.add_argument("--radius", type=float, default=2.0, help="Radius [mm] to round corners. Default: 2")
+  pars.add_argument("--unit", type=str, default="user", help="unit of --radius and --tolerance: one of 'user' (default, user units of each path), 'px', 'pt', 'pc', 'mm', 'cm', 'in', 'q'")
+  pars.add_argument("--method", type=str, default="arc", help="operation: one of 'arc' (default), 'arc+cross', 'line'")
+  pars.add_argument("--tolerance", type=float, default=0.0, help="maximum distance of an arc from the true circle. Default: 0, one bezier segment up to 90deg, two above")
+  pars.add_argument("--exact", action='store_true', help="on curved segments, let the arcs touch the curves. Requires numpy.")
+  pars.add_argument("--max-radius", action='store_true', help="per file, use the largest radius up to --radius that fits all corners. Not with --stream.")
+  pars.add_argument("--clamp", action='store_true', help="round corners without enough space with the largest radius that fits, instead of skipping them.")
+  pars.add_argument("--precision", type=int, default=4, help="decimal digits of the path data written, more in documents smaller than 100 user units. Default: 4")
+  pars.add_argument("--coordinates", type=str, default="auto", help="path data: one of 'auto' (default), 'absolute', 'relative'")
+  pars.add_argument("--engine", type=str, default="auto", help="corner engine: one of 'auto' (default), 'python', 'numpy'")
+  pars.add_argument("--jobs", "-j", type=int, default=0, help="number of worker processes. 0: one per cpu (default)")
+  pars.add_argument("--journal", default=None, help="resume journal. Default: OUTPUT/" + journal_name)
+  pars.add_argument("--stream", action='store_true', help="read and write each file incrementally. Memory use is bounded by the largest element, not the document.")
+  pars.add_argument("--restart", action='store_true', help="ignore an existing journal and process all files again")
+  args = pars.parse_args(argv)
+
+  jobs = args.jobs or os.cpu_count() or 1
+  journal = args.journal or os.path.join(args.output, journal_name)
+  ext_args = ["--radius=%r" % args.radius, "--method=" + args.method, "--tolerance=%r" % args.tolerance, "--engine=" + args.engine, "--jobs=1", "--all=true",
+              "--precision=%d" % args.precision, "--coordinates=" + args.coordinates]
+  if args.unit != 'user':
+    ext_args.append("--unit=" + args.unit)
+  if args.exact:
+    ext_args.append("--exact=true")
+  if args.clamp:
+    ext_args.append("--clamp=true")
+  if args.max_radius:
+    if args.stream:
+      print("Error: --max-radius needs the whole file before rounding, it cannot be combined with --stream.", file=sys.stderr)
+      return 2
+    ext_args.append("--max-radius=true")
+  header = journal_header(ext_args, args.stream)
+  umask = os.umask(0)
+  os.umask(umask)
+  mode = 0o666 & ~umask             # as for a file created with open()
+
+  todo = find_inputs(args.inputs)
+  if not todo:
+    print("Error: no svg files found in " + " ".join(args.inputs), file=sys.stderr)
+    return 2
+  out_abs = os.path.abspath(args.output)
+  for src, rel in todo:
+    if os.path.abspath(src) == os.path.join(out_abs, rel):
+      print("Error: output would overwrite the input " + src, file=sys.stderr)
+      return 2
+
+  if args.restart and os.path.exists(journal):
+    os.remove(journal)
+  try:
+    done = read_journal(journal, header)
+  except ValueError as e:
+    print("Error: %s" % e, file=sys.stderr)
+    return 2
+
+  work = [(src, os.path.join(args.output, rel), ext_args, args.stream, mode) for src, rel in todo if rel not in done]
+  rel_of = dict(todo)
+  if done:
+    print("Resuming: %d of %d files already done." % (len(todo) - len(work), len(todo)), file=sys.stderr)
+
+  journal_dir = os.path.dirname(journal)
+  if journal_dir and not os.path.isdir(journal_dir):
+    os.makedirs(journal_dir)
+  failed = 0
+  with open(journal, 'a') as jfd:
+    if jfd.tell() == 0:
+      jfd.write(header + "\n")
+    for src, error in run_jobs(work, jobs):
+      if error is None:
+        jfd.write("ok\t%s\n" % rel_of[src])
+      else:
+        failed += 1
+        jfd.write("failed\t%s\t%s\n" % (rel_of[src], error.replace("\n", " ")))
+        print("Error: %s: %s" % (src, error), file=sys.stderr)
+      jfd.flush()
+
+  print("%d files rounded, %d failed, %d skipped (journal %s)" % (len(work) - failed, failed, len(todo) - len(work), journal), file=sys.stderr)
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
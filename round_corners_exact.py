@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, exact fillets on curved segments (--exact)
+
+Without --exact, a corner is trimmed back along the tangents at the corner node. That is exact for straight
+segments, and an approximation when a segment is curved: the arc then touches the tangent, not the curve.
+Here the circle touches the curves themselves:
+
+ - solve_fillets() finds the tangent points on the two curves next to each corner, for all curved corners
+   of a path at once: a vectorized bisection for a start near the trim distance, then Newton iterations.
+ - fillet_geometry() splits the curves there with de Casteljau's algorithm, see casteljau(), and places the arc
+   at the virtual corner where the tangents at both tangent points meet.
+ - ExactWalk feeds the results into RoundedCorners.subpath_round_corners(), and replaces the handles of the
+   neighbour nodes on the split curves.
+
+A corner falls back to the approximation when no tangent point is found, or when its curve was already
+trimmed by an approximated neighbour.
+
+Only imported with --exact. Requires numpy.
+"""
+
+from itertools import chain
+import numpy as np
+
+bisect_steps = 12               # start values: |A(s) - corner| = trim to about 1e-4 of the parameter range
+newton_steps = 30
+newton_tol = 1e-10              # relative to the radius
+start_factors = (1.0, 0.5, 2.0)  # start points at these multiples of the straight line trim
+
+
+def evenly(c, curved):
+  """ c, or for a straight segment c with its handles at 1/3 and 2/3, so that the parameter is proportional to the length """
+  if curved:
+    return c
+  (x0, y0), (x3, y3) = c[0], c[3]
+  return [ c[0], [ (2 * x0 + x3) / 3.0, (2 * y0 + y3) / 3.0 ], [ (x0 + 2 * x3) / 3.0, (y0 + 2 * y3) / 3.0 ], c[3] ]
+
+
+def solve_fillets(A, B, radius):
+  """ The tangent points of circles of the given radius, that touch the curves A and B inside the corner A[:, 3] == B[:, 0].
+      A and B are arrays of shape (m, 4, 2) of cubic beziers. Straight segments must have their handles
+      at 1/3 and 2/3, so that they are evenly parameterized, see evenly().
+      Returns (s, u, ok): the tangent point on A is at parameter s, the one on B at u. ok is False where none was found.
+
+      The circle center is A(s) + r * nA(s) = B(u) + r * nB(u), with the unit normals nA and nB towards the inside
+      of the corner. Newton's method solves this for (s, u) in all corners at once, see newton().
+      The start values have |A(s) - corner| = |B(u) - corner| = trim, the tangent distance of the same corner
+      between straight lines, found by bisection. Corners that do not converge from there are tried again
+      from start_factors * trim, strongly curved segments may have more than one solution.
+  """
+  m = len(A)
+  P = A[:, 3]
+  dA = P - A[:, 2]                          # incoming direction at the corner
+  dA = np.where(np.all(np.abs(dA) < 1e-12, axis=1)[:, None], P - A[:, 1], dA)
+  dB = B[:, 1] - P                          # outgoing direction
+  dB = np.where(np.all(np.abs(dB) < 1e-12, axis=1)[:, None], B[:, 2] - P, dB)
+  cross = dA[:, 0] * dB[:, 1] - dA[:, 1] * dB[:, 0]
+  k = np.where(cross > 0, 1.0, -1.0)        # left turn: the center is on the left side
+  with np.errstate(divide='ignore', invalid='ignore'):
+    cos_alpha = -(dA * dB).sum(axis=1) / np.sqrt((dA * dA).sum(axis=1) * (dB * dB).sum(axis=1))
+    alpha = np.arccos(np.clip(cos_alpha, -1.0, 1.0))
+    trim = radius / np.tan(0.5 * alpha)
+
+  s = np.zeros(m)
+  u = np.zeros(m)
+  ok = np.zeros(m, dtype=bool)
+  todo = np.flatnonzero(np.isfinite(trim) & (cross != 0))
+  for f in start_factors:
+    if not len(todo):
+      break
+    At, Bt, Pt, dist = A[todo], B[todo], P[todo], f * trim[todo]
+    st, ut, found = newton(At, Bt, k[todo], radius, start_at(At, Pt, dist, 1), start_at(Bt, Pt, dist, 0))
+    idx = todo[found]
+    s[idx] = st[found]
+    u[idx] = ut[found]
+    ok[idx] = True
+    todo = todo[~found]
+  return s, u, ok
+
+
+def newton(A, B, k, radius, s, u):
+  """ Newton iterations of solve_fillets() from the start values s, u. Returns (s, u, found).
+      The Jacobian has the columns A'(s) * (1 - r * k * cross(A', A'') / |A'|^3) and the same for -B'(u),
+      where k is the turn direction: the normals turn with the curve. Steps that leave [0, 1] are replaced
+      by half the way to the boundary.
+  """
+  tol = newton_tol * radius
+  for i in range(newton_steps + 1):
+    a1, a2 = bezier_derivs(A, s)
+    b1, b2 = bezier_derivs(B, u)
+    la = np.sqrt((a1 * a1).sum(axis=1))
+    lb = np.sqrt((b1 * b1).sum(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+      na = k[:, None] * np.stack([ -a1[:, 1], a1[:, 0] ], axis=1) / la[:, None]
+      nb = k[:, None] * np.stack([ -b1[:, 1], b1[:, 0] ], axis=1) / lb[:, None]
+      F = bezier_points(A, s) + radius * na - bezier_points(B, u) - radius * nb
+      done = ~(np.sqrt((F * F).sum(axis=1)) > tol)
+      if i == newton_steps or np.all(done):
+        break
+      ca = a1 * (1 - radius * k * (a1[:, 0] * a2[:, 1] - a1[:, 1] * a2[:, 0]) / (la * la * la))[:, None]
+      cb = -b1 * (1 - radius * k * (b1[:, 0] * b2[:, 1] - b1[:, 1] * b2[:, 0]) / (lb * lb * lb))[:, None]
+      det = ca[:, 0] * cb[:, 1] - ca[:, 1] * cb[:, 0]
+      ds = (cb[:, 0] * F[:, 1] - cb[:, 1] * F[:, 0]) / det
+      du = (ca[:, 1] * F[:, 0] - ca[:, 0] * F[:, 1]) / det
+    ds = np.where(done | ~np.isfinite(ds), 0.0, ds)
+    du = np.where(done | ~np.isfinite(du), 0.0, du)
+    s_new = s + ds
+    s = np.where(s_new <= 0, 0.5 * s, np.where(s_new >= 1, 0.5 * (s + 1), s_new))
+    u_new = u + du
+    u = np.where(u_new <= 0, 0.5 * u, np.where(u_new >= 1, 0.5 * (u + 1), u_new))
+  return s, u, done & (s > 0) & (s < 1) & (u > 0) & (u < 1)
+
+
+def start_at(C, P, dist, near):
+  """ bisection: the parameters where |C(t) - P| == dist, searching from the end near (0 or 1) of the curves C """
+  lo = np.zeros(len(C))
+  hi = np.ones(len(C))
+  for i in range(bisect_steps):
+    mid = 0.5 * (lo + hi)
+    q = bezier_points(C, mid) - P
+    inside = (q * q).sum(axis=1) < dist * dist      # closer to the corner than dist
+    if near:
+      hi = np.where(inside, mid, hi)
+      lo = np.where(inside, lo, mid)
+    else:
+      lo = np.where(inside, mid, lo)
+      hi = np.where(inside, hi, mid)
+  return 0.5 * (lo + hi)
+
+
+def bezier_points(C, t):
+  """ the points of the cubic beziers C (shape (m, 4, 2)) at t (shape (m,)) """
+  s = 1 - t
+  return ((s * s * s)[:, None] * C[:, 0] + (3 * s * s * t)[:, None] * C[:, 1] +
+          (3 * s * t * t)[:, None] * C[:, 2] + (t * t * t)[:, None] * C[:, 3])
+
+
+def bezier_derivs(C, t):
+  """ the first and second derivatives of the beziers C at t, see bezier_points() """
+  s = 1 - t
+  d1 = 3 * ((s * s)[:, None] * (C[:, 1] - C[:, 0]) + (2 * s * t)[:, None] * (C[:, 2] - C[:, 1]) + (t * t)[:, None] * (C[:, 3] - C[:, 2]))
+  d2 = 6 * (s[:, None] * (C[:, 2] - 2 * C[:, 1] + C[:, 0]) + t[:, None] * (C[:, 3] - 2 * C[:, 2] + C[:, 1]))
+  return d1, d2
+
+
+def casteljau(C, t):
+  """ de Casteljau's algorithm for the cubic beziers C (shape (m, 4, 2)) at t (shape (m,)).
+      Returns (P, D): the points C(t), where the curves are split, and the derivatives C'(t) there.
+      The handles of the part between the parameters a and b of a curve are (b - a) / 3 * C'(a) at its start,
+      and -(b - a) / 3 * C'(b) at its end. ExactWalk uses that, when a curve is split at both ends.
+  """
+  t = t[:, None]
+  p01 = C[:, 0] + t * (C[:, 1] - C[:, 0])
+  p12 = C[:, 1] + t * (C[:, 2] - C[:, 1])
+  p23 = C[:, 2] + t * (C[:, 3] - C[:, 2])
+  d = p01 + t * (p12 - p01)
+  e = p12 + t * (p23 - p12)
+  return d + t * (e - d), 3 * (e - d)
+
+
+def fillet_geometry(A, B, s, u, ok, eps):
+  """ The arcs at the tangent points A(s) and B(u) found by solve_fillets(). Returns a tuple of arrays
+      (p1, da, p7, db, corner, ua, ub, alpha, ok): the tangent points and the derivatives of the curves there,
+      the virtual corner where the tangents meet, the unit vectors from there towards p1 and p7, and the angle between them,
+      as corner_nodes() needs them. ok is False where the tangents do not meet in front of both tangent points.
+  """
+  p1, da = casteljau(A, s)
+  p7, db = casteljau(B, u)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    la = np.sqrt((da * da).sum(axis=1))
+    lb = np.sqrt((db * db).sum(axis=1))
+    ua = -da / la[:, None]                  # from the virtual corner back towards p1
+    ub = db / lb[:, None]                   # from the virtual corner on towards p7
+    det = ua[:, 1] * ub[:, 0] - ua[:, 0] * ub[:, 1]
+    dx = p7[:, 0] - p1[:, 0]
+    dy = p7[:, 1] - p1[:, 1]
+    lam = (dx * ub[:, 1] - dy * ub[:, 0]) / det      # p1 - lam * ua == p7 - mu * ub
+    mu = (ua[:, 1] * dx - ua[:, 0] * dy) / det
+    alpha = np.arccos(np.clip((ua * ub).sum(axis=1), -1.0, 1.0))
+  ok = ok & (la > eps) & (lb > eps) & (np.abs(det) > eps) & (lam > 0) & (mu > 0) & (alpha > eps) & (np.pi - alpha > eps)
+  corner = p1 - lam[:, None] * ua
+  return p1, da, p7, db, corner, ua, ub, alpha, ok
+
+
+def solve_walks(ext, walks):
+  """ solve the corners of all walks at once, and fill in their solved dicts """
+  walks = [ w for w in walks if w.sides ]
+  if not walks:
+    return
+  keys = [ (w, node_idx) for w in walks for node_idx in sorted(w.sides) ]
+  m = len(keys)
+  sides = [ w.sides[node_idx] for w, node_idx in keys ]
+  A = np.fromiter(chain.from_iterable(chain.from_iterable(side[1] for side in sides)), np.float64, 8 * m).reshape(m, 4, 2)
+  B = np.fromiter(chain.from_iterable(chain.from_iterable(side[2] for side in sides)), np.float64, 8 * m).reshape(m, 4, 2)
+  s, u, ok = solve_fillets(A, B, ext.radius)
+  p1, da, p7, db, corner, ua, ub, alpha, ok = fillet_geometry(A, B, s, u, ok, ext.eps)
+  rows = np.column_stack((s, u, corner, ua, ub, alpha, p1, da, p7, db)).tolist()     # one conversion is much faster than many.
+  for (w, node_idx), row, found in zip(keys, rows, ok.tolist()):
+    if found:
+      w.solved[node_idx] = row
+
+
+class ExactWalk(object):
+  """ The state of --exact during one RoundedCorners.subpath_round_corners() walk. See solve_walks().
+      sp is a shallow copy of the subpath orig. When a curve is split, its end nodes are replaced in sp
+      (or in the output, if already emitted), so that the walk copies or sees the shortened handles.
+  """
+  def __init__(self, ext, sp, node_indices):
+    self.ext = ext
+    self.orig = sp
+    self.sp = list(sp)
+    self.sides = {}             # node_idx: (prev_idx, A, B, curved_a, curved_b), the original curves before and after the corner
+    self.solved = {}            # node_idx: [ s, u, corner.x, corner.y, ua.x, ua.y, ... ] in the order of fillet_geometry()
+    self.split = {}             # node_idx: (u, p7, db), where the curve after an exactly rounded corner starts now
+    self.approx = set()         # corners rounded with the approximation
+    self.start0 = None          # (s, p1, da) of node 0, where the closing curve ends now, if rounded exactly
+    self.patch = None
+    for node_idx in node_indices:
+      sides = self.corner_sides(sp, node_idx)
+      if sides is not None:
+        prev_idx, A, B = sides
+        curved_a = not (ext.very_close_xy(A[1], A[0]) and ext.very_close_xy(A[2], A[3]))
+        curved_b = not (ext.very_close_xy(B[1], B[0]) and ext.very_close_xy(B[2], B[3]))
+        if curved_a or curved_b:
+          self.sides[node_idx] = (prev_idx, evenly(A, curved_a), evenly(B, curved_b), curved_a, curved_b)
+
+  def corner_sides(self, sp, node_idx):
+    """ (prev_idx, A, B): the curves from the previous node to sp[node_idx] and from there to the next node.
+        The previous node of node 0 is found as in RoundedCorners.super_node(). None at the ends of an open path.
+    """
+    n = len(sp)
+    if node_idx <= 0:
+      if node_idx < 0 or n < 3 or not self.ext.very_close(sp[0], sp[-1]):
+        return None
+      prev_idx = n - 2
+      t0 = sp[0][0]
+      if self.ext.very_close_xy(sp[prev_idx][1], sp[0][1]):
+        t0 = sp[prev_idx][0]                    # issue #2
+        prev_idx -= 1
+      t = [ t0, sp[0][1], sp[0][2] ]
+    elif node_idx >= n - 1:
+      return None
+    else:
+      prev_idx = node_idx - 1
+      t = sp[node_idx]
+    p = sp[prev_idx]
+    q = sp[node_idx + 1]
+    return (prev_idx, [ p[1], p[2], t[0], t[1] ], [ t[1], t[2], q[0], q[1] ])
+
+  def fillet(self, node_idx, out, closing):
+    """ The geometry of the exact arc at node_idx for RoundedCorners.corner_nodes(), or None to use the approximation.
+        out is the output of the walk so far. closing is the end index, if node 0 was rounded: then the next node
+        of the last corner is out[0].
+    """
+    f = self.solved.get(node_idx)
+    if f is None:
+      return None
+    s, u, cx, cy, uax, uay, ubx, uby, alpha, p1x, p1y, dax, day, p7x, p7y, dbx, dby = f
+    p1 = [ p1x, p1y ]
+    p7 = [ p7x, p7y ]
+    prev_idx, A, B, curved_a, curved_b = self.sides[node_idx]
+    # the curve before now starts at parameter a, point pa, derivative dpa. The curve after ends at b, pb, dpb.
+    a, pa, dpa = 0.0, A[0], [ 3 * (A[1][0] - A[0][0]), 3 * (A[1][1] - A[0][1]) ]
+    if prev_idx in self.split:
+      a, pa, dpa = self.split[prev_idx]
+    elif prev_idx in self.approx:
+      # trimmed by an approximated arc. A straight segment can be trimmed further, a curve was modified.
+      if curved_a or dist2(p1, A[3]) >= dist2(out[-1][1], A[3]):
+        return None
+      a = -1.0
+    b, pb, dpb = 1.0, B[3], [ 3 * (B[3][0] - B[2][0]), 3 * (B[3][1] - B[2][1]) ]
+    if closing and node_idx + 1 == closing:
+      if self.start0 is not None:
+        b, pb, dpb = self.start0
+      elif curved_b or dist2(p7, B[0]) >= dist2(out[0][1], B[0]):
+        return None
+      else:
+        b = 2.0
+    if s <= a or u >= b:
+      return None
+
+    prev_handle = p1[:]
+    next_handle = p7[:]
+    self.patch = (None, None)
+    if curved_a:
+      k = (s - a) / 3.0
+      prev_handle = [ p1x - k * dax, p1y - k * day ]
+      self.patch = ([ pa[0] + k * dpa[0], pa[1] + k * dpa[1] ], None)
+    if curved_b:
+      k = (b - u) / 3.0
+      next_handle = [ p7x + k * dbx, p7y + k * dby ]
+      self.patch = (self.patch[0], [ pb[0] - k * dpb[0], pb[1] - k * dpb[1] ])
+    return ((cx, cy), (uax, uay), (ubx, uby), alpha, p1, p7, prev_handle, next_handle)
+
+  def rounded(self, node_idx, fillet, out, closing):
+    """ Called after the corner node_idx was rounded, before its nodes are appended to out.
+        fillet is what fillet() returned for it, None if it was approximated.
+        Replaces the handles of the neighbours on the split curves.
+    """
+    if fillet is None:
+      self.approx.add(node_idx)
+      return
+    f = self.solved[node_idx]
+    self.split[node_idx] = (f[1], f[13:15], f[15:17])         # u, p7, db
+    if node_idx == 0:
+      self.start0 = (f[0], f[9:11], f[11:13])                 # s, p1, da
+    out_handle, in_handle = self.patch
+    if out_handle is not None:
+      if out:
+        out[-1] = [ out[-1][0], out[-1][1], out_handle ]
+      else:
+        prev_idx = self.sides[node_idx][0]      # node 0: the closing curve, its start is not yet copied.
+        p = self.sp[prev_idx]
+        self.sp[prev_idx] = [ p[0], p[1], out_handle ]
+    if in_handle is not None:
+      if closing and node_idx + 1 == closing:
+        out[0] = [ in_handle, out[0][1], out[0][2] ]
+      else:
+        q = self.sp[node_idx + 1]
+        self.sp[node_idx + 1] = [ in_handle, q[1], q[2] ]
+
+
+def dist2(p, q):
+  return (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2
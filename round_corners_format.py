@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, path data output
+
+format_superpath() writes a superpath as compact svg path data: numbers with at most --precision decimal digits,
+the shorter of absolute and relative commands (--coordinates), lines as L, H or V, no repeated command letters.
+Subpaths end with z where the path data read had one, see closed_subpaths().
+subpath_to_flat() and flat_to_subpath() convert subpaths to and from the flat buffers of the numpy engine.
+format_superpath() also reads those directly.
+
+Always imported. Works with python2 and the 0.92 superpath.
+"""
+
+import re
+from array import array
+from itertools import chain
+
+
+def format_number(v, precision):
+  """ v with at most precision decimal digits, without trailing zeros and without a leading zero: 0.50 -> '.5' """
+  t = "%.*f" % (precision, v)
+  if '.' in t:
+    t = t.rstrip('0').rstrip('.')
+  if t[0] == '0' and len(t) > 1:
+    t = t[1:]
+  elif t[:2] == '-0':
+    t = '-' + t[2:] if len(t) > 2 else '0'
+  return t
+
+
+def format_numbers(texts, prev=None):
+  """ join formatted numbers with the fewest separators: none before a minus sign,
+      and none before a leading dot, if the previous number already has a dot (1.5.5 is 1.5 .5).
+      prev is the text written just before, if any.
+  """
+  ret = []
+  for t in texts:
+    if prev is not None and t[0] != '-' and not (t[0] == '.' and '.' in prev):
+      ret.append(' ')
+    ret.append(t)
+    prev = t
+  return ''.join(ret)
+
+
+def closed_subpaths(d):
+  """ the subpaths of the path data d that end with z, as a list of booleans in the order of to_superpath().
+      A subpath starts at each M (or m). Drawing on after a z continues the same subpath, it is then not closed.
+  """
+  closed = []
+  for cmd in re.findall(r'[MmZzLlHhVvCcSsQqTtAa]', d or ''):
+    if cmd in 'Mm':
+      closed.append(False)
+    elif closed:
+      closed[-1] = cmd in 'Zz'
+  return closed
+
+
+def format_superpath(csp, precision=4, coordinates='auto', closed=None):
+  """ serialize the superpath csp into a compact svg path d string.
+      - numbers have at most precision decimal digits, see format_number().
+      - coordinates 'absolute' or 'relative' select the command variant, 'auto' takes the shorter one for each segment.
+        Relative coordinates are computed from the position a reader reconstructs, so rounding errors do not add up.
+      - straight segments (no handles) are written as lines, horizontal and vertical lines as H and V.
+      - repeated command letters are omitted, also an L (or l) after the M (or m) that starts a subpath.
+      - a closed subpath ends with z: a final straight segment is dropped, as z draws it, a final curve is kept.
+        closed has a boolean per subpath of csp, see closed_subpaths(). A subpath whose last node is not at the first
+        is never closed. Without closed, all of those whose ends meet are, also open paths that merely touch.
+      Works with both the 1.x and the 0.92 superpath, it only needs the nested list form. A subpath can also be a flat
+      numpy array of shape (n, 6), as round_corners_numpy.flat_round_corners_np() returns it, it is not converted back to the nested form.
+  """
+  eps = 1e-9
+  half = 0.5 * 10**-precision
+  out = []
+  last_cmd = None
+  last_text = None              # the last number written, if it directly precedes what comes next.
+  cx = cy = sx = sy = 0.0       # current point and subpath start, as reconstructed from what was written
+  for sp_idx, sp in enumerate(csp):
+    if not len(sp):
+      continue
+    # one row per node: prev_handle.x, prev_handle.y, node.x, node.y, next_handle.x, next_handle.y
+    if hasattr(sp, 'reshape'):
+      rows = sp.reshape(-1, 6).tolist()
+    else:
+      rows = [ (h1[0], h1[1], p[0], p[1], h2[0], h2[1]) for h1, p, h2 in sp ]
+    close = len(rows) > 1 and abs(rows[0][2] - rows[-1][2]) < eps and abs(rows[0][3] - rows[-1][3]) < eps
+    if closed is not None:
+      close = close and sp_idx < len(closed) and closed[sp_idx]
+    x, y = rows[0][2], rows[0][3]
+    cands = [ ('M', (x, y)) ]
+    if out:
+      cands.append(('m', (x - cx, y - cy)))
+    for i in range(len(rows)):
+      if i > 0:
+        prev = rows[i - 1]
+        node = rows[i]
+        x, y = node[2], node[3]
+        line = (abs(prev[4] - prev[2]) < eps and abs(prev[5] - prev[3]) < eps and
+                abs(node[0] - x) < eps and abs(node[1] - y) < eps)
+        if close and i == len(rows) - 1:
+          if line:
+            break               # z draws the line back to the start.
+          x, y = rows[0][2], rows[0][3]
+        if line:
+          if abs(y - cy) < half:
+            cands = [ ('H', (x,)), ('h', (x - cx,)) ]
+          elif abs(x - cx) < half:
+            cands = [ ('V', (y,)), ('v', (y - cy,)) ]
+          else:
+            cands = [ ('L', (x, y)), ('l', (x - cx, y - cy)) ]
+        else:
+          c = (prev[4], prev[5], node[0], node[1], x, y)
+          cands = [ ('C', c), ('c', (c[0] - cx, c[1] - cy, c[2] - cx, c[3] - cy, x - cx, y - cy)) ]
+
+      best = None
+      implicit = { 'M': 'L', 'm': 'l' }.get(last_cmd, last_cmd)
+      for cmd, values in cands:
+        if len(cands) > 1 and (coordinates == 'absolute' and cmd.islower() or coordinates == 'relative' and cmd.isupper()):
+          continue
+        texts = [ format_number(v, precision) for v in values ]
+        if cmd == implicit:
+          text = format_numbers(texts, last_text)
+        else:
+          text = cmd + format_numbers(texts)
+        if best is None or len(text) < len(best[2]):
+          best = (cmd, texts, text)
+      cmd, texts, text = best
+      out.append(text)
+      last_cmd = cmd
+      last_text = texts[-1]
+      # advance the current point by what a reader parses
+      v = float(texts[-1])
+      if cmd == 'H':   cx = v
+      elif cmd == 'h': cx += v
+      elif cmd == 'V': cy = v
+      elif cmd == 'v': cy += v
+      elif cmd.isupper():
+        cx, cy = float(texts[-2]), v
+      else:
+        cx, cy = cx + float(texts[-2]), cy + v
+      if i == 0:
+        sx, sy = cx, cy
+    if close:
+      out.append('z')
+      last_cmd = 'z'
+      last_text = None
+      cx, cy = sx, sy
+  return ''.join(out)
+
+
+def subpath_to_flat(sp):
+  """ convert a subpath [ [ [x,y], [x,y], [x,y] ], ... ] into one contiguous buffer array('d') of 6 floats per node:
+      prev_handle.x, prev_handle.y, node.x, node.y, next_handle.x, next_handle.y
+      That is 48 bytes per node, instead of a dozen python objects.
+      numpy.frombuffer(flat).reshape(-1, 6) gives an n x 6 view of the same memory, without copying.
+  """
+  return array('d', chain.from_iterable(chain.from_iterable(sp)))
+
+
+def flat_to_subpath(flat):
+  """ convert a flat buffer (array('d') or numpy array) back into the nested list form of a subpath. """
+  if hasattr(flat, 'reshape'):
+    return flat.reshape(-1, 3, 2).tolist()      # numpy does this in C.
+  f = flat.tolist()
+  return [ [ f[i:i+2], f[i+2:i+4], f[i+4:i+6] ] for i in range(0, len(f), 6) ]
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, numpy engine
+
+flat_round_corners_np() rounds all selected corners of a subpath as array operations, with the same results as
+RoundedCorners.subpath_round_corners() within floating point tolerance. The subpath is a flat buffer of 6 floats per node,
+see round_corners_format.subpath_to_flat(). fit_radius() (--max-radius) tries many radii on the same geometry.
+
+Only imported with --engine=numpy, with --engine=auto for subpaths with many corners, and with --max-radius. Requires numpy.
+"""
+
+import sys, math, time
+import inkex
+
+from round_corners_format import subpath_to_flat, flat_to_subpath
+import round_corners_record
+from round_corners_record import parse_rounded
+
+fit_radius_tol = 1e-9           # --max-radius: relative precision of the radius search. The result stays that far below the limit.
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def script(ext):
+  """ the module of the extension ext: round_corners, or __main__ when inkscape runs round_corners.py.
+      Its tuning constants are read from there, so that they stay in one place.
+  """
+  return sys.modules[type(ext).__module__]
+
+
+def norm_np(v):
+  """ the lengths of the rows of v, shape (n, 2).
+      Not np.hypot(): the same rounding as the python engine, decisions like alpha == 180deg must agree.
+  """
+  import numpy as np
+  return np.sqrt(v[:, 0]*v[:, 0] + v[:, 1]*v[:, 1])
+
+
+def arc_bezier_error_np(theta, radius):
+  """ numpy version of arc_bezier_error(). theta is an array. """
+  import numpy as np
+  return 2./27. * np.sin(0.25 * theta)**6 / np.cos(0.25 * theta)**2 * radius
+
+
+class CornerGeometry(object):
+  """ The selected corners of one flat subpath for the numpy engine, as arrays of the same length m.
+      Filled by corner_geometry_np(), with everything that does not depend on the radius.
+      ends and m are counts, A is the flat subpath of shape (n, 6), the others are the arrays of that function.
+      scale is set by fit_radius(), see RoundedCorners.path_scale().
+  """
+  __slots__ = ('ends', 'm', 'A', 'C', 'P_idx', 'T0', 'T1', 'T2', 'a', 'b', 'len_a', 'len_b', 'zero1', 'zero2',
+               'dist1', 'dist2', 'alpha', 'tan_half', 'degenerated', 'stretched', 'scale')
+
+  def __repr__(self):
+    return 'CornerGeometry(%s)' % ', '.join([ '%s=%r' % (k, getattr(self, k)) for k in self.__slots__ if hasattr(self, k) ])
+
+
+def fit_radius(ext, selection):
+  """ --max-radius: the largest radius up to ext.max_radius with which all corners of the selection index are rounded.
+      One analysis pass parses the paths as round_corner() does and collects the geometry of the selected corners with
+      corner_geometry_np(). Each radius tried is then checked with the vectorized corner_outcomes_np() only:
+      one check for most subpaths, and a binary search for those that need a smaller radius than found so far.
+      Degenerated and stretched corners are never rounded, they do not limit the radius.
+      Radii are in --unit, each subpath is checked with the radius in its user units, see RoundedCorners.path_scale().
+  """
+  import numpy as np
+
+  t = clock()
+  geometries = []
+  for path_id in sorted(selection):
+    elem = ext.svg.getElementById(path_id)
+    if elem is None:
+      continue              # reported by round_corner()
+    value = round_corners_record.rounded_record(ext, elem)
+    scale = ext.path_scale(elem)
+    s = ext.path_superpath(elem.get('d'), elem.attrib.get('transform'))
+    if ext.auto_selected:
+      round_corners_record.unround(ext, s, parse_rounded(value))
+    for subpath_idx, nodes in selection[path_id].items():
+      if subpath_idx < len(s) and len(s[subpath_idx]) >= 3:
+        g = corner_geometry_np(ext, np.array(s[subpath_idx], dtype=np.float64).reshape(-1, 6), nodes)
+        if g.m:
+          g.scale = scale
+          geometries.append(g)
+  t = ext.lap('to_superpath', t)
+
+  def too_large(r, g):
+    """ true if corners of the subpath g have not enough space for r """
+    return np.any(corner_outcomes_np(ext, g, r * g.scale)[0] == 1)
+
+  def estimate(g):
+    """ a cheap guess of the radius that fits g: the trim of each corner within its shorter segment """
+    k = ~(g.degenerated | g.stretched)
+    return float(np.min((np.minimum(g.dist1, g.dist2) * g.tan_half)[k])) / g.scale if np.any(k) else ext.max_radius
+
+  # The result is the smallest radius that fits one of the subpaths. Visited with the smallest guess first,
+  # most subpaths fit the radius found so far, and only need that one check.
+  radius = ext.max_radius
+  tight = [ g for g in geometries if too_large(radius, g) ]
+  for g in sorted(tight, key=estimate):
+    if not too_large(radius, g):
+      continue
+    lo, hi = 0.0, radius
+    # radii below ext.eps are not rounded, see RoundedCorners.corner_nodes(). Further down, the relative
+    # tolerance would underflow, where no radius fits.
+    while hi - lo > fit_radius_tol * hi and hi * g.scale > ext.eps:
+      mid = 0.5 * (lo + hi)
+      if too_large(mid, g):
+        hi = mid
+      else:
+        lo = mid
+    radius = lo
+  if tight:
+    if radius <= 0.0:
+      raise inkex.AbortExtension("--max-radius: no radius fits all selected corners.")
+    radius *= 1 - fit_radius_tol
+  ext.lap('corners', t)
+  return radius
+
+
+def subpath_round_corners_np(ext, sp, node_indices):
+  """ numpy implementation of subpath_round_corners(). Same results within floating point tolerance,
+      but all corners of the subpath are computed as array operations in one call.
+      sp and the returned subpath are in nested list form, see flat_round_corners_np() for the flat form.
+  """
+  return flat_to_subpath(flat_round_corners_np(ext, subpath_to_flat(sp), node_indices))
+
+
+def flat_round_corners_np(ext, flat, node_indices):
+  """ round all corners node_indices of the flat subpath, see subpath_to_flat(). flat is an array('d') or a numpy array,
+      it is used as a read-only view and is not copied. Returns the new subpath as a numpy array of shape (n, 6).
+
+      The geometry of each corner (alpha, trim, trim points, circle center, handles) only depends on
+      the directions towards its neighbours. Those directions do not change when a neighbour is rounded first.
+      Only the available lengths do: a corner directly following a rounded corner sees the trimmed segment.
+      Whether a corner is skipped thus depends on whether its predecessor was rounded.
+      We compute the skip reason for both cases and resolve the chain with a vectorized scan:
+      a corner either has a fixed outcome (reset), or it is rounded exactly if its predecessor was not (toggle),
+      or exactly if its predecessor was.
+
+      Debug output and --clamp are not available here, we fall back to the python engine for those.
+  """
+  import numpy as np
+
+  if isinstance(flat, np.ndarray):
+    A = flat.reshape(-1, 6)
+  else:
+    A = np.frombuffer(flat, dtype=np.float64).reshape(-1, 6)
+  # A[i] = [ prev_handle.x, prev_handle.y, node.x, node.y, next_handle.x, next_handle.y ]
+  n = len(A)
+  if n < 3 or script(ext).debug or ext.clamp or ext.radius <= 0:
+    sp = ext.subpath_round_corners(flat_to_subpath(A), node_indices)
+    return np.array(sp, dtype=np.float64).reshape(-1, 6)
+
+  g = corner_geometry_np(ext, A, node_indices)
+  ext.skipped_degenerated += g.ends
+  if g.m == 0:
+    return A
+  code, value, ok, end, closing, trim, trim_pt_p, trim_pt_n = corner_outcomes_np(ext, g, ext.radius)
+  C, T0, T1, T2, a, b, len_a, len_b, alpha = g.C, g.T0, g.T1, g.T2, g.a, g.b, g.len_a, g.len_b, g.alpha
+  r = ext.radius
+
+  ext.skipped_degenerated += int(np.count_nonzero(code == 2))
+  ext.skipped_stretched += int(np.count_nonzero(code == 3))
+  small = code == 1
+  if np.any(small):
+    ext.skipped_small_count += int(np.count_nonzero(small))
+    ext.skipped_small_len = min(ext.skipped_small_len, float(value[small].min()))
+
+  # Build the output. Each rounded corner is replaced by the two end nodes of its arc (or cut) and nseg-1 middle nodes.
+  R = np.flatnonzero(ok)
+  theta = math.pi - alpha[R]                # the angles swept by the arcs
+  if ext.cut:
+    nseg = np.ones(len(R), dtype=np.intp)
+    ext.rounded_line += len(R)
+  else:
+    if ext.tolerance > 0:
+      nseg = arc_segments_np(ext, theta)
+    else:
+      nseg = np.where(alpha[R] < 0.5*math.pi, 2, 1)
+    n1 = int(np.count_nonzero(nseg == 1))
+    ext.rounded_arc2 += n1
+    ext.rounded_arc3 += len(R) - n1
+  cnt = np.ones(n, dtype=np.intp)
+  cnt[C[R]] = 1 + nseg
+  cnt[end+1:] = 0
+  off = np.cumsum(cnt) - cnt
+  out = np.repeat(A, cnt, axis=0)
+
+  p1 = trim_pt_p[R]
+  p7 = trim_pt_n[R]
+  t1 = T1[R]
+  # We preserve the endpoints of non-0-length outside handles, but move 0-length handles with the trim points.
+  prev_handle = np.where(np.all(np.abs(T0[R] - t1) < 1e-9, axis=1)[:, None], p1, T0[R])
+  next_handle = np.where(np.all(np.abs(T2[R] - t1) < 1e-9, axis=1)[:, None], p7, T2[R])
+  node_a = np.hstack([ prev_handle, p1, p1 ])
+  node_b = np.hstack([ p7, p7, next_handle ])
+
+  o = off[C[R]]
+  ext.produced.extend(zip(C[R].tolist(), o.tolist(), (nseg + 1).tolist()))
+  if not ext.cut:
+    # the closed form of corner_template()
+    ua = a[R] / len_a[R][:, None]
+    ub = b[R] / len_b[R][:, None]
+    h = 4./3. * np.tan(0.25 * theta / nseg) * r
+    node_a[:, 4:6] = p1 - h[:, None] * ua
+    node_b[:, 0:2] = p7 - h[:, None] * ub
+
+    # middle nodes: K[i] is the corner of the i-th middle node, J[i] its number within that arc, 1 .. nseg-1
+    K = np.repeat(np.arange(len(R)), nseg - 1)
+    if len(K):
+      J = np.arange(len(K)) - np.repeat(np.cumsum(nseg - 1) - (nseg - 1), nseg - 1) + 1
+      phi = (0.5 * theta[K] - J * theta[K] / nseg[K])[:, None]
+      cdist = np.sqrt(r*r + trim[R]*trim[R])[K][:, None]
+      w = (ua + ub)[K] / (2 * np.cos(0.5 * alpha[R]))[K][:, None]     # unit vector along the bisector
+      t = (ua - ub)[K] / (2 * np.sin(0.5 * alpha[R]))[K][:, None]     # unit vector towards p1
+      pm = t1[K] + (cdist - r * np.cos(phi)) * w + r * np.sin(phi) * t
+      hm = h[K][:, None] * (np.sin(phi) * w + np.cos(phi) * t)
+      out[o[K] + J] = np.hstack([ pm + hm, pm, pm - hm ])
+
+  out[o] = node_a
+  out[o + nseg] = node_b
+  if closing:
+    out[off[end]] = out[0]
+
+  return out
+
+
+def corner_geometry_np(ext, A, node_indices):
+  """ the part of flat_round_corners_np() that does not depend on the radius: the selected corners of the flat subpath A,
+      shape (n, 6) with n >= 3, their neighbours, directions, lengths and angles, as arrays in a CornerGeometry.
+      g.m is the number of corners. g.ends counts the selected nodes where the path ends, they are degenerated.
+  """
+  import numpy as np
+
+  n = len(A)
+  X = A[:, 2:4]
+  sel = np.unique(np.asarray(node_indices, dtype=np.intp))
+
+  bad = (sel < 0) | (sel >= n-1)            # not a node, or the last node. Path ends here.
+  g = CornerGeometry()
+  g.ends = int(np.count_nonzero(bad))
+  C = sel[~bad]
+
+  T0 = A[C, 0:2]                            # we must not modify A, T0 gets the node 0 tweak.
+  P_idx = C - 1
+  if len(C) and C[0] == 0:
+    if np.all(np.abs(A[0] - A[-1]) < 1e-9):
+      P_idx[0] = n - 2                      # skip one node, it is the 'close marker'
+      if np.all(np.abs(X[0] - X[n-2]) < 1e-9):
+        T0[0] = A[n-2, 0:2]                 # still no distance, skip more. See super_node() and issue #2.
+        P_idx[0] = n - 3
+    else:
+      g.ends += 1                           # path ends here.
+      C = C[1:]
+      T0 = T0[1:]
+      P_idx = P_idx[1:]
+  g.m = len(C)
+  if g.m == 0:
+    return g
+
+  T1 = X[C]
+  T2 = A[C, 4:6]
+  dir1 = A[P_idx, 4:6] - T1                 # direction to the previous node (rel coords)
+  dir2 = A[C+1, 0:2] - T1                   # direction to the next node (rel coords)
+  dist1 = norm_np(dir1)
+  dist2 = norm_np(dir2)
+  h1 = T0 - T1
+  h2 = T2 - T1
+  zero1 = np.all(np.abs(h1) < 1e-9, axis=1)  # no handle, use the direction to the node instead.
+  zero2 = np.all(np.abs(h2) < 1e-9, axis=1)
+  a = np.where(zero1[:, None], dir1, h1)
+  b = np.where(zero2[:, None], dir2, h2)
+  len_a = norm_np(a)
+  len_b = norm_np(b)
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    cos_alpha = (a[:, 0]*b[:, 0] + a[:, 1]*b[:, 1]) / (len_a * len_b)
+    # a division by zero is degenerated, like the exception in subpath_round_corners().
+    degenerated = ~np.isfinite(cos_alpha)
+    alpha = np.arccos(np.where(degenerated, 1.0, np.clip(cos_alpha, -1.0, 1.0)))
+    degenerated |= alpha < ext.eps
+    stretched = ~degenerated & (np.abs(alpha - math.pi) < ext.eps)
+    tan_half = np.tan(0.5 * alpha)        # the trim is radius / tan_half
+
+  g.A, g.C, g.P_idx, g.T0, g.T1, g.T2 = A, C, P_idx, T0, T1, T2
+  g.a, g.b, g.len_a, g.len_b, g.zero1, g.zero2, g.dist1, g.dist2 = a, b, len_a, len_b, zero1, zero2, dist1, dist2
+  g.alpha, g.tan_half, g.degenerated, g.stretched = alpha, tan_half, degenerated, stretched
+  return g
+
+
+def corner_outcomes_np(ext, g, r):
+  """ the decisions of flat_round_corners_np() for the radius r, for the corners g of corner_geometry_np().
+      Returns (code, value, ok, end, closing, trim, trim_pt_p, trim_pt_n): code per corner is 0: rounded, 1: not enough space,
+      2: degenerated, 3: stretched, value the recorded length for 1, ok is code == 0. A[end:] is not copied, closing is true
+      when node 0 was rounded and the close marker becomes a copy of its first arc node. And the trims and trim points.
+      Nothing is counted here, so that fit_radius() can try many radii.
+  """
+  import numpy as np
+
+  n, m, C, P_idx, T0, T1 = len(g.A), g.m, g.C, g.P_idx, g.T0, g.T1
+  a, b, len_a, len_b, zero1, zero2, dist1, dist2 = g.a, g.b, g.len_a, g.len_b, g.zero1, g.zero2, g.dist1, g.dist2
+  tan_half, degenerated, stretched = g.tan_half, g.degenerated, g.stretched
+  with np.errstate(divide='ignore', invalid='ignore'):
+    trim = r / tan_half
+    trim_pt_p = T1 + a * trim[:, None] / len_a[:, None]
+    trim_pt_n = T1 + b * trim[:, None] / len_b[:, None]
+
+  # the trim of the next corner, where it follows directly and shares the segment, see trim_plan().
+  next_trim = np.zeros(m)
+  shared = np.flatnonzero(C[1:] == C[:-1] + 1)
+  nt = trim[shared+1]
+  next_trim[shared] = np.where(degenerated[shared+1] | stretched[shared+1], 0.0, nt)
+  factor = script(ext).max_trim_factor_single
+
+  def outcome(d1, lh1, d2, lh2, k=slice(None), nt=next_trim):
+    """ 0: rounded, 1: not enough space, 2: degenerated, 3: stretched. And the recorded length for 1.
+        k selects the corners, when the lengths are given for a subset only. nt is their next_trim.
+    """
+    small = [ d1 < r, d2 < r, lh1 < r, lh2 < r ]
+    value = np.select(small, [ d1, d2, lh1, lh2 ], 0.0)
+    small_any = small[0] | small[1] | small[2] | small[3]
+    b_budget = factor * np.minimum(lh2, d2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      split = (nt > 0) & (trim[k] + nt <= b_budget)
+      b_budget = np.where(split, b_budget * trim[k] / (trim[k] + nt), b_budget)
+    available = np.minimum(factor * np.minimum(lh1, d1), b_budget)
+    too_long = ~small_any & ~degenerated[k] & ~stretched[k] & (trim[k] > available)
+    code = np.select([ small_any, degenerated[k], stretched[k], too_long ], [ 1, 2, 3, 1 ], 0)
+    return code, np.where(too_long, available, value)
+
+  len_h1 = np.where(zero1, dist1, len_a)
+  len_h2 = np.where(zero2, dist2, len_b)
+  code_o, value_o = outcome(dist1, len_h1, dist2, len_h2)
+
+  # the same, but as seen after the previous corner was rounded. Its next handle may then be the trim point.
+  follows = np.zeros(m, dtype=bool)
+  follows[1:] = C[1:] == C[:-1] + 1
+  dist1_a = dist1.copy()
+  fz = np.flatnonzero(follows & np.roll(zero2, 1))
+  d = trim_pt_n[fz-1] - T1[fz]
+  dist1_a[fz] = norm_np(d)
+  code_a, value_a = outcome(dist1_a, np.where(zero1, dist1_a, len_a), dist2, len_h2)
+
+  # resolve the chain: ok[k] = after[k] if ok[k-1] else base[k]
+  # A corner has a fixed outcome (reset), is rounded exactly if its predecessor was not (toggle),
+  # or exactly if its predecessor was (a coincident predecessor moves away when it is rounded).
+  base = code_o == 0
+  after = code_a == 0
+  reset = ~follows | (base == after)
+  toggle = np.cumsum(~reset & base)
+  idx = np.arange(m)
+  last_reset = np.maximum.accumulate(np.where(reset, idx, 0))
+  ok = base[last_reset] ^ ((toggle - toggle[last_reset]) & 1).astype(bool)
+  prev_ok = np.zeros(m, dtype=bool)
+  prev_ok[1:] = ok[:-1] & follows[1:]
+  code = np.where(prev_ok, code_a, code_o)
+  value = np.where(prev_ok, value_a, value_o)
+
+  end = n                                   # A[end:] is not copied
+  closing = bool(C[0] == 0 and ok[0])
+  if closing:
+    end = P_idx[0] + 1                      # A[end] is the close marker, it becomes a copy of node 0's first arc node.
+    past = C >= end
+    code[past] = 2                          # this is the close marker. Node 0 was already rounded.
+    ok[past] = False
+    last = np.flatnonzero(C == end - 1)
+    if len(last) and last[0] > 0:
+      # the last corner sees the start of the node 0 arc as its next node.
+      k = last[0]
+      nh0 = T0[0] if not np.all(np.abs(T0[0] - T1[0]) < 1e-9) else trim_pt_p[0]
+      d2 = norm_np((nh0 - T1[k])[None, :])[0]
+      d1 = dist1_a[k:k+1] if prev_ok[k] else dist1[k:k+1]
+      c_k, v_k = outcome(d1, np.where(zero1[k], d1, len_a[k]), np.array([d2]), np.where(zero2[k], d2, len_b[k:k+1]), slice(k, k+1), np.zeros(1))
+      code[k] = c_k[0]
+      value[k] = v_k[0]
+      ok[k] = c_k[0] == 0
+
+
+  return code, value, ok, end, closing, trim, trim_pt_p, trim_pt_n
+
+
+def arc_segments_np(ext, theta):
+  """ numpy version of arc_segments(). theta is an array, returns an integer array. """
+  import numpy as np
+
+  n = np.ones(len(theta), dtype=np.intp)
+  todo = np.flatnonzero(arc_bezier_error_np(theta, ext.radius) > ext.tolerance)
+  while len(todo):
+    n[todo] += 1
+    todo = todo[(n[todo] < script(ext).max_arc_segments) & (arc_bezier_error_np(theta[todo] / n[todo], ext.radius) > ext.tolerance)]
+  return n
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, worker processes (--jobs)
+
+round_paths_parallel() hands the paths of a document to a pool of worker processes. Each worker has its own
+RoundedCorners instance with the settings of the run, see round_path_init(), and parses, rounds and serializes
+one path per job, see round_path_job().
+
+Only imported with --jobs other than 1. Requires python3.
+"""
+
+from __future__ import print_function
+
+import sys, time
+import inkex
+
+import round_corners_record
+from round_corners_record import parse_rounded, format_rounded
+
+clock = getattr(time, 'perf_counter', time.time)
+round_path_worker = None        # the RoundedCorners instance of a worker process, see round_paths_parallel()
+
+
+def script(ext):
+  """ the module of the extension ext: round_corners, or __main__ when inkscape runs round_corners.py.
+      Its tuning constants are read from there, so that they stay in one place.
+  """
+  return sys.modules[type(ext).__module__]
+
+
+def round_path_init(cls, settings):
+  """ ProcessPoolExecutor initializer: one instance of the extension class cls per worker process. """
+  global round_path_worker
+  round_path_worker = cls()
+  for k in settings:
+    setattr(round_path_worker, k, settings[k])
+
+
+def round_path_job(job):
+  """ round one path in a worker process. job is (path_id, d, transform, subpaths, rounded, scale), transform is the value of its
+      transform attribute, rounded is its RoundedCorners.rounded_record(), scale that of RoundedCorners.path_scale().
+      Returns (path_id, d, rounded, counters, timings, clamped, error), d is None if nothing changed. counters are those of corner_counters, skipped_small_len,
+      and the template cache hits and misses. The cache itself is kept for the next path of this worker. clamped are the entries of RoundedCorners.clamped.
+      Exceptions are returned as error text, so that they only affect this path.
+  """
+  path_id, d, transform, subpaths, rounded, scale = job
+  w = round_path_worker
+  corner_counters = script(w).corner_counters
+  w.use_scale(scale)
+  for k in corner_counters:
+    setattr(w, k, 0)
+  w.skipped_small_len = 1e99
+  w.templates.hits = w.templates.misses = 0
+  w.clamped = []
+  w.timings = dict.fromkeys(script(w).stats_phases, 0.0)
+  try:
+    t = clock()
+    s = w.path_superpath(d, transform)
+    rounded = parse_rounded(rounded)
+    restored = 0
+    if w.auto_selected:
+      rounded, restored = round_corners_record.unround(w, s, rounded)
+    t = w.lap('to_superpath', t)
+    rounded, count = w.round_superpath(s, subpaths, rounded, path_id)
+    t = w.lap('corners', t)
+    out = None
+    if count or restored:
+      out = w.format_path(s, d)
+    w.lap('to_path', t)
+  except Exception as e:
+    return (path_id, None, None, None, None, None, "%s: %s" % (type(e).__name__, e))
+  counters = tuple([ getattr(w, k) for k in corner_counters ]) + (w.skipped_small_len, w.templates.hits, w.templates.misses)
+  return (path_id, out, format_rounded(rounded), counters, w.timings, w.clamped, None)
+
+
+def round_paths_parallel(ext, selection, jobs):
+  """ round all paths of the selection index in a pool of jobs worker processes.
+      The d data of each path is extracted here, the workers parse, round and serialize it,
+      and we write the results back in sorted path_id order, so the output does not depend on scheduling.
+      A path that fails in its worker is reported and left unchanged, the other paths are still written.
+      Returns False, if no worker pool can be used here. Nothing was changed then, the caller rounds the same elements
+      in this process.
+  """
+  try:
+    from concurrent.futures import ProcessPoolExecutor
+  except ImportError:
+    return False            # python2
+
+  t = clock()
+  elems = {}
+  work = []
+  for path_id in sorted(selection):
+    elem = ext.svg.getElementById(path_id)
+    if elem is None:
+      print("selected path %s not found in svg document" % path_id, file=sys.stderr)
+      continue
+    value = round_corners_record.rounded_record(ext, elem)
+    elems[path_id] = elem         # the transform is baked by the worker, see RoundedCorners.path_superpath()
+    work.append((path_id, elem.get('d'), elem.attrib.get('transform'), selection[path_id], value, ext.path_scale(elem)))
+  ext.lap('lookup', t)
+
+  settings = { 'doc_radius': ext.doc_radius, 'doc_tolerance': ext.doc_tolerance, 'unit': ext.unit, 'cut': ext.cut, 'exact': ext.exact, 'clamp': ext.clamp, 'max_radius': ext.max_radius,
+               'numpy_min_corners': ext.numpy_min_corners, 'precision': ext.precision, 'coordinates': ext.coordinates,
+               'auto_selected': ext.auto_selected }
+  try:
+    pool = ProcessPoolExecutor(jobs, initializer=round_path_init, initargs=(type(ext), settings))
+    try:
+      results = list(pool.map(round_path_job, work, chunksize=max(1, len(work) // (4 * jobs))))
+    finally:
+      pool.shutdown()
+  except Exception as e:
+    print("Warning: no worker processes (%s), continuing in a single process.\n" % e, file=sys.stderr)
+    return False
+
+  t = clock()
+  corner_counters = script(ext).corner_counters
+  for path_id, d, rounded, counters, timings, clamped, error in results:
+    if error is not None:
+      print("Warning: path %s left unchanged, rounding failed: %s\n" % (path_id, error), file=sys.stderr)
+      continue
+    ext.clamped.extend(clamped)
+    for k, v in zip(corner_counters, counters):
+      setattr(ext, k, getattr(ext, k) + v)
+    ext.skipped_small_len = min(ext.skipped_small_len, counters[len(corner_counters)])
+    ext.templates.hits += counters[-2]
+    ext.templates.misses += counters[-1]
+    for k in timings:
+      ext.timings[k] += timings[k]                # summed over all workers
+    if d is None:
+      if ext.auto_selected and not elems[path_id].attrib.get('transform'):
+        round_corners_record.set_rounded(ext, elems[path_id], rounded, True)
+      continue                                      # nothing changed
+    ext.set_path(elems[path_id], d)
+    round_corners_record.set_rounded(ext, elems[path_id], rounded, ext.auto_selected)
+    ext.paths_done += 1
+  ext.lap('write_back', t)
+  return True
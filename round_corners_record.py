@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, records of earlier runs (data-round-corners)
+
+Each rounded path records the node ranges of its arcs, and the settings they were made with, in its rounded_attr,
+see parse_rounded() and format_rounded(). A later run on the same path
+ - keeps the arcs made with its own settings, and does not round them again,
+ - collapses arcs made with other settings back into their corners, so that they are rounded again, see unround(),
+ - skips a path that was rounded with its settings and not changed since, without parsing it.
+The record is stamped with a checksum of the path data, see set_rounded(). Once the path was edited,
+the record is ignored, see rounded_record().
+
+Always imported.
+"""
+
+import math, zlib
+
+rounded_attr = 'data-round-corners'     # per path record of the corners rounded by earlier runs, see parse_rounded()
+
+
+def parse_rounded(value):
+  """ parse the rounded_attr value of a path, as written by format_rounded(). Groups are separated by ';', each has
+      the settings the corners were rounded with (method, radius and, if set, tolerance) and the node ranges of
+      their arcs, as subpath_idx:first-last,first-last ...  E.g. 'arc 2.0 0:1-2,5-7 1:0-1; line 1.0 0:9-10'
+      A first group '#checksum' or '#checksum settings' is the stamp of set_rounded(), it is skipped here.
+      The ranges are only valid for the path data of the checksum, see rounded_record().
+      Returns { subpath_idx: [ (first, last, settings), ... ] }, sorted by first. Unparsable ranges are ignored.
+  """
+  ret = {}
+  for group in (value or '').split(';'):
+    words = group.split()
+    if words and words[0][0] == '#':
+      continue
+    settings = ' '.join([ w for w in words if ':' not in w ])
+    for w in words:
+      if ':' in w:
+        try:
+          sp_idx, ranges = w.split(':')
+          for r in ranges.split(','):
+            first, last = r.split('-')
+            item = (int(first), int(last), settings)
+            ret.setdefault(int(sp_idx), []).append(item)
+        except ValueError:
+          continue
+  for ranges in ret.values():
+    ranges.sort()
+  return ret
+
+
+def path_checksum(d):
+  """ the checksum of the path data d in the stamp of set_rounded() """
+  return '%08x' % (zlib.crc32(d.encode('utf-8')) & 0xffffffff)
+
+
+def format_rounded(rounded):
+  """ the rounded_attr value of the index rounded, see parse_rounded(). '' if there are no ranges. """
+  groups = {}
+  for sp_idx in rounded:
+    for first, last, settings in rounded[sp_idx]:
+      groups.setdefault(settings, {}).setdefault(sp_idx, []).append('%d-%d' % (first, last))
+  return '; '.join([ ' '.join([ settings ] + [ '%d:%s' % (i, ','.join(groups[settings][i])) for i in sorted(groups[settings]) ])
+                     for settings in sorted(groups) ])
+
+
+def rounded_settings(ext):
+  """ the settings of this run, as recorded with each range in rounded_attr """
+  words = [ 'line' if ext.cut else 'arc', repr(ext.doc_radius if ext.max_radius is None else ext.max_radius) ]
+  if ext.doc_tolerance and not ext.cut:
+    words.append(repr(ext.doc_tolerance))
+  if ext.unit != 'user':
+    words.append(ext.unit)
+  if ext.exact:
+    words.append('exact')
+  if ext.clamp:
+    words.append('clamp')
+  if ext.max_radius is not None:
+    words.append('max')
+  return ' '.join(words)
+
+
+def unround(ext, s, rounded):
+  """ undo the arcs of earlier runs that were made with other settings (e.g. another radius), so that
+      they can be rounded again: each such node range of s is collapsed into the corner node it replaced.
+      Arcs with the settings of this run are kept. Modifies s inplace.
+      rounded is the index of the arcs in s, see parse_rounded(). Returns (rounded, restored): the index of the
+      kept arcs, with node indices of the modified s, and the number of corners restored.
+  """
+  settings = rounded_settings(ext)
+  ret = {}
+  restored = 0
+  for sp_idx in rounded:
+    if sp_idx >= len(s):
+      continue
+    sp = s[sp_idx]
+    closed = ext.very_close_xy(sp[0][1], sp[-1][1])      # inkscape 0.92 keeps the outgoing handle at node 0 only
+    keep = []
+    stop = len(sp) - 1                      # the last node is never part of an arc
+    for first, last, old in reversed(rounded[sp_idx]):      # backwards: collapsing does not move the ranges before
+      if not 0 <= first < last < stop:
+        continue                            # overlapping or out of range, not ours.
+      stop = first
+      if old == settings:
+        keep.append([ first, last, old ])
+        continue
+      node = corner_from_arc(ext, sp, first, last)
+      if node is None:
+        continue                            # the arc stays as it is, but is no longer recorded.
+      if first == 0 and closed:
+        extra = sp[-2]
+        if len(sp) - 2 > last and ext.very_close_xy(extra[1], sp[0][1]):
+          # issue #2: the node before the close marker is the end of the arc too. Move it with the corner.
+          sp[-2] = [ extra[0], node[1][:], extra[2] if not ext.very_close_xy(extra[2], extra[1]) else node[1][:] ]
+        sp[-1] = [ node[0][:], node[1][:], node[2][:] ]
+      sp[first:last+1] = [ node ]
+      for k in keep:
+        k[0] -= last - first
+        k[1] -= last - first
+      restored += 1
+    if keep:
+      ret[sp_idx] = [ tuple(k) for k in reversed(keep) ]
+  return ret, restored
+
+
+def corner_from_arc(ext, sp, first, last):
+  """ the corner node replaced by the arc (or cut) sp[first] .. sp[last]: the intersection of the tangents at both ends.
+      Outside handles of non-zero length are kept, 0-length handles move to the corner, see corner_nodes().
+      Returns None, if the tangents are parallel.
+  """
+  na = sp[first]
+  nb = sp[last]
+  p1 = na[1]
+  p7 = nb[1]
+  q1 = na[0]
+  if first > 0:
+    prev = sp[first-1]
+  else:
+    k = len(sp) - 2                         # skip the close marker
+    if ext.very_close_xy(sp[k][1], p1):
+      q1 = sp[k][0]                         # issue #2: the handle is at the node before the close marker.
+      k -= 1
+    prev = sp[k]
+  if ext.very_close_xy(q1, p1):
+    q1 = prev[2] if not ext.very_close_xy(prev[2], p1) else prev[1]
+  q2 = nb[2]
+  if ext.very_close_xy(q2, p7):
+    q2 = sp[last+1][0] if not ext.very_close_xy(sp[last+1][0], p7) else sp[last+1][1]
+  ux, uy = q1[0] - p1[0], q1[1] - p1[1]
+  vx, vy = q2[0] - p7[0], q2[1] - p7[1]
+  den = ux * vy - uy * vx
+  if abs(den) <= ext.eps * math.hypot(ux, uy) * math.hypot(vx, vy):
+    return None
+  f = ((p7[0] - p1[0]) * vy - (p7[1] - p1[1]) * vx) / den
+  c = [ p1[0] + f * ux, p1[1] + f * uy ]
+  return [ na[0][:] if not ext.very_close_xy(na[0], p1) else c[:], c, nb[2][:] if not ext.very_close_xy(nb[2], p7) else c[:] ]
+
+
+def rounded_stamp(ext, d):
+  """ the stamp of set_rounded() for the path data d, when done: its checksum and the settings of this run """
+  return '#%s %s' % (path_checksum(d), rounded_settings(ext))
+
+
+def rounded_record(ext, elem):
+  """ the rounded_attr value of elem, if its stamp matches the path data, see set_rounded(). None if there is none,
+      or the path was edited since: its node ranges are stale then, they could point at nodes that are no arcs.
+  """
+  value = elem.get(rounded_attr)
+  if value and value[0] == '#' and value[1:].partition(';')[0].split(' ')[0] == path_checksum(elem.get('d') or ''):
+    return value
+  return None
+
+
+def set_rounded(ext, elem, rounded, done=False):
+  """ record the arcs of the index rounded (or its format_rounded() text) in the rounded_attr of elem, see parse_rounded().
+      The record is stamped with a checksum of the path data, it is ignored once the path was changed, see rounded_record().
+      done: all corners of the path data of elem were rounded, or tried, with the settings of this run. The settings are
+      added to the stamp then, so that find_roundable_nodes() can skip the path unless it was changed since.
+  """
+  value = rounded if not isinstance(rounded, dict) else format_rounded(rounded)
+  if value or done:
+    stamp = rounded_stamp(ext, elem.get('d')) if done else '#' + path_checksum(elem.get('d'))
+    value = '; '.join([ stamp ] + ([ value ] if value else []))
+  if value:
+    elem.set(rounded_attr, value)
+  else:
+    elem.attrib.pop(rounded_attr, None)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, svg shapes and units
+
+ - Shapes with corners (rect, polygon, polyline) are converted to paths before rounding, and converted back
+   if none of their corners was rounded, see shapes_to_paths() and restore_shapes().
+ - --unit: the lengths of the document and the scale of transforms, see user_units_per() and transform_scale().
+
+Always imported.
+"""
+
+import math, time
+import inkex
+
+from round_corners_record import rounded_attr
+
+# shapes converted to paths, and their geometry. Ellipses and circles have no corners, see shape_path_data().
+shape_attrs = { 'rect': ('x', 'y', 'width', 'height', 'rx', 'ry'), 'polygon': ('points',), 'polyline': ('points',) }
+shape_hidden_tags = ('defs', 'clipPath', 'mask', 'symbol')     # shapes inside are not converted, see shape_hidden()
+# a number of path data or points, as the lexer of inkex 0.92 (simplepath.py) parses them: '1-2' is 1 -2, '.5.5' is .5 .5
+number_re = r'[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?'
+units_px = { 'px': 1.0, 'pt': 96/72., 'pc': 16.0, 'mm': 96/25.4, 'cm': 96/2.54, 'in': 96.0, 'q': 96/101.6 }   # --unit: css px per unit
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def transform_scale(transform):
+  """ the length scale of an svg transform attribute value: sqrt(|det|). Exact for rotations and uniform scales,
+      the geometric mean of both axes otherwise. 1.0 without a transform.
+  """
+  if not transform:
+    return 1.0
+  m = inkex.Transform(transform).matrix
+  return math.sqrt(math.fabs(m[0][0]*m[1][1] - m[0][1]*m[1][0]))
+
+
+def transform_uniform(transform):
+  """ true if the svg transform attribute value scales all directions alike: a rotation, translation and uniform scale.
+      False for a non-uniform scale or a skew, a circle then becomes an ellipse.
+  """
+  if not transform:
+    return True
+  m = inkex.Transform(transform).matrix
+  sx = math.hypot(m[0][0], m[1][0])             # the lengths of the transformed unit vectors
+  sy = math.hypot(m[0][1], m[1][1])
+  dot = m[0][0]*m[0][1] + m[1][0]*m[1][1]
+  return abs(sx - sy) <= 1e-6 * max(sx, sy) and abs(dot) <= 1e-6 * sx * sy
+
+
+def user_units_per(root, unit):
+  """ the user units of the svg root element per unit (one of units_px): the viewBox width over the width attribute.
+      Without a viewBox or an absolute width, a user unit is one px.
+  """
+  import re
+  px = units_px[unit]
+  viewbox = (root.get('viewBox') or '').replace(',', ' ').split()
+  m = re.match(r'\s*([0-9.]+(?:[eE][-+]?[0-9]+)?)\s*([a-zA-Z]*)\s*$', root.get('width') or '')
+  if len(viewbox) == 4 and m and (m.group(2).lower() or 'px') in units_px:
+    try:
+      width = float(m.group(1)) * units_px[m.group(2).lower() or 'px']
+      vb_width = float(viewbox[2])
+    except ValueError:
+      return px
+    if width > 0 and vb_width > 0:
+      px *= vb_width / width
+  return px
+
+
+def document_size(root):
+  """ the larger side of the svg root element in user units: that of the viewBox, else of the width and height.
+      None if it is not known, e.g. for a width in percent.
+  """
+  viewbox = (root.get('viewBox') or '').replace(',', ' ').split()
+  try:
+    if len(viewbox) == 4:
+      size = max(float(viewbox[2]), float(viewbox[3]))
+    else:
+      size = max(shape_length(root.get('width')), shape_length(root.get('height')))
+  except ValueError:
+    return None
+  return size if size > 0 else None
+
+
+def shape_length(value):
+  """ a length attribute of a shape in user units: a number, with an absolute unit of units_px or none.
+      0.0 if value is None. Raises ValueError for anything else, e.g. percentages.
+  """
+  if value is None:
+    return 0.0
+  v = value.strip()
+  unit = v[-2:].lower() if v[-2:].isalpha() else v[-1:].lower() if v[-1:].isalpha() else ''
+  if (unit or 'px') not in units_px:
+    raise ValueError("unit of %s" % value)
+  return float(v[:len(v)-len(unit)]) * units_px[unit or 'px']
+
+
+def shape_path_data(elem):
+  """ the path data of the shape elem, one of shape_attrs: the lines of a polygon, polyline or rect.
+      Returns None if the shape is invalid or not drawn (e.g. a zero width), uses units relative to the viewport,
+      or has no corners: a rect with rx or ry is rounded already, all its nodes are smooth.
+  """
+  tag = elem.tag.split('}')[-1]
+  try:
+    if tag == 'rect':
+      x, y, w, h, rx, ry = [ shape_length(elem.get(k)) for k in shape_attrs['rect'] ]
+      if w <= 0 or h <= 0 or rx > 0 or ry > 0:
+        return None
+      return 'M %r,%r H %r V %r H %r Z' % (x, y, x + w, y + h, x)
+    import re
+    points = elem.get('points') or ''
+    if re.sub(number_re, ' ', points).replace(',', ' ').strip():
+      return None               # not only numbers
+    v = [ float(t) for t in re.findall(number_re, points) ]
+  except ValueError:
+    return None
+  if len(v) < 4:
+    return None
+  d = 'M ' + ' L '.join([ '%r,%r' % (v[i], v[i+1]) for i in range(0, len(v) - 1, 2) ])
+  return d + ' Z' if tag == 'polygon' else d
+
+
+def shape_hidden(elem):
+  """ true if elem is inside one of shape_hidden_tags: a definition, clip path, mask or symbol, that is only drawn
+      where it is used, and is not part of the drawing itself.
+  """
+  elem = elem.getparent()
+  while elem is not None:
+    if isinstance(elem.tag, str) and elem.tag.split('}')[-1] in shape_hidden_tags:
+      return True
+    elem = elem.getparent()
+  return False
+
+
+def shapes_to_paths(ext, ids=None):
+  """ Object to Path for the shapes of shape_attrs, so that they are rounded like paths: one walk through the
+      document replaces each shape with one of the ids (all with an id, if ids is None), see shape_to_path().
+      Shapes inside shape_hidden_tags are kept, see shape_hidden().
+      Returns [ (shape, path), ... ] for restore_shapes(). The time is counted as lookup.
+  """
+  t = clock()
+  tags = [ inkex.addNS(tag, 'svg') for tag in shape_attrs ]
+  if ids is not None:
+    ids = set(ids)
+    if not ids:
+      return []
+  converted = []
+  for shape in list(ext.document.getroot().iter(*tags)):
+    shape_id = shape.get('id')
+    if shape_id is not None and (ids is None or shape_id in ids) and not shape_hidden(shape):
+      path = shape_to_path(ext, shape)
+      if path is not None:
+        converted.append((shape, path))
+  ext.lap('lookup', t)
+  return converted
+
+
+def shape_to_path(ext, shape):
+  """ replace the shape element in its tree by a path with its attributes and children, and the path data
+      of shape_path_data() instead of the geometry attributes. Returns the path, or None if shape is not converted.
+  """
+  d = shape_path_data(shape)
+  parent = shape.getparent()
+  if d is None or parent is None:
+    return None
+  from collections import OrderedDict
+  drop = shape_attrs[shape.tag.split('}')[-1]]
+  attrib = OrderedDict([ (k, v) for k, v in shape.attrib.items() if k not in drop ] + [ ('d', d) ])
+  path = shape.makeelement(inkex.addNS('path', 'svg'), attrib)    # in order, and without the per attribute hooks of inkex.
+  path.extend(list(shape))
+  path.tail = shape.tail
+  parent.replace(shape, path)
+  return path
+
+
+def restore_shapes(ext, converted):
+  """ undo shapes_to_paths() where no arc was recorded in the path, i.e. nothing was rounded.
+      The other paths stay, they are counted in ext.shapes_done.
+  """
+  for shape, path in converted:
+    if ':' in (path.get(rounded_attr) or ''):
+      ext.shapes_done += 1
+      continue
+    shape.extend(list(path))
+    shape.tail = path.tail
+    path.getparent().replace(path, shape)
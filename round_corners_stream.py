@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+"""
+Rounded Corners, streaming mode
+
+round_stream() rounds a document that is too large to load as a whole: elements are read with an incremental
+parser, rounded and written out one at a time. See round_corners_batch.py --stream.
+
+Only imported in streaming mode. Requires lxml and inkscape 1.x.
+"""
+
+import time
+import inkex
+
+import round_corners_record, round_corners_shapes
+from round_corners_record import parse_rounded
+from round_corners_shapes import shape_attrs, shape_hidden
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def round_stream(ext, infile, outfile):
+  """ streaming variant of RoundedCorners.effect() for very large documents, see round_corners_batch.py --stream.
+      ext.options must be parsed already. infile and outfile are file names or binary file objects.
+
+      The input is read with an incremental parser, the output is written as we go.
+      Container elements (svg, g, a, ...) are opened in the output when their first child arrives,
+      every other element is rounded and written out as a whole as soon as it is complete, and then dropped.
+      Peak memory is thus bounded by the largest single element, not by the document.
+
+      The selection criteria are those of RoundedCorners.effect(): selected nodes, else the selected ids, else (with --all)
+      all paths with an id, outside of definitions, clip paths, masks and symbols.
+  """
+  import re
+  from lxml import etree
+  t_start = clock()
+  ext.apply_options()
+  if ext.max_radius is not None:
+    raise inkex.AbortExtension("--max-radius needs all paths before rounding the first, it cannot be streamed.")
+  selection = None
+  ids = None
+  if len(ext.options.selected_nodes):
+    selection = ext.selection_index(ext.options.selected_nodes)
+  elif len(ext.options.ids):
+    ids = set(ext.options.ids)
+  elif not ext.options.all:
+    raise inkex.AbortExtension("Could not find nodes inside a path. No path objects selected?")
+
+  path_tag = inkex.addNS('path', 'svg')
+  shape_tags = [ inkex.addNS(t, 'svg') for t in shape_attrs ]
+  containers = set([ inkex.addNS(t, 'svg') for t in ('svg', 'g', 'a', 'switch', 'defs', 'symbol') ])
+  xmlns_re = re.compile(br'^(<[^\s/>]+)((?:\s+xmlns(?::[^\s=]+)?="[^"]*")*)')
+  stack = []                # open containers: [ elem, start tag written, child with unwritten tail ]
+
+  def esc(text, attr=False):
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if attr:
+      text = text.replace('"', '&quot;').replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;')
+    return text.encode('utf-8')
+
+  def xmlns(elem):
+    """ the namespace declarations of elem itself, i.e. not inherited from its parent. """
+    parent = elem.getparent()
+    inherited = {} if parent is None else parent.nsmap
+    return b''.join([ b' xmlns' + (b':' + k.encode('utf-8') if k else b'') + b'="' + esc(v, True) + b'"'
+                      for k, v in elem.nsmap.items() if inherited.get(k) != v ])
+
+  def qname(elem, name):
+    uri, local = name[1:].split('}') if name[0] == '{' else (None, name)
+    if uri is None or (elem.nsmap.get(None) == uri and name == elem.tag):
+      return local
+    for k, v in elem.nsmap.items():
+      if v == uri and k:
+        return k + ':' + local
+    return local
+
+  def open_container(entry):
+    if not entry[1]:
+      elem = entry[0]
+      out.write(b'<' + qname(elem, elem.tag).encode('utf-8') + xmlns(elem))
+      for k, v in elem.attrib.items():
+        out.write(b' ' + qname(elem, k).encode('utf-8') + b'="' + esc(v, True) + b'"')
+      out.write(b'>')
+      if elem.text:
+        out.write(esc(elem.text))
+      entry[1] = True
+
+  def write_node(node):
+    data = etree.tostring(node, encoding='utf-8', xml_declaration=False, with_tail=False)
+    if isinstance(node.tag, str):
+      # tostring() redeclares all inherited namespaces of a subtree, keep only its own ones.
+      data = xmlns_re.sub(lambda m: m.group(1) + xmlns(node), data, 1)
+    out.write(data)
+
+  def flush_pending(entry):
+    done = entry[2]
+    if done is not None:
+      if done.tail:
+        out.write(esc(done.tail))
+      entry[0].remove(done)
+      entry[2] = None
+
+  def round_subtree(elem):
+    """ round the paths in elem, and the shapes, see round_corners_shapes.shapes_to_paths(). Returns elem, or the path that replaced it. """
+    for p in list(elem.iter(path_tag, *shape_tags)):
+      path_id = p.get('id')
+      if selection is not None:
+        if path_id in selection and p.tag == path_tag:
+          round_stream_path(ext, p, selection[path_id])
+      elif path_id is not None and (ids is None or path_id in ids):
+        if p.tag == path_tag:
+          if ids is None and shape_hidden(p):
+            continue        # --all: as RoundedCorners.effect(), not in definitions, clip paths, masks or symbols
+          round_stream_path(ext, p, None)
+          continue
+        if shape_hidden(p):
+          continue
+        path = round_corners_shapes.shape_to_path(ext, p)
+        if path is not None:
+          round_stream_path(ext, path, None)
+          round_corners_shapes.restore_shapes(ext, [ (p, path) ])
+          if p is elem and path.getparent() is not None:
+            elem = path             # kept as path, written instead of the shape
+    return elem
+
+  prolog = []               # comments and processing instructions before the root element
+  out = open(outfile, 'wb') if isinstance(outfile, str) else outfile
+  try:
+    for event, elem in etree.iterparse(infile, events=('start', 'end', 'comment', 'pi'), huge_tree=True, strip_cdata=False):
+      parent = elem.getparent()
+      if event == 'start':
+        if parent is None:
+          ext.use_document(elem)                  # the attributes of the root element are complete at its start
+          docinfo = elem.getroottree().docinfo
+          standalone = { True: b' standalone="yes"', False: b' standalone="no"' }.get(docinfo.standalone, b'')
+          out.write(b'<?xml version="1.0" encoding="UTF-8"' + standalone + b'?>\n')
+          if docinfo.doctype:
+            out.write(docinfo.doctype.encode('utf-8') + b'\n')
+          for node in prolog:
+            write_node(node)
+            out.write(b'\n')
+          prolog = None
+          stack.append([elem, False, None])
+        elif stack and stack[-1][0] is parent:
+          open_container(stack[-1])
+          flush_pending(stack[-1])
+          if elem.tag in containers:
+            stack.append([elem, False, None])
+      elif stack and stack[-1][0] is elem:          # end of a container
+        entry = stack.pop()
+        ext.scales.pop(elem, None)
+        if not entry[1]:
+          write_node(elem)                          # no children
+        else:
+          flush_pending(entry)
+          out.write(b'</' + qname(elem, elem.tag).encode('utf-8') + b'>')
+        if stack:
+          stack[-1][2] = elem
+        else:
+          out.write(b'\n')
+      elif parent is None:                          # comment or pi outside the root element
+        if prolog is not None:
+          prolog.append(elem)                       # before the xml declaration is written
+        else:
+          write_node(elem)
+          out.write(b'\n')
+      elif stack and stack[-1][0] is parent:        # a complete child of an open container
+        if event == 'end':
+          elem = round_subtree(elem)
+        else:
+          open_container(stack[-1])
+          flush_pending(stack[-1])
+        write_node(elem)
+        stack[-1][2] = elem
+  finally:
+    if out is not outfile:
+      out.close()
+  ext.write_stats(clock() - t_start)
+
+
+def round_stream_path(ext, elem, subpaths):
+  """ RoundedCorners.round_corner() for a plain lxml path element, as used by round_stream().
+      subpaths is a selection index entry, or None to round all roundable nodes.
+  """
+  t = clock()
+  transform = elem.attrib.get('transform')
+  ext.use_scale(ext.path_scale(elem))
+  s = ext.path_superpath(elem.get('d'), transform)
+  value = round_corners_record.rounded_record(ext, elem)
+  auto = subpaths is None
+  if auto and value and value[0] == '#' and not transform and value.partition(';')[0] == round_corners_record.rounded_stamp(ext, elem.get('d')):
+    ext.skipped_rounded += value.count(':') + value.count(',')
+    ext.paths_skipped += 1
+    return
+  rounded = parse_rounded(value)
+  restored = 0
+  if auto:
+    rounded, restored = round_corners_record.unround(ext, s, rounded)
+    subpaths = ext.roundable_nodes(s, rounded)
+  if len(subpaths) or restored:
+    t = ext.lap('to_superpath', t)
+    rounded, count = ext.round_superpath(s, subpaths, rounded, elem.get('id'))
+    t = ext.lap('corners', t)
+    if not (count or restored):
+      if auto and not transform:
+        round_corners_record.set_rounded(ext, elem, rounded, True)
+      return        # nothing changed, leave the path data as it is.
+    d = ext.format_path(s, elem.get('d'))
+    t = ext.lap('to_path', t)
+    ext.set_path(elem, d)
+    round_corners_record.set_rounded(ext, elem, rounded, auto)
+    ext.lap('write_back', t)
+    ext.paths_done += 1
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#
+# Microbenchmarks of round_corners.py with synthetic paths.
+#
+# Generators (sizes are node counts):
+#  - zigzag:  an open zigzag line, like test/zigzag.svg
+#  - slanted: many slanted rectangles with one curved side, like doc/slanted_rect.svg, one subpath each
+#  - curved:  one closed polygon with curved handles at every node
+#  - glyphs:  many small closed L-shaped subpaths, like the outlines of text converted to a path
+#
+# Timed operations, per generator and size:
+#  - find_roundable_nodes()   (includes parsing the d attribute)
+#  - super_node()             for every corner
+#  - subpath_round_corner()   for a sample of corners, each call copies the subpath
+#  - corner_template()        for every corner, with a cache of size 0: the arc geometry without the lookup.
+#                             It stands in for arc_bezier_handles(), which it replaced: corner_template() computes
+#                             the arc center and the bezier handles of a corner in closed form.
+#  - round_superpath          all corners in one pass, with the python and the numpy engine, and with --exact
+#  - effect                   a full run of the extension: load, round all corners, save
+#
+# Reported is the throughput in corners per second, and the scaling exponent k of the time per corner ~ nodes^k
+# between successive sizes. 0: the time per corner does not depend on the path size, i.e. linear total time.
+#
+# Usage: python3 test/benchmark.py [--sizes 10,100,1000] [--generators zigzag,curved] [--ops effect] [--json FILE]
+# Sizes up to 1000000 work, but effect and subpath_round_corner then take minutes.
+#
+import os, sys, math, time, json, tempfile, argparse
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, topdir)
+
+import inkex
+from round_corners import RoundedCorners, CornerTemplateCache
+
+clock = time.perf_counter
+
+
+def node(x, y, hin=None, hout=None):
+  return [ list(hin or (x, y)), [x, y], list(hout or (x, y)) ]
+
+
+def close(sp):
+  """ append the close marker: a copy of the first node """
+  sp.append([ sp[0][0][:], sp[0][1][:], sp[0][2][:] ])
+  return sp
+
+
+def gen_zigzag(n):
+  return [[ node(i * 10.0, 0.0 if i % 2 == 0 else 20.0) for i in range(max(3, n)) ]]
+
+
+def gen_slanted(n):
+  csp = []
+  cols = max(1, int(math.sqrt(n / 4)))
+  for k in range(max(1, n // 4)):
+    x = (k % cols) * 60.0
+    y = (k // cols) * 40.0
+    csp.append(close([ node(x, y), node(x + 40, y),
+                       node(x + 50, y + 25, hout=(x + 40, y + 28)),
+                       node(x + 10, y + 25, hin=(x + 20, y + 32)) ]))
+  return csp
+
+
+def gen_curved(n):
+  n = max(3, n)
+  R = 10.0 * n / (2 * math.pi)
+  pts = [ (R * math.cos(2 * math.pi * i / n), R * math.sin(2 * math.pi * i / n)) for i in range(n) ]
+  sp = []
+  for i in range(n):
+    x, y = pts[i]
+    px, py = pts[i - 1]
+    nx, ny = pts[(i + 1) % n]
+    # handles point a third of the way towards the neighbours, rotated by 15 degrees to the outside.
+    hin = rotate((px - x) / 3, (py - y) / 3, -15)
+    hout = rotate((nx - x) / 3, (ny - y) / 3, 15)
+    sp.append(node(x, y, (x + hin[0], y + hin[1]), (x + hout[0], y + hout[1])))
+  return [ close(sp) ]
+
+
+def rotate(x, y, deg):
+  c = math.cos(math.radians(deg))
+  s = math.sin(math.radians(deg))
+  return (x * c - y * s, x * s + y * c)
+
+
+def gen_glyphs(n):
+  csp = []
+  cols = max(1, int(math.sqrt(n / 6)))
+  for k in range(max(1, n // 6)):
+    x = (k % cols) * 25.0
+    y = (k // cols) * 35.0
+    csp.append(close([ node(x + a, y + b) for a, b in ((0, 0), (6, 0), (6, 24), (18, 24), (18, 30), (0, 30)) ]))
+  return csp
+
+
+generators = { 'zigzag': gen_zigzag, 'slanted': gen_slanted, 'curved': gen_curved, 'glyphs': gen_glyphs }
+
+
+def to_d(csp):
+  d = []
+  for sp in csp:
+    d.append("M %r,%r" % tuple(sp[0][1]))
+    for a, b in zip(sp[:-1], sp[1:]):
+      d.append("C %r,%r %r,%r %r,%r" % (a[2][0], a[2][1], b[0][0], b[0][1], b[1][0], b[1][1]))
+  return " ".join(d)
+
+
+def to_svg(csp):
+  return ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" viewBox="0 0 1000 1000">\n'
+          '<path id="bench" style="fill:none;stroke:#000" d="%s"/>\n</svg>\n' % to_d(csp))
+
+
+def extension(args=()):
+  ext = RoundedCorners()
+  ext.parse_arguments(list(args))
+  ext.apply_options()
+  return ext
+
+
+def best_of(fn, min_time):
+  """ best time of repeated calls of fn(), repeating for at least min_time seconds (at most 20 runs). """
+  best = 1e99
+  spent = 0.0
+  runs = 0
+  while runs < 1 or (spent < min_time and runs < 20):
+    t = clock()
+    fn()
+    t = clock() - t
+    best = min(best, t)
+    spent += t
+    runs += 1
+  return best
+
+
+def bench(gen_name, size, ops, min_time, tmpdir):
+  """ returns a list of result dicts """
+  csp = generators[gen_name](size)
+  nodes = sum([ len(sp) for sp in csp ])
+  svgfile = os.path.join(tmpdir, '%s_%d.svg' % (gen_name, size))
+  with open(svgfile, 'w') as fd:
+    fd.write(to_svg(csp))
+
+  ext = extension()
+  selection = ext.roundable_nodes(csp)
+  corners = sum([ len(v) for v in selection.values() ])
+  results = []
+
+  def record(op, count, seconds):
+    results.append({ 'generator': gen_name, 'size': size, 'nodes': nodes, 'op': op, 'corners': count,
+                     'seconds': seconds, 'corners_per_s': count / seconds if seconds > 0 else None })
+
+  if 'find_roundable_nodes' in ops:
+    ext.document = inkex.load_svg(svgfile)
+    ext.svg = ext.document.getroot()
+    record('find_roundable_nodes', corners, best_of(lambda: ext.find_roundable_nodes('bench'), min_time))
+
+  if 'super_node' in ops:
+    def run():
+      for i in selection:
+        sp = csp[i]
+        for idx in selection[i]:
+          ext.super_node(sp, idx)
+    record('super_node', corners, best_of(run, min_time))
+
+  if 'subpath_round_corner' in ops:
+    # each call copies the whole subpath: time a sample of corners only.
+    i = max(selection, key=lambda k: len(selection[k]))
+    sp = csp[i]
+    sample = selection[i][::max(1, len(selection[i]) * len(sp) // 200000)][:200]
+    def run():
+      for idx in sample:
+        ext.subpath_round_corner(sp, idx)
+    record('subpath_round_corner', len(sample), best_of(run, min_time))
+
+  if 'corner_template' in ops:
+    alphas = [ math.radians(10 + k % 160) for k in range(corners) ]
+    e = extension([])
+    e.templates = CornerTemplateCache(0)
+    def run():
+      for alpha in alphas:
+        e.corner_template(alpha)
+    record('corner_template', corners, best_of(run, min_time))
+
+  for engine, args in (('python', []), ('numpy', []), ('exact', [ '--exact=true' ])):
+    if 'round_superpath' in ops:
+      e = extension([ '--engine=' + engine if engine != 'exact' else '--engine=python' ] + args)
+      def run():
+        e.round_superpath(list(csp), selection)       # round_superpath() replaces the subpaths in the (copied) list.
+      record('round_superpath[%s]' % engine, corners, best_of(run, min_time))
+
+  if 'effect' in ops:
+    def run():
+      RoundedCorners().run([ '--id=bench', svgfile ], output=os.devnull)
+    record('effect', corners, best_of(run, min_time))
+
+  return results
+
+
+def scaling(results):
+  """ { (generator, op): [ k, ... ] } exponents of (time per corner) ~ nodes^k between successive sizes """
+  series = {}
+  for r in results:
+    if r['corners'] > 0 and r['seconds'] > 0:
+      series.setdefault((r['generator'], r['op']), []).append(r)
+  ret = {}
+  for key in series:
+    rs = sorted(series[key], key=lambda r: r['nodes'])
+    ks = []
+    for a, b in zip(rs[:-1], rs[1:]):
+      if b['nodes'] > a['nodes']:
+        ta = a['seconds'] / a['corners']
+        tb = b['seconds'] / b['corners']
+        ks.append(math.log(tb / ta) / math.log(float(b['nodes']) / a['nodes']))
+    ret[key] = ks
+  return ret
+
+
+all_ops = ('find_roundable_nodes', 'super_node', 'subpath_round_corner', 'corner_template', 'round_superpath', 'effect')
+
+if __name__ == '__main__':
+  pars = argparse.ArgumentParser(description="Microbenchmarks of round_corners.py with synthetic paths.")
+  pars.add_argument("--sizes", default="10,100,1000,10000,100000", help="node counts, comma separated. Default: 10 .. 100000")
+  pars.add_argument("--generators", default=",".join(sorted(generators)), help="comma separated, of: " + ", ".join(sorted(generators)))
+  pars.add_argument("--ops", default=",".join(all_ops), help="comma separated, of: " + ", ".join(all_ops))
+  pars.add_argument("--min-time", type=float, default=0.2, help="repeat each measurement for at least this many seconds. Default: 0.2")
+  pars.add_argument("--json", default=None, help="also write all results to this file")
+  args = pars.parse_args()
+
+  sizes = [ int(float(s)) for s in args.sizes.split(',') ]
+  ops = args.ops.split(',')
+  results = []
+  tmpdir = tempfile.mkdtemp(prefix='round_corners_bench')
+  print("%-8s %-26s %8s %8s %10s %12s" % ('gen', 'op', 'nodes', 'corners', 'seconds', 'corners/s'))
+  for gen_name in args.generators.split(','):
+    for size in sizes:
+      for r in bench(gen_name, size, ops, args.min_time, tmpdir):
+        results.append(r)
+        print("%-8s %-26s %8d %8d %10.6f %12.0f" % (r['generator'], r['op'], r['nodes'], r['corners'], r['seconds'], r['corners_per_s'] or 0))
+        sys.stdout.flush()
+  for f in os.listdir(tmpdir):
+    os.remove(os.path.join(tmpdir, f))
+  os.rmdir(tmpdir)
+
+  print("\nscaling, k of (time per corner) ~ nodes^k between successive sizes. 0: linear:")
+  ks = scaling(results)
+  for key in sorted(ks):
+    print("%-8s %-26s %s" % (key[0], key[1], " ".join([ "%5.2f" % k for k in ks[key] ])))
+
+  if args.json:
+    with open(args.json, 'w') as fd:
+      json.dump({ 'results': results, 'scaling': [ { 'generator': k[0], 'op': k[1], 'k': ks[k] } for k in sorted(ks) ] }, fd, indent=1)
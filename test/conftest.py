@@ -0,0 +1,26 @@
+# coding=utf-8
+#
+# pytest setup for the tests in this directory: python3 -m pytest test/
+# The extension modules are imported from the top directory, as inkscape does.
+#
+import io, os, sys
+import pytest
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, topdir)
+
+
+@pytest.fixture
+def run_extension(tmp_path):
+  """ run round_corners.py on the svg text with the command line args. Returns the svg text written.
+      inkex writes nothing if the document was not changed, the input is returned then.
+  """
+  import round_corners
+
+  def run(svg, *args):
+    src = tmp_path / 'input.svg'
+    src.write_text(svg)
+    out = io.BytesIO()
+    round_corners.RoundedCorners().run(list(args) + [ str(src) ], output=out)
+    return out.getvalue().decode('utf-8') or svg
+  return run
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+#
+# Differential fuzzer: fast corner engines against the reference implementation.
+#
+# The oracle is the scalar code, RoundedCorners.subpath_round_corners(). Each engine in 'engines' gets the
+# same random subpath, selection and settings, and must produce the same nodes (within --tol) and the same
+# counters: skipped degenerated / small / stretched, the shortest skipped length, and the 2-node, 3-node and line counts,
+# and must report the same arc positions in e.produced (used for the data-round-corners record).
+#
+# The engine 'reference' checks the arcs of the oracle itself against the original arc math of round_corners.py
+# up to v1.4, arc_c_m() and arc_bezier_handles() here: RoundedCorners.corner_template() is a closed form of it.
+#
+# The options that have no second implementation are checked for their properties, on the same cases:
+# - 'clamp': --clamp skips no corner as too small, and its arcs, with the smaller radii, agree with the reference.
+#   (It may round fewer corners than without: a corner rounded with a smaller radius can leave its neighbour degenerated.)
+# - 'exact': --exact arcs touch the curves: their ends are on the curves, and the circle is tangent there.
+#   Subpaths without curves are rounded as without --exact.
+# - 'max-radius': the radius of round_corners_numpy.fit_radius() rounds all corners with the oracle, a slightly
+#   larger one does not (unless it is the limit --radius).
+#
+# The random cases concentrate on the intricate spots: open and closed subpaths, the node 0 wrap around
+# with the issue #2 double skip, zero length and real handles, collinear (stretched) and coincident
+# (degenerated) nodes, right angles on a grid (2-node vs 3-node arcs), neighbours sharing a segment (trim_plan()),
+# radii that do not fit, and --tolerance arcs of many segments.
+#
+# A mismatch is shrunk to a minimal reproducer: fewer selected corners, fewer nodes, no handles,
+# rounder coordinates, default settings -- as long as the mismatch remains.
+# A mismatch that disappears when the radius is moved by a relative 1e-9 either way is an exact tie
+# at a decision boundary (e.g. a segment exactly as long as the radius). Those are reported, but do not fail.
+#
+# Usage: python3 test/fuzz_engines.py [--cases 5000] [--seed 0] [--engines numpy,flat] [--tol 1e-7]
+#
+import io, os, sys, copy, math, random, argparse
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, topdir)
+
+import round_corners, round_corners_numpy, round_corners_exact
+from round_corners import RoundedCorners, corner_counters
+from round_corners_format import format_superpath, subpath_to_flat, flat_to_subpath
+
+engines = {
+  'numpy': lambda e, sp, sel: round_corners_numpy.subpath_round_corners_np(e, sp, sel),
+  'flat':  lambda e, sp, sel: flat_to_subpath(round_corners_numpy.flat_round_corners_np(e, subpath_to_flat(sp), sel)),
+}
+
+
+def oracle(e, sp, sel):
+  return e.subpath_round_corners(sp, sel)
+
+
+def arc_c_m(corner, p1, p7, radius):
+  """
+  The center c and the midpoint m of the arc from p1 to p7 that rounds the corner, as round_corners.py v1.4
+  computed them in arc_c_m_from_super_node():
+  - construct the ray c_m_vec that runs though the corner through c and m.
+  - p7, the corner and c form a rectangular triangle. Thus we can
+    compute cdist as the length of the hypothenuses under trim and radius.
+  - c is then cdist away from the corner along the vector c_m_vec.
+  - m is closer to the corner than c by exactly radius.
+  """
+  a = [ p1[0] - corner[0], p1[1] - corner[1] ]
+  b = [ p7[0] - corner[0], p7[1] - corner[1] ]
+  c_m_vec = [ a[0] + b[0], a[1] + b[1] ]
+  l = math.sqrt(c_m_vec[0]*c_m_vec[0] + c_m_vec[1]*c_m_vec[1])
+  trim = math.sqrt(b[0]*b[0] + b[1]*b[1])
+  cdist = math.sqrt(radius*radius + trim*trim)
+  c = [ corner[0] + cdist * c_m_vec[0] / l, corner[1] + cdist * c_m_vec[1] / l ]
+  m = [ corner[0] + (cdist-radius) * c_m_vec[0] / l, corner[1] + (cdist-radius) * c_m_vec[1] / l ]
+  return c, m
+
+
+def arc_bezier_handles(p1, p4, c):
+  """
+  The control points p2 and p3 between points p1 and p4, so that the cubic bezier spline
+  defined by p1,p2,p3,p4 approximates an arc around center c. As round_corners.py v1.4.
+
+  Algorithm based on Aleksas Riškus and Hans Muller.
+  """
+  x1, y1 = p1
+  x4, y4 = p4
+  xc, yc = c
+  ax = x1 - xc
+  ay = y1 - yc
+  bx = x4 - xc
+  by = y4 - yc
+  q1 = ax * ax + ay * ay
+  q2 = q1 + ax * bx + ay * by
+  k2 = 4./3. * (math.sqrt(2 * q1 * q2) - q2) / (ax * by - ay * bx)
+  return [ xc + ax - k2 * ay, yc + ay + k2 * ax ], [ xc + bx + k2 * by, yc + by - k2 * bx ]
+
+
+def arc_center(arc, radius, tangent=None):
+  """ The center c and the midpoint m of the circle of radius through the ends of the arc nodes, on the side away from
+      the bulge of the arc. A cut has no bulge, the center is then on the side the chord turns to from the tangent,
+      the direction of the curve into the first node. Unlike arc_c_m(), this does not need the corner, which is
+      ill-conditioned where the tangents at the arc ends are nearly parallel. Returns (c, m, chord), chord is the
+      distance of the arc ends.
+  """
+  p1, p7 = arc[0][1], arc[-1][1]
+  if tangent is not None:
+    turn = tangent[0] * (p7[1] - p1[1]) - tangent[1] * (p7[0] - p1[0])
+    bulge = [ p1[0] + (p7[1] - p1[1]) * turn, p1[1] - (p7[0] - p1[0]) * turn ]
+  elif len(arc) == 2:
+    bulge = bezier([ p1, arc[0][2], arc[1][0], p7 ], 0.5)[0]
+  else:
+    bulge = arc[1][1]
+  dx, dy = p7[0] - p1[0], p7[1] - p1[1]
+  chord = math.hypot(dx, dy)
+  mid = [ 0.5 * (p1[0] + p7[0]), 0.5 * (p1[1] + p7[1]) ]
+  perp = [ -dy / chord, dx / chord ]
+  if (bulge[0] - mid[0]) * perp[0] + (bulge[1] - mid[1]) * perp[1] > 0:
+    perp = [ -perp[0], -perp[1] ]
+  h = math.sqrt(max(0.0, radius * radius - 0.25 * chord * chord))
+  c = [ mid[0] + h * perp[0], mid[1] + h * perp[1] ]
+  return c, [ c[0] - radius * perp[0], c[1] - radius * perp[1] ], chord
+
+
+def reference_differs(case, result, tol, centers=None):
+  """ None if the arcs of the oracle result agree with arc_c_m() and arc_bezier_handles(), else a short description.
+      Only arcs of the default rule are compared: one bezier segment up to 90deg, two above. Not with --tolerance or cuts.
+      centers { node_idx: (c, m) } replaces arc_c_m() for those corners, see arc_center().
+      The radius of clamped corners is the one they were rounded with.
+      arc_c_m() divides by the length of a + b, which vanishes where a corner is nearly straight. The rounding errors
+      of the arc ends are enlarged by that, the tolerance too.
+  """
+  out, counters, produced, clamped = result
+  if case.cut or case.tolerance:
+    return None
+  radii = dict(clamped)
+  for node_idx, out_idx, n in produced:
+    corner = case.sp[node_idx][1]
+    radius = radii.get(node_idx, case.radius)
+    arc = out[out_idx:out_idx+n]
+    p1, p7 = arc[0][1], arc[-1][1]
+    slack = 0.0
+    if centers and node_idx in centers:
+      c, m = centers[node_idx]
+    else:
+      c, m = arc_c_m(corner, p1, p7, radius)
+      l = math.hypot(p1[0] + p7[0] - 2 * corner[0], p1[1] + p7[1] - 2 * corner[1])
+      ulp = 4e-16 * max([ 1.0 ] + [ abs(v) for v in p1 + p7 + corner ])
+      slack = 8 * ulp * math.hypot(radius, math.hypot(p7[0] - corner[0], p7[1] - corner[1])) / max(l, 1e-300)
+    if n == 2:
+      expected = [ (arc[0][2],) + arc_bezier_handles(p1, p7, c)[:1], (arc[1][0], arc_bezier_handles(p1, p7, c)[1]) ]
+    else:
+      h1 = arc_bezier_handles(p1, m, c)
+      h2 = arc_bezier_handles(m, p7, c)
+      expected = [ (arc[0][2], h1[0]), (arc[1][0], h1[1]), (arc[1][1], m), (arc[1][2], h2[0]), (arc[2][0], h2[1]) ]
+    d1, d7 = math.hypot(p1[0] - c[0], p1[1] - c[1]), math.hypot(p7[0] - c[0], p7[1] - c[1])
+    if abs(d1 - radius) > tol * max(1.0, radius) + slack or abs(d7 - radius) > tol * max(1.0, radius) + slack:
+      return "corner %d: arc ends %r, %r from the center, radius %r" % (node_idx, d1, d7, radius)
+    for got, want in expected:
+      for k in range(2):
+        if abs(got[k] - want[k]) > tol * max(1.0, abs(want[k])) + slack:
+          return "corner %d: %r != reference %r" % (node_idx, got, want)
+  return None
+
+
+def bezier(c, t):
+  """ the point and the derivative of the cubic bezier c [ p0, p1, p2, p3 ] at t """
+  u = 1 - t
+  p = [ u*u*u * c[0][k] + 3*u*u*t * c[1][k] + 3*u*t*t * c[2][k] + t*t*t * c[3][k] for k in range(2) ]
+  d = [ 3*u*u * (c[1][k] - c[0][k]) + 6*u*t * (c[2][k] - c[1][k]) + 3*t*t * (c[3][k] - c[2][k]) for k in range(2) ]
+  return p, d
+
+
+def clamp_differs(case, tol, radius=None):
+  """ None if --clamp rounds case as described at the top, else a short description """
+  result = run(oracle, case.replace(clamp=True), radius)
+  small = result[1][corner_counters.index('skipped_small_count')]
+  if small:
+    return "%d corners skipped as too small" % small
+  limit = case.radius if radius is None else radius
+  for node_idx, r in result[3]:
+    if not 0 < r <= limit:
+      return "corner %d: clamped to radius %r, limit %r" % (node_idx, r, limit)
+  return reference_differs(case.replace(radius=limit), result, tol)
+
+
+def exact_differs(case, tol, radius=None):
+  """ None if --exact rounds case as described at the top, else a short description """
+  walks = []
+  def exact(e, sp, sel):
+    walk = round_corners_exact.ExactWalk(e, sp, sel)
+    round_corners_exact.solve_walks(e, [ walk ])
+    walks.append(walk)
+    return e.subpath_round_corners(sp, sel, walk)
+  case = case.replace(exact=True) if radius is None else case.replace(exact=True, radius=radius)
+  result = run(exact, case)
+  walk = walks[0]
+  if not walk.sides:
+    return differs(run(oracle, case), result, tol)
+  centers = {}
+  for node_idx, out_idx, n in result[2]:
+    if node_idx not in walk.split:
+      continue                  # approximated
+    f = walk.solved[node_idx]
+    A, B = walk.sides[node_idx][1:3]
+    arc = result[0][out_idx:out_idx+n]
+    c, m, chord = arc_center(arc, case.radius, bezier(A, f[0])[1] if case.cut else None)
+    centers[node_idx] = (c, m)
+    # The solver stops at a residual of newton_tol: the centers seen from both curves are that far apart.
+    # The circle through both arc ends turns against them by that distance over the chord.
+    ulp = 4e-16 * max([ 1.0 ] + [ abs(v) for v in arc[0][1] + arc[-1][1] ])
+    slack = 4 * (round_corners_exact.newton_tol * case.radius + ulp) / max(chord, 1e-300)
+    for curve, t, p in ((A, f[0], arc[0][1]), (B, f[1], arc[-1][1])):
+      q, dq = bezier(curve, t)
+      if math.hypot(p[0] - q[0], p[1] - q[1]) > tol * max(1.0, case.radius):
+        return "corner %d: arc end %r is not on the curve, %r" % (node_idx, p, q)
+      cos = ((c[0] - p[0]) * dq[0] + (c[1] - p[1]) * dq[1]) / (case.radius * math.hypot(dq[0], dq[1]))
+      if abs(cos) > 1e-6 + slack:
+        return "corner %d: the arc is not tangent at %r, cos %r, chord %r" % (node_idx, p, cos, chord)
+  return reference_differs(case, result, tol, centers)
+
+
+def max_radius_differs(case, tol, radius=None):
+  """ None if round_corners_numpy.fit_radius() finds the radius described at the top, else a short description.
+      The subpath goes through the path data of an svg document, as fit_radius() reads it from there.
+  """
+  limit = case.radius if radius is None else radius
+  e = RoundedCorners()
+  e.parse_arguments([ '--method=' + ('line' if case.cut else 'arc'), '--radius=%r' % limit, '--max-radius=true' ])
+  d = format_superpath([ case.sp ], precision=12)
+  e.document = round_corners.inkex.load_svg(io.BytesIO(('<svg xmlns="http://www.w3.org/2000/svg"><path id="p" d="%s"/></svg>' % d).encode('utf-8')))
+  e.svg = e.document.getroot()
+  e.apply_options()
+  sp = e.svg.getElementById('p').path.to_superpath()[0]
+  sel = [ i for i in case.sel if i < len(sp) ]
+  if len(sp) < 3 or not sel:
+    return None
+  try:
+    fit = round_corners_numpy.fit_radius(e, { 'p': { 0: sel } })
+  except round_corners.inkex.AbortExtension:
+    fit = 0.0
+  case = case.replace(sp=[ [ list(p) for p in node ] for node in sp ], sel=sel, radius=fit)
+  small = run(oracle, case)[1][corner_counters.index('skipped_small_count')] if fit > 0 else 0
+  if small:
+    return "fit radius %r: %d corners skipped as too small" % (fit, small)
+  if fit < limit * (1 - 1e-6):
+    larger = min(limit, max(fit * (1 + 1e-6), e.eps))     # the search stops at e.eps.
+    if not run(oracle, case.replace(radius=larger))[1][corner_counters.index('skipped_small_count')]:
+      return "fit radius %r, but %r rounds all corners too" % (fit, larger)
+  return None
+
+
+properties = {
+  'reference': lambda case, tol, radius: reference_differs(case if radius is None else case.replace(radius=radius), run(oracle, case, radius), tol),
+  'clamp': clamp_differs,
+  'exact': exact_differs,
+  'max-radius': max_radius_differs,
+}
+
+
+class Case(object):
+  """ one fuzz input: subpath, selected node indices and settings """
+  def __init__(self, sp, sel, radius, cut, tolerance=0.0, clamp=False, exact=False):
+    self.sp = sp
+    self.sel = sel
+    self.radius = radius
+    self.cut = cut
+    self.tolerance = tolerance
+    self.clamp = clamp
+    self.exact = exact
+
+  def replace(self, **kw):
+    c = Case(copy.deepcopy(self.sp), list(self.sel), self.radius, self.cut, self.tolerance, self.clamp, self.exact)
+    for k in kw:
+      setattr(c, k, kw[k])
+    return c
+
+  def __repr__(self):
+    return "Case(sp=%r,\n     sel=%r, radius=%r, cut=%r, tolerance=%r, clamp=%r, exact=%r)" % (
+      self.sp, self.sel, self.radius, self.cut, self.tolerance, self.clamp, self.exact)
+
+
+extensions = {}                 # { method: RoundedCorners }, argument parsing is expensive.
+
+def run(fn, case, radius=None):
+  """ returns (nodes, counters, produced, clamped) of fn for case """
+  method = 'line' if case.cut else 'arc'
+  e = extensions.get(method)
+  if e is None:
+    e = extensions[method] = RoundedCorners()
+    e.parse_arguments([ '--method=' + method ])
+    e.apply_options()
+  for k in corner_counters:
+    setattr(e, k, 0)
+  e.skipped_small_len = 1e99
+  e.radius = case.radius if radius is None else radius
+  e.tolerance = case.tolerance
+  e.clamp = case.clamp
+  e.exact = case.exact
+  e.produced = []
+  e.clamped_nodes = []
+  sp = copy.deepcopy(case.sp)
+  out = fn(e, sp, list(case.sel))
+  if sp != case.sp:
+    raise AssertionError("input subpath was modified")
+  return out, tuple([ getattr(e, k) for k in corner_counters ]) + (e.skipped_small_len,), e.produced, e.clamped_nodes
+
+
+def differs(a, b, tol):
+  """ None if the results a and b agree, else a short description """
+  (out_a, cnt_a, prod_a), (out_b, cnt_b, prod_b) = a[:3], b[:3]
+  if cnt_a[:-1] != cnt_b[:-1]:
+    return "counters %s: %r != %r" % (corner_counters, cnt_a[:-1], cnt_b[:-1])
+  if abs(cnt_a[-1] - cnt_b[-1]) > tol * max(1.0, abs(cnt_a[-1]) if cnt_a[-1] < 1e98 else 1.0):
+    return "skipped_small_len %r != %r" % (cnt_a[-1], cnt_b[-1])
+  if prod_a != prod_b:
+    return "produced %r != %r" % (prod_a, prod_b)
+  if len(out_a) != len(out_b):
+    return "%d nodes != %d nodes" % (len(out_a), len(out_b))
+  for i, (na, nb) in enumerate(zip(out_a, out_b)):
+    for j in range(3):
+      for k in range(2):
+        if abs(na[j][k] - nb[j][k]) > tol * max(1.0, abs(na[j][k])):
+          return "node %d [%d][%d]: %r != %r" % (i, j, k, na[j][k], nb[j][k])
+  return None
+
+
+def check(engine, case, tol, radius=None):
+  """ None, if engine agrees with the oracle (or the oracle has the properties), else the description of the difference """
+  try:
+    if engine in properties:
+      return properties[engine](case, tol, radius)
+    return differs(run(oracle, case, radius), run(engines[engine], case, radius), tol)
+  except Exception as e:
+    return "%s: %s" % (type(e).__name__, e)
+
+
+def is_tie(engine, case, tol):
+  """ True, if the difference vanishes when the radius is moved a little either way """
+  for f in (1 + 1e-9, 1 - 1e-9):
+    if check(engine, case, tol, case.radius * f) is not None:
+      return False
+  return True
+
+
+def random_case(rng):
+  n = rng.randint(3, 14)
+  style = rng.random()
+  if style < 0.3:       # grid: right angles, collinear nodes, exact ties
+    pts = [ [ float(rng.randint(-4, 4)) * 2, float(rng.randint(-4, 4)) * 2 ] for i in range(n) ]
+  elif style < 0.4:     # repeated and collinear nodes
+    pts = [ [ rng.uniform(-10, 10), rng.uniform(-10, 10) ] ]
+    for i in range(n - 1):
+      p = pts[-1]
+      r = rng.random()
+      if r < 0.3:
+        pts.append(p[:])                                    # coincident: degenerated
+      elif r < 0.6 and len(pts) > 1:
+        q = pts[-2]
+        pts.append([ 2 * p[0] - q[0], 2 * p[1] - q[1] ])    # straight on: stretched
+      else:
+        pts.append([ rng.uniform(-10, 10), rng.uniform(-10, 10) ])
+  else:
+    pts = [ [ rng.uniform(-10, 10), rng.uniform(-10, 10) ] for i in range(n) ]
+  sp = []
+  for p in pts:
+    h0 = p[:] if rng.random() < 0.6 else [ p[0] + rng.uniform(-5, 5), p[1] + rng.uniform(-5, 5) ]
+    h2 = p[:] if rng.random() < 0.6 else [ p[0] + rng.uniform(-5, 5), p[1] + rng.uniform(-5, 5) ]
+    sp.append([ h0, p[:], h2 ])
+  if rng.random() < 0.6:                                    # closed
+    if rng.random() < 0.3:
+      # issue #2: an extra node at the start position, with a handle, before the close marker.
+      sp.append([ [ pts[0][0] + 1, pts[0][1] + 2 ], pts[0][:], pts[0][:] ])
+    sp.append(copy.deepcopy(sp[0]))
+  n = len(sp)
+  if rng.random() < 0.3:
+    sel = [ rng.randint(0, n - 1) ]
+  else:
+    sel = sorted(set([ rng.randint(0, n - 1) for i in range(rng.randint(1, n)) ]))
+  radius = rng.choice([ 0.1, 0.5, 1, 2, 4, rng.uniform(0.05, 5) ])
+  tolerance = rng.choice([ 1e-6, 1e-3, 0.05 ]) if rng.random() < 0.3 else 0.0
+  return Case(sp, sel, radius, rng.random() < 0.2, tolerance)
+
+
+def is_closed(sp):
+  return len(sp) > 1 and sp[0] == sp[-1]
+
+
+def candidates(case):
+  """ simpler variants of case, most promising first """
+  sel = case.sel
+  for i in range(len(sel)):
+    if len(sel) > 1:
+      yield case.replace(sel=sel[:i] + sel[i+1:])
+  sp = case.sp
+  closed = is_closed(sp)
+  last = len(sp) - 1 if closed else len(sp)
+  for k in range(last):
+    if len(sp) <= 3:
+      break
+    new_sp = copy.deepcopy(sp[:k] + sp[k+1:])
+    if closed and k == 0:
+      new_sp[-1] = copy.deepcopy(new_sp[0])                 # keep the close marker equal to node 0
+    new_sel = [ i - (i > k) for i in sel if i != k and i - (i > k) < len(new_sp) ]
+    if new_sel:
+      yield case.replace(sp=new_sp, sel=new_sel)
+  for k in range(len(sp)):
+    for j in (0, 2):
+      if sp[k][j] != sp[k][1]:
+        new_sp = copy.deepcopy(sp)
+        new_sp[k][j] = new_sp[k][1][:]
+        if closed and k in (0, len(sp) - 1):
+          new_sp[len(sp) - 1 - k][j] = new_sp[k][j][:]
+        yield case.replace(sp=new_sp)
+  for digits in (0, 1, 3):
+    new_sp = [ [ [ round(v, digits) for v in p ] for p in nd ] for nd in sp ]
+    if new_sp != sp:
+      yield case.replace(sp=new_sp)
+  if case.cut:
+    yield case.replace(cut=False)
+  if case.tolerance:
+    yield case.replace(tolerance=0.0)
+  if case.radius != 1.0:
+    yield case.replace(radius=1.0)
+    r = round(case.radius, 1)
+    if r != case.radius and r > 0:
+      yield case.replace(radius=r)
+
+
+def shrink(engine, case, tol):
+  """ greedy: take the first simpler variant that still fails, until none does. """
+  progress = True
+  while progress:
+    progress = False
+    for c in candidates(case):
+      if check(engine, c, tol) is not None and not is_tie(engine, c, tol):
+        case = c
+        progress = True
+        break
+  return case
+
+
+if __name__ == '__main__':
+  pars = argparse.ArgumentParser(description="Differential fuzzer of the corner engines against subpath_round_corners().")
+  pars.add_argument("--cases", type=int, default=5000, help="number of random cases. Default: 5000")
+  pars.add_argument("--seed", type=int, default=0, help="first seed. Case i uses seed+i. Default: 0")
+  pars.add_argument("--engines", default=",".join(sorted(engines) + sorted(properties)), help="comma separated, of: " + ", ".join(sorted(engines) + sorted(properties)))
+  pars.add_argument("--tol", type=float, default=1e-7, help="relative tolerance for coordinates. Default: 1e-7")
+  args = pars.parse_args()
+
+  failed = 0
+  for engine in args.engines.split(','):
+    ties = 0
+    fails = 0
+    for i in range(args.cases):
+      case = random_case(random.Random(args.seed + i))
+      diff = check(engine, case, args.tol)
+      if diff is None:
+        continue
+      if is_tie(engine, case, args.tol):
+        ties += 1
+        continue
+      fails += 1
+      small = shrink(engine, case, args.tol)
+      print("FAIL %s seed %d: %s" % (engine, args.seed + i, diff))
+      print("  minimal: %s" % check(engine, small, args.tol))
+      print("  " + repr(small).replace("\n", "\n  "))
+    print("%s: %d cases, %d failed, %d exact ties" % (engine, args.cases, fails, ties))
+    failed += fails
+  sys.exit(1 if failed else 0)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# Startup budget of round_corners.py.
+#
+# Inkscape starts a new python process per extension run. Its startup cost is
+#  - the import of inkex (not ours, only reported here),
+#  - our own imports (measured with python -X importtime, best of several runs),
+#  - the compile time of round_corners.py: inkscape runs it as __main__, and python never caches the main script.
+#
+# Usage: python3 test/importtime.py [budget_ms]
+# Exit status 1 if our share exceeds the budget, or if an import is seen that
+# should only happen on demand (0.92 compatibility layer, debug helpers).
+#
+import os, sys, subprocess, time
+
+budget_ms = 20.0
+runs = 5
+# must not be imported by round_corners on inkscape 1.x, only on demand
+lazy_modules = ('round_corners_092', 'pprint', 'round_corners_numpy', 'round_corners_stream', 'round_corners_parallel', 'round_corners_exact')
+
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime():
+  """ returns a list of (self_us, cumulative_us, level, module) of 'import round_corners' """
+  env = dict(os.environ)
+  env.pop('PYTHONDONTWRITEBYTECODE', None)          # measure with a .pyc cache, like the modules of inkex
+  env.pop('PYTHONPATH', None)
+  p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import round_corners'],
+                     cwd=topdir, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+  ret = []
+  for line in p.stderr.splitlines():
+    if not line.startswith('import time:') or 'imported package' in line:
+      continue
+    t_self, t_cum, name = line[len('import time:'):].split('|')
+    level = (len(name) - len(name.lstrip()) - 1) // 2
+    ret.append((int(t_self), int(t_cum), level, name.strip()))
+  return ret
+
+
+def own_imports(table):
+  """ (self time of round_corners + its direct imports except inkex [us], names of the direct imports) """
+  idx = [ i for i, e in enumerate(table) if e[2] == 0 and e[3] == 'round_corners' ][0]
+  t = table[idx][0]
+  names = []
+  i = idx - 1
+  while i >= 0 and table[i][2] > 0:
+    if table[i][2] == 1:
+      names.append(table[i][3])
+      if table[i][3] != 'inkex':
+        t += table[i][1]
+    i -= 1
+  return t, names
+
+
+def compile_time():
+  with open(os.path.join(topdir, 'round_corners.py')) as fd:
+    src = fd.read()
+  best = 1e99
+  for i in range(runs):
+    t = time.perf_counter()
+    compile(src, 'round_corners.py', 'exec')
+    best = min(best, time.perf_counter() - t)
+  return best * 1e6
+
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    budget_ms = float(sys.argv[1])
+  importtime()                                      # warm up the .pyc cache
+  own = 1e99
+  inkex_us = 1e99
+  for i in range(runs):
+    table = importtime()
+    t, names = own_imports(table)
+    own = min(own, t)
+    inkex_us = min([inkex_us] + [ e[1] for e in table if e[3] == 'inkex' ])
+  comp = compile_time()
+  total_ms = (own + comp) * 0.001
+
+  print("inkex import:         %8.1f ms  (not counted)" % (inkex_us * 0.001))
+  print("round_corners import: %8.1f ms  (%s)" % (own * 0.001, ', '.join(sorted(names))))
+  print("compile as __main__:  %8.1f ms" % (comp * 0.001))
+  print("total:                %8.1f ms  budget %.1f ms" % (total_ms, budget_ms))
+
+  status = 0
+  for name in lazy_modules:
+    if name in names:
+      print("FAIL: %s is imported at startup" % name)
+      status = 1
+  if total_ms > budget_ms:
+    print("FAIL: over budget")
+    status = 1
+  sys.exit(status)
@@ -0,0 +1,69 @@
+# coding=utf-8
+#
+# round_corners_batch.py: the output tree, file permissions, and the resume journal.
+#
+import os, stat
+
+import round_corners_batch
+
+svg = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100"><path id="p" d="M 0,0 H 10 V 10 H 0 Z"/></svg>'
+
+
+def inputs(tmp_path):
+  src = tmp_path / 'in'
+  (src / 'sub').mkdir(parents=True)
+  (src / 'a.svg').write_text(svg)
+  (src / 'sub' / 'b.svg').write_text(svg.replace('H 10', 'H 20'))
+  return src
+
+
+def test_batch(tmp_path, capsys):
+  src = inputs(tmp_path)
+  out = tmp_path / 'out'
+  args = [ str(src), '--output', str(out), '--radius=2', '--jobs=1' ]
+  assert round_corners_batch.main(args) == 0
+  for rel in ('a.svg', os.path.join('sub', 'b.svg')):
+    text = (out / rel).read_text()
+    assert 'data-round-corners=' in text and ' d="M 0,0' not in text
+  umask = os.umask(0)
+  os.umask(umask)
+  assert stat.S_IMODE(os.stat(str(out / 'a.svg')).st_mode) == 0o666 & ~umask
+  assert [ f for f in os.listdir(str(out)) if f.endswith('.tmp') ] == []
+
+  journal = (out / round_corners_batch.journal_name).read_text().splitlines()
+  assert journal[0].startswith('# round_corners_batch ') and '--precision=4' in journal[0]
+  assert sorted(journal[1:]) == [ 'ok\ta.svg', 'ok\t' + os.path.join('sub', 'b.svg') ]
+
+  # resume: nothing left to do.
+  (out / 'a.svg').write_text('kept')
+  capsys.readouterr()
+  assert round_corners_batch.main(args) == 0
+  assert 'Resuming: 2 of 2 files already done.' in capsys.readouterr().err
+  assert (out / 'a.svg').read_text() == 'kept'
+
+  # a failed file is retried.
+  (out / round_corners_batch.journal_name).write_text('\n'.join(journal[:1] + [ 'failed\ta.svg\tboom', journal[2] ]) + '\n')
+  assert round_corners_batch.main(args) == 0
+  assert (out / 'a.svg').read_text() != 'kept'
+
+
+def test_journal_options(tmp_path, capsys):
+  src = inputs(tmp_path)
+  out = tmp_path / 'out'
+  args = [ str(src), '--output', str(out), '--radius=2', '--jobs=1' ]
+  assert round_corners_batch.main(args) == 0
+  # every option that changes the output files refuses the journal
+  for option in ('--precision=3', '--coordinates=absolute', '--engine=python', '--exact', '--clamp', '--max-radius', '--stream', '--unit=mm'):
+    capsys.readouterr()
+    assert round_corners_batch.main(args + [ option ]) == 2, option
+    assert 'written with other settings' in capsys.readouterr().err
+  assert round_corners_batch.main(args + [ '--precision=3', '--restart' ]) == 0
+  text = (out / 'a.svg').read_text()
+  assert '.895' in text and '.8954' not in text
+
+
+def test_header():
+  h = round_corners_batch.journal_header([ '--radius=2.0', '--clamp=true' ], False)
+  assert h == round_corners_batch.journal_header([ '--clamp=true', '--radius=2.0' ], False)
+  assert h != round_corners_batch.journal_header([ '--clamp=true', '--radius=2.0' ], True)
+  assert h != round_corners_batch.journal_header([ '--radius=2.0' ], False)
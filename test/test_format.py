@@ -0,0 +1,76 @@
+# coding=utf-8
+#
+# The path data serializer, see round_corners_format.format_superpath().
+#
+import re, random
+
+import pytest
+
+import round_corners
+from round_corners_format import format_superpath, closed_subpaths, subpath_to_flat
+
+
+def superpath(d):
+  return [ [ [ list(p) for p in node ] for node in sp ] for sp in round_corners.inkex.Path(d).to_superpath() ]
+
+
+def max_error(a, b):
+  assert [ len(sp) for sp in a ] == [ len(sp) for sp in b ]
+  return max([ abs(u - v) for sa, sb in zip(a, b) for na, nb in zip(sa, sb) for pa, pb in zip(na, nb) for u, v in zip(pa, pb) ])
+
+
+def test_compact():
+  square = [ [ [ [0, 0] ] * 3, [ [10, 0] ] * 3, [ [10, 10] ] * 3, [ [0, 0] ] * 3 ] ]
+  assert format_superpath(square) == 'M0 0H10V10z'
+  assert format_superpath(square, coordinates='relative') == 'M0 0h10v10z'
+  assert format_superpath(square, coordinates='absolute') == 'M0 0H10V10z'
+  curve = [ [ [ [0, 0], [0, 0], [1, 2] ], [ [3, 4], [5.55555, -.25], [5.55555, -.25] ] ] ]
+  assert format_superpath(curve, precision=2) == 'M0 0C1 2 3 4 5.56-.25'
+
+
+def test_closed():
+  assert closed_subpaths('M 0,0 H 10 V 10 Z M 1e-5,0 L 1,1 z L 5,5 m 1,1 l 1,0 0,0 z z') == [ True, False, True ]
+  assert closed_subpaths(None) == []
+  # the ends of an open path that merely touch are not joined by z.
+  touching = superpath('M 0,0 H 10 V 10 L 0,0')
+  assert format_superpath(touching, closed=[ False ]) == 'M0 0H10V10L0 0'
+  assert format_superpath(touching, closed=[ True ]) == format_superpath(touching) == 'M0 0H10V10z'
+
+
+def test_closed_paths(run_extension):
+  head = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">'
+  out = run_extension(head + '<path id="o" d="M 0,0 H 10 V 10 L 0,0"/><path id="c" d="M 20,0 H 30 V 10 Z"/></svg>', '--all=true', '--radius=1')
+  assert re.search(r'id="o" d="[^"z]*"', out) and re.search(r'id="c" d="[^"z]*z"', out)
+
+
+def test_document_precision(run_extension):
+  # user units of about a cm: 6 decimals. 100 user units or more: --precision.
+  path = '<path id="p" d="M 0,0 H 0.987654321 V 0.987654321"/></svg>'
+  small = run_extension('<svg xmlns="http://www.w3.org/2000/svg" width="1cm" height="1cm" viewBox="0 0 1 1">' + path, '--id=p', '--radius=0.1')
+  assert ' d="M0 0H.887654c' in small
+  large = run_extension('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="200">' + path, '--id=p', '--radius=0.1')
+  assert ' d="M0 0H.8877c' in large
+
+
+def test_round_trip():
+  rng = random.Random(1)
+  for coordinates in ('auto', 'absolute', 'relative'):
+    for precision in (0, 2, 4, 6):
+      s = []
+      for i in range(3):
+        sp = []
+        for j in range(40):
+          p = [ rng.uniform(-1000, 1000), rng.uniform(-1000, 1000) ]
+          h = [ p[0] + rng.uniform(-10, 10), p[1] + rng.uniform(-10, 10) ] if j % 3 else p
+          sp.append([ h, p, [ 2 * p[0] - h[0], 2 * p[1] - h[1] ] ])
+        s.append(sp)
+      d = format_superpath(s, precision, coordinates)
+      # relative coordinates are written from the position read so far: the error does not add up along the path.
+      assert max_error(superpath(d), s) <= 0.5 * 10**-precision + 1e-9
+
+
+def test_flat_subpath():
+  numpy = pytest.importorskip('numpy')
+  sp = superpath('M 1,2 C 3,4 5,6 7,8 L 9,10 Z')[0]
+  flat = numpy.frombuffer(subpath_to_flat(sp), dtype=numpy.float64).reshape(-1, 6)
+  assert format_superpath([ flat, sp ]) == format_superpath([ sp, sp ])
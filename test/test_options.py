@@ -0,0 +1,96 @@
+# coding=utf-8
+#
+# The command line options of round_corners.py, and the selection index.
+#
+import os, re
+
+import round_corners, round_corners_record
+
+svg_head = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">'
+
+
+def path_d(svg, path_id):
+  return re.search(r'<path[^>]* id="%s"[^>]*' % path_id, svg).group(0).split(' d="')[1].split('"')[0]
+
+
+def arcs(svg, path_id):
+  """ the number of arcs in the data-round-corners record of the path """
+  value = re.search(r'<path[^>]* id="%s"[^>]* data-round-corners="([^"]*)"' % path_id, svg).group(1)
+  return sum([ len(ranges) for ranges in round_corners_record.parse_rounded(value).values() ])
+
+
+def test_selection_index():
+  e = round_corners.RoundedCorners()
+  index = e.selection_index([ 'p:0:10', 'p:0:2', 'p:0:2', 'p:1:0', 'q:0:3', 'a:b:2:1' ])
+  assert index == { 'p': { 0: [ 2, 10 ], 1: [ 0 ] }, 'q': { 0: [ 3 ] }, 'a:b': { 2: [ 1 ] } }
+  assert e.selection_index([]) == {}
+
+
+def test_clamp(run_extension, capsys):
+  # a 10x4 rectangle: a radius of 3 leaves no space for the corners at the short sides.
+  svg = svg_head + '<path id="p" d="M 0,0 H 10 V 4 H 0 Z"/></svg>'
+  out = run_extension(svg, '--id=p', '--radius=3')
+  assert arcs(out, 'p') == 2
+  assert 'Skipped 2 nodes' in capsys.readouterr().err
+  out = run_extension(svg, '--id=p', '--radius=3', '--clamp=true')
+  assert arcs(out, 'p') == 4
+  err = capsys.readouterr().err
+  assert 'Skipped' not in err and 'Rounded 3 nodes with a smaller radius' in err
+  # the first corner has all the space it needs
+  assert path_d(out, 'p').startswith('M0 3C0 1.3431 1.3431 0 3 0')
+
+
+def test_max_radius(run_extension, capsys):
+  svg = svg_head + '<path id="p" d="M 0,0 H 10 V 4 H 0 Z"/></svg>'
+  out = run_extension(svg, '--id=p', '--radius=3', '--max-radius=true')
+  assert arcs(out, 'p') == 4
+  radius = float(re.search(r'Radius ([0-9.e+-]+): the largest up to 3', capsys.readouterr().err).group(1))
+  assert 1.9 < radius < 2
+  # all corners fit, a slightly larger radius skips some.
+  run_extension(svg, '--id=p', '--radius=%r' % (radius * 1.001))
+  assert 'Skipped' in capsys.readouterr().err
+  # the limit, if all corners fit it
+  out = run_extension(svg, '--id=p', '--radius=1', '--max-radius=true')
+  assert 'Radius 1: the largest up to 1' in capsys.readouterr().err
+  assert path_d(out, 'p') == path_d(run_extension(svg, '--id=p', '--radius=1'), 'p')
+
+
+def test_unit_viewbox(run_extension):
+  # 2 user units per mm
+  head = '<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm" viewBox="0 0 200 200">'
+  svg = head + '<path id="p" d="M 0,0 H 100 V 100 H 0 Z"/></svg>'
+  mm = path_d(run_extension(svg, '--id=p', '--radius=5', '--unit=mm'), 'p')
+  assert mm == path_d(run_extension(svg, '--id=p', '--radius=10'), 'p')
+  assert mm == path_d(run_extension(svg, '--id=p', '--radius=%r' % (5 * 96 / 25.4), '--unit=px'), 'p')
+  assert mm != path_d(run_extension(svg, '--id=p', '--radius=5'), 'p')
+
+
+def test_unit_group_transform(run_extension):
+  # 1 user unit per mm at the root, the group scales by 2: the radius in the path is half as large.
+  head = '<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm" viewBox="0 0 100 100">'
+  svg = head + '<g transform="scale(2)"><path id="p" d="M 0,0 H 40 V 40 H 0 Z"/></g></svg>'
+  mm = path_d(run_extension(svg, '--id=p', '--radius=5', '--unit=mm'), 'p')
+  assert mm == path_d(run_extension(svg, '--id=p', '--radius=2.5'), 'p')
+
+
+def test_inx_params():
+  # inkscape passes each param of the inx file as --name=value, with its default or with each item of an enum.
+  from lxml import etree
+  topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  for inx in ('round_corners.inx', 'round_corners.092_inx'):
+    params = etree.parse(os.path.join(topdir, inx)).getroot().iterfind('{*}param')
+    args = []
+    for param in params:
+      if param.get('type') in ('description', 'notebook'):
+        continue
+      items = [ item.get('value') for item in param.iterfind('{*}item') ] or [ (param.text or '').strip() ]
+      args.append([ '--%s=%s' % (param.get('name'), value) for value in items ])
+    assert '--max_radius=false' in sum(args, [])
+    for k in range(max([ len(values) for values in args ])):
+      e = round_corners.RoundedCorners()
+      e.parse_arguments([ values[k % len(values)] for values in args ])
+      assert e.options.max_radius is False
+      assert e.options.unit == 'user' or e.options.unit in round_corners.units_px
+  e = round_corners.RoundedCorners()
+  e.parse_arguments([ '--max_radius=true' ])
+  assert e.options.max_radius is True
@@ -0,0 +1,25 @@
+# coding=utf-8
+#
+# round_corners_parallel.py: --jobs rounds as a single process does, also when no worker pool can be started.
+#
+import concurrent.futures
+import pytest
+
+svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">'
+       '<path id="a" d="M 0,0 H 10 V 10 H 0 Z"/>'
+       '<path id="t" d="M 0,20 H 13.3 V 27.1 H 0 Z" transform="rotate(30.7 5 20)"/>'
+       '<path id="u" d="M 0,40 H 1 V 41 Z" transform="translate(5 5)"/></svg>')
+
+
+@pytest.mark.parametrize('pool', [ True, False ])
+def test_jobs_as_serial(run_extension, monkeypatch, pool):
+  serial = run_extension(svg, '--all=true', '--radius=2')
+  if not pool:
+    def no_pool(*args, **kw):
+      raise OSError("no processes here")
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', no_pool)
+  assert run_extension(svg, '--all=true', '--radius=2', '--jobs=2') == serial
+  assert 'transform="translate(5 5)"' in serial       # too small to round, kept as it is
+
+  # the records are those of the written path data: a re-run skips the rounded paths.
+  assert run_extension(serial, '--all=true', '--radius=2', '--jobs=2') == serial
@@ -0,0 +1,55 @@
+# coding=utf-8
+#
+# The data-round-corners record of rounded paths, see round_corners_record.parse_rounded().
+#
+import re
+
+import round_corners, round_corners_record
+
+svg_head = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">'
+
+
+def path_d(svg, path_id):
+  return re.search(r'<path[^>]* id="%s"[^>]*' % path_id, svg).group(0).split(' d="')[1].split('"')[0]
+
+
+def points(d):
+  """ all coordinates of the path data d, of nodes and handles, as (x, y) """
+  s = round_corners.inkex.Path(d).to_superpath()
+  return [ tuple(p) for sp in s for node in sp for p in node ]
+
+
+def test_stale_record_is_ignored(run_extension):
+  # A 10x10 square, with the corner at 0,0 chamfered by hand from 0,2 to 2,0. The record still names the chamfer
+  # as an arc of an earlier run, but its checksum is that of other path data.
+  d = 'M 10,0 V 10 H 0 V 2 L 2,0 Z'
+  record = '#%s arc 1.0; arc 1.0 0:3-4' % round_corners_record.path_checksum('M 0,0 H 10 V 10 H 0 Z')
+  svg = svg_head + '<path id="p" d="%s" data-round-corners="%s"/></svg>' % (d, record)
+  out = run_extension(svg, '--all=true', '--radius=0.5')
+  # all corners are rounded inside the chamfered square. Read as an arc, the chamfer would have been collapsed
+  # into the corner at 0,0, and rounded there, outside the chamfer.
+  assert all(x + y >= 2 - 1e-6 for x, y in points(path_d(out, 'p')))
+  assert len(round_corners_record.parse_rounded(re.search(r'data-round-corners="([^"]*)"', out).group(1))[0]) == 5
+
+
+def test_record_is_stamped(run_extension):
+  svg = svg_head + '<path id="p" d="M 0,0 H 10 V 10 H 0 Z"/></svg>'
+  out = run_extension(svg, '--selected-nodes=p:0:1', '--radius=1')
+  value = re.search(r'data-round-corners="([^"]*)"', out).group(1)
+  assert value.split(';')[0] == '#' + round_corners_record.path_checksum(path_d(out, 'p'))
+  # not done: another run without selection rounds the other corners, and keeps the arc.
+  out = run_extension(out, '--all=true', '--radius=1')
+  value = re.search(r'data-round-corners="([^"]*)"', out).group(1)
+  assert len(round_corners_record.parse_rounded(value)[0]) == 4
+
+
+def test_parse_format():
+  value = '#0badcafe arc 2.0; arc 2.0 0:1-2,5-7 1:0-1; line 1.0 0:9-10'
+  rounded = round_corners_record.parse_rounded(value)
+  assert rounded == { 0: [ (1, 2, 'arc 2.0'), (5, 7, 'arc 2.0'), (9, 10, 'line 1.0') ], 1: [ (0, 1, 'arc 2.0') ] }
+  assert round_corners_record.format_rounded(rounded) == 'arc 2.0 0:1-2,5-7 1:0-1; line 1.0 0:9-10'
+  assert round_corners_record.parse_rounded(round_corners_record.format_rounded(rounded)) == rounded
+  assert round_corners_record.format_rounded({}) == ''
+  # garbage is ignored, not fatal
+  assert round_corners_record.parse_rounded('arc 1.0 0:x-2 1:3-4 2:5') == { 1: [ (3, 4, 'arc 1.0') ] }
+  assert round_corners_record.parse_rounded(None) == {}
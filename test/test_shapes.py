@@ -0,0 +1,59 @@
+# coding=utf-8
+#
+# Rounding rect, polygon and polyline objects, see round_corners_shapes.shapes_to_paths().
+#
+import io, re
+
+import round_corners, round_corners_shapes
+
+svg_head = '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100">'
+
+
+def element(svg, elem_id):
+  m = re.search(r'<(\w+)[^>]* id="%s"[^>]*>' % elem_id, svg)
+  return m.group(1), m.group(0)
+
+
+def test_shape_path_data():
+  doc = round_corners.inkex.load_svg(io.BytesIO((svg_head +
+    '<polygon id="a" points="0-10 10-10 10 0 0 0"/>'
+    '<polyline id="b" points=".5.5 10.5.5,10.5 10"/>'
+    '<polygon id="c" points="0,0 10,0 x"/>'
+    '<rect id="d" x="1" y="2" width="3" height="4"/></svg>').encode('utf-8')))
+  data = {}
+  for elem in doc.getroot():
+    d = round_corners_shapes.shape_path_data(elem)
+    data[elem.get('id')] = None if d is None else round_corners.inkex.Path(d).to_superpath()
+  assert [ list(node[1]) for node in data['a'][0] ] == [ [0, -10], [10, -10], [10, 0], [0, 0], [0, -10] ]
+  assert [ list(node[1]) for node in data['b'][0] ] == [ [.5, .5], [10.5, .5], [10.5, 10] ]
+  assert data['c'] is None
+  assert [ list(node[1]) for node in data['d'][0] ] == [ [1, 2], [4, 2], [4, 6], [1, 6], [1, 2] ]
+
+
+def test_all(run_extension):
+  svg = svg_head + ('<rect id="r" x="0" y="0" width="10" height="10" style="fill:red"/>'
+                    '<polygon id="q" points="20-10 30-10 30 0 20 0"/>'
+                    '<rect id="tiny" x="50" y="50" width="1" height="1"/>'
+                    '<defs><rect id="hidden" x="0" y="0" width="10" height="10"/></defs>'
+                    '<clipPath id="clip"><polygon id="clipped" points="0 0 10 0 10 10"/><path id="clip-path" d="M 0,0 H 10 V 10 Z"/></clipPath>'
+                    '<mask id="mask"><path id="masked" d="M 0,0 H 10 V 10 Z"/></mask><path id="p" d="M 0,0 H 10 V 10 Z"/></svg>')
+  out = run_extension(svg, '--all=true', '--radius=2')
+  tag, attrs = element(out, 'r')
+  assert tag == 'path' and 'style="fill:red"' in attrs and ' x="' not in attrs and 'data-round-corners=' in attrs
+  assert element(out, 'q')[0] == 'path'
+  # nothing to round: restore_shapes() puts the rect back.
+  assert element(out, 'tiny') == element(svg, 'tiny')
+  assert element(out, 'hidden') == element(svg, 'hidden')
+  assert element(out, 'clipped') == element(svg, 'clipped')
+  # paths are treated as the shapes.
+  assert 'data-round-corners=' in element(out, 'p')[1]
+  assert element(out, 'clip-path') == element(svg, 'clip-path')
+  assert element(out, 'masked') == element(svg, 'masked')
+
+
+def test_selected_ids(run_extension):
+  svg = svg_head + ('<rect id="r" x="0" y="0" width="10" height="10"/>'
+                    '<rect id="s" x="20" y="0" width="10" height="10"/></svg>')
+  out = run_extension(svg, '--id=s', '--radius=2')
+  assert element(out, 'r') == element(svg, 'r')
+  assert element(out, 's')[0] == 'path'
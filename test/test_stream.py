@@ -0,0 +1,42 @@
+# coding=utf-8
+#
+# round_corners_stream.round_stream() rounds as RoundedCorners.effect() does, one element at a time.
+#
+import io, re
+
+import pytest
+
+import round_corners, round_corners_stream
+
+# the transforms of paths and shapes are baked into the rounded path data, in full precision. Near right angles decide
+# between arcs of 2 and 3 nodes, so the rects are rotated by angles that are not exact in floating point.
+svg = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="100" height="100" viewBox="0 0 100 100">'
+       '<g id="g1"><path id="a" d="M 0,0 H 10 V 10 H 0 Z"/><g id="g2" transform="scale(1.5)"><path id="b" d="m 20,0 10,0 c 5,5 0,10 -10,10 z m 2,2 h 3 v 3 z"/></g></g>'
+       '<rect id="r" x="40" y="0" width="10" height="10" style="fill:#00f" transform="rotate(30.7 45 5)"/><polyline id="l" points="60 0 70 0 70 10 80 10"/>'
+       '<path id="t" d="M 0,20 H 13.3 V 27.1 H 0 Z" transform="matrix(0.8660254 0.5 -0.5 0.8660254 3.3 -7.1)"/>'
+       '<path id="u" d="M 0,40 H 1 V 41 Z" transform="translate(5 5)"/>'
+       '<defs><path id="d" d="M 0,0 H 10 V 10 Z"/></defs>text<path id="x" d="M 90,0 H 99 V 9 Z"/><use xlink:href="#d"/></svg>')
+
+
+def elements(text):
+  """ { id: (tag, attributes) } of the elements with an id """
+  return dict([ (m.group(2), (m.group(1), sorted(re.findall(r'([\w:-]+)="([^"]*)"', m.group(0))))) for m in re.finditer(r'<([\w:]+)[^>]* id="([^"]*)"[^>]*>', text) ])
+
+
+@pytest.mark.parametrize('args', [
+  ('--all=true', '--radius=2'),
+  ('--all=true', '--radius=1', '--method=line', '--precision=2'),
+  ('--id=a', '--id=r', '--id=t', '--id=u', '--radius=3', '--clamp=true'),
+  ('--id=t', '--id=u', '--radius=2'),
+  ('--selected-nodes=b:0:1', '--selected-nodes=b:1:0', '--radius=1'),
+])
+def test_stream_as_dom(run_extension, args):
+  dom = run_extension(svg, *args)
+  ext = round_corners.RoundedCorners()
+  ext.parse_arguments(list(args))
+  out = io.BytesIO()
+  round_corners_stream.round_stream(ext, io.BytesIO(svg.encode('utf-8')), out)
+  stream = out.getvalue().decode('utf-8')
+  assert elements(stream) == elements(dom)
+  assert elements(stream) != elements(svg)
+  assert stream.count('text') == 1